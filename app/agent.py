@@ -0,0 +1,243 @@
+"""
+SSH Attack Dashboard - Collector Agent
+Parse les logs SSH d'un serveur distant et pousse des deltas par IP,
+compressés et numérotés, vers POST /api/ingest du dashboard central
+(bibliothèque standard uniquement : rien à installer sur les serveurs)
+"""
+
+import gzip
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .database import LOCAL_HOST
+from .ssh_parser import SSHEventParser, _aggregate_events, _parse_journalctl
+
+# Cadence par défaut (alignée sur l'ingestion locale)
+AGENT_INTERVAL = 10.0
+
+# Timeout HTTP d'un envoi
+AGENT_TIMEOUT = 30
+
+# IPs max par batch (un cycle volumineux part en plusieurs batchs)
+AGENT_BATCH_IPS = 20000
+
+# Octets de auth.log lus max par cycle
+AGENT_MAX_READ = 32 * 1024 * 1024
+
+# État local : source lue, dernier seq, batchs pas encore acquittés
+AGENT_STATE_PATH = os.path.join(os.path.dirname(__file__), 'agent_state.json')
+
+# ============================================
+# AGENT
+# ============================================
+
+class IngestAgent:
+    """
+    Un cycle = lire les nouvelles lignes, agréger par IP, pousser.
+
+    Journal d'écriture anticipée : les batchs et la nouvelle position de
+    lecture sont sauvés sur disque AVANT l'envoi, puis retirés à l'ack.
+    Un envoi interrompu (réseau, crash) est renvoyé tel quel avec le même
+    seq, que le serveur ignore s'il l'a déjà appliqué : chaque tentative
+    est comptée une seule fois.
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        token: str,
+        host: str = LOCAL_HOST,
+        source: str = 'journal',
+        state_path: str = AGENT_STATE_PATH
+    ):
+        self.server_url = server_url.rstrip('/')
+        self.token = token
+        self.host = host
+        self.source = source
+        self.state_path = state_path
+        self.parser = SSHEventParser()
+        self.state = self._load_state()
+
+    def run_once(self) -> Dict:
+        """Un cycle de collecte. Returns: {sent, events, pending}"""
+        # Batchs d'un cycle précédent pas encore acquittés
+        sent = self._flush_pending()
+        if self.state['pending']:
+            return {'sent': sent, 'events': 0, 'pending': len(self.state['pending'])}
+
+        if 'seq' not in self.state:
+            # Premier lancement (ou état perdu) : reprise après le dernier seq connu du serveur
+            self.state['seq'] = self._request('GET', f'/api/ingest/{self.host}')['last_seq']
+
+        events, position = self._read_events()
+        if position == self.state.get('position'):
+            return {'sent': sent, 'events': 0, 'pending': 0}
+
+        for attacks, buckets in _split_batches(events):
+            self.state['seq'] += 1
+            self.state['pending'].append({
+                'host': self.host,
+                'seq': self.state['seq'],
+                'attacks': attacks,
+                'buckets': buckets
+            })
+
+        self.state['position'] = position
+        self._save_state()
+
+        sent += self._flush_pending()
+        return {'sent': sent, 'events': len(events), 'pending': len(self.state['pending'])}
+
+    def run_forever(self, interval: float = AGENT_INTERVAL):
+        """Boucle de collecte au premier plan (`python run.py agent`)."""
+        print(f"🔄 Pushing SSH attacks from {self.host} ({self.source}) to {self.server_url} every {interval:g}s")
+
+        while True:
+            try:
+                result = self.run_once()
+                if result['events'] or result['pending']:
+                    print(f"✅ {result['events']} events, {result['sent']} batch(s) sent, {result['pending']} pending")
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print(f"❌ Agent error: {e}")
+            time.sleep(interval)
+
+    def _read_events(self) -> Tuple[List[Dict], Optional[str]]:
+        """Nouvelles tentatives depuis la position sauvée → (events, nouvelle position)."""
+        position = self.state.get('position')
+
+        if self.source == 'journal':
+            events, cursor = _parse_journalctl(position, self.parser)
+            return events, cursor or position
+
+        text, position = _read_auth_log(self.source, position)
+        return self.parser.parse_text(text), position
+
+    def _flush_pending(self) -> int:
+        """Envoie les batchs en attente dans l'ordre, retire chacun à son ack."""
+        sent = 0
+
+        while self.state['pending']:
+            batch = self.state['pending'][0]
+            self._request('POST', '/api/ingest', gzip.compress(json.dumps(batch).encode('utf-8')))
+
+            self.state['pending'].pop(0)
+            self._save_state()
+            sent += 1
+
+        return sent
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None) -> Dict:
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Encoding'] = 'gzip'
+
+        request = urllib.request.Request(self.server_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=AGENT_TIMEOUT) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            # 4xx/5xx : le batch reste en attente, renvoyé au prochain cycle
+            raise ValueError(f'{method} {path} → HTTP {e.code}: {e.read()[:200].decode("utf-8", "replace")}')
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {'pending': []}
+
+        if state.get('host') != self.host or state.get('source') != self.source:
+            print(f"⚠️  Agent state {self.state_path} belongs to another host/source, ignored")
+            return {'pending': []}
+        return state
+
+    def _save_state(self):
+        """Écriture atomique (fichier temporaire + rename)."""
+        self.state.update(host=self.host, source=self.source)
+        tmp_path = self.state_path + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+def run_agent_forever(
+    server_url: str,
+    host: Optional[str] = None,
+    source: str = 'journal',
+    interval: float = AGENT_INTERVAL
+):
+    """Agent au premier plan, jeton lu dans SSH_DASHBOARD_INGEST_TOKEN."""
+    token = os.environ.get('SSH_DASHBOARD_INGEST_TOKEN')
+    if not token:
+        raise SystemExit('❌ SSH_DASHBOARD_INGEST_TOKEN is required')
+
+    agent = IngestAgent(
+        server_url,
+        token,
+        host=host or LOCAL_HOST,
+        source=source,
+        state_path=os.environ.get('SSH_DASHBOARD_AGENT_STATE', AGENT_STATE_PATH)
+    )
+
+    try:
+        agent.run_forever(interval)
+    except KeyboardInterrupt:
+        print("👋 Agent stopped")
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _split_batches(events: List[Dict]) -> List[Tuple[List[Dict], List[list]]]:
+    """
+    Deltas par IP + tentatives par (minute, IP), découpés par lots
+    de AGENT_BATCH_IPS IPs → [(attacks, buckets), ...].
+    """
+    attacks = _aggregate_events(events)
+
+    buckets = defaultdict(int)
+    for event in events:
+        buckets[(event['timestamp'][:16], event['ip'])] += 1
+
+    per_ip = defaultdict(list)
+    for (minute, ip), attempts in buckets.items():
+        per_ip[ip].append([minute, ip, attempts])
+
+    return [
+        (
+            attacks[start:start + AGENT_BATCH_IPS],
+            [bucket for attack in attacks[start:start + AGENT_BATCH_IPS] for bucket in per_ip[attack['ip']]]
+        )
+        for start in range(0, len(attacks), AGENT_BATCH_IPS)
+    ]
+
+def _read_auth_log(path: str, position: Optional[str]) -> Tuple[str, str]:
+    """
+    Lignes complètes ajoutées à un fichier type auth.log depuis
+    `position` ('inode:offset'). Rotation ou troncature → reprise au
+    début du nouveau fichier.
+    """
+    inode, offset = None, 0
+    if position:
+        stored_inode, _, stored_offset = position.partition(':')
+        inode, offset = int(stored_inode), int(stored_offset)
+
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != inode or stat.st_size < offset:
+            inode, offset = stat.st_ino, 0
+
+        f.seek(offset)
+        data = f.read(AGENT_MAX_READ)
+
+    # Ligne partielle (en cours d'écriture) : relue au prochain cycle
+    data = data[:data.rfind(b'\n') + 1]
+    return data.decode('utf-8', 'replace'), f'{inode}:{offset + len(data)}'
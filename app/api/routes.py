@@ -3,26 +3,43 @@ SSH Attack Dashboard - API Routes
 Compatible avec le frontend JS existant (1500 lignes)
 """
 
-from flask import Blueprint, jsonify, request
-from datetime import datetime
-from ..database import (
-    init_db,
-    get_dashboard_stats,
-    get_all_attacks,
-    get_top_countries,
-    get_top_ips,
-    get_critical_ips_for_ban,
-    get_attacks_timeline,
-    mark_ip_as_banned,
-    get_attack_by_ip,
-    get_db_size
+import hmac
+import ipaddress
+import json
+import re
+import threading
+import time
+import zlib
+from flask import Blueprint, current_app, g, jsonify, request
+from datetime import datetime, timezone
+from typing import Optional
+from ..database import EXPORT_COLUMNS
+from ..storage import get_storage, storage
+from ..export import EXPORT_FORMATS, EXPORT_MIMETYPES, gzip_stream
+from ..ban_scripts import BAN_SCRIPT_GENERATORS, iter_iptables_script
+from ..retention import get_history_top_ips
+from ..metrics import (
+    render_metrics,
+    ingest_lag_seconds,
+    start_profile,
+    stop_profile,
+    server_timing,
+    PROMETHEUS_CONTENT_TYPE,
+    HTTP_REQUEST_SECONDS,
+    STATS_CACHE,
+    INGEST_LAG
 )
-from ..ssh_parser import parse_and_store_ssh_logs
+from ..stream import stream_events, STREAM_FACTORY_ENVIRON
+from ..subnets import build_ban_cidrs
 
 api = Blueprint('api', __name__)
 
 # Initialise BDD au démarrage
-init_db()
+storage.init_db()
+
+# Snapshot de /api/stats : (génération, heure UTC) → corps JSON déjà sérialisé
+_stats_cache = {'key': None, 'etag': None, 'body': None}
+_stats_cache_lock = threading.Lock()
 
 # ============================================
 # ENDPOINT PRINCIPAL (COMPATIBLE JS)
@@ -33,17 +50,55 @@ def get_stats():
     """
     Endpoint principal appelé par le JS frontend.
     Retourne TOUTES les données nécessaires au dashboard.
+    
+    Lecture pure : l'ingestion des logs tourne en tâche de fond
+    (app/ingest.py), jamais dans le chemin de la requête.
+    
+    La réponse est mise en cache jusqu'à la prochaine écriture (génération
+    incrémentée par l'ingestion) ou le changement d'heure (fenêtres 24h) :
+    une seule série de requêtes SQL par ingestion, quel que soit le nombre
+    de clients. ETag + If-None-Match → 304 sans corps.
     """
-    # Parse nouveaux logs SSH + stocke en BDD
-    parse_and_store_ssh_logs()
+    key = (storage.get_data_generation(), datetime.now(timezone.utc).strftime('%Y%m%d%H'))
+    etag = 'stats-{}-{}'.format(*key)
     
+    if etag in request.if_none_match:
+        STATS_CACHE.inc(result='not_modified')
+        return _stats_response(None, etag)
+    
+    # Verrou : un seul thread recalcule, les autres attendent le snapshot
+    with _stats_cache_lock:
+        if _stats_cache['key'] != key:
+            STATS_CACHE.inc(result='miss')
+            _stats_cache['body'] = jsonify(_build_stats()).get_data()
+            _stats_cache['key'] = key
+            _stats_cache['etag'] = etag
+        else:
+            STATS_CACHE.inc(result='hit')
+        body = _stats_cache['body']
+    
+    return _stats_response(body, etag)
+
+def _stats_response(body, etag: str):
+    """Réponse JSON (ou 304 si body=None) revalidée à chaque polling."""
+    response = current_app.response_class(
+        body,
+        status=200 if body is not None else 304,
+        mimetype='application/json'
+    )
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _build_stats() -> dict:
+    """Assemble le payload complet de /api/stats depuis la BDD."""
     # Récupère stats depuis BDD
-    stats = get_dashboard_stats()
-    top_ips_data = get_top_ips(limit=10)
-    top_countries_data = get_top_countries(limit=5)
+    stats = storage.get_dashboard_stats()
+    top_ips_data = storage.get_top_ips(limit=10)
+    top_countries_data = storage.get_top_countries(limit=5)
     
     # Calcul peak attack (heure avec le plus d'attaques)
-    timeline = get_attacks_timeline(hours=24)
+    timeline = storage.get_attacks_timeline(hours=24)
     peak_hour = '--h'
     peak_attempts = 0
     if timeline:
@@ -58,13 +113,15 @@ def get_stats():
         'unique_ips': stats.get('unique_ips', 0),
         'last_update': stats.get('last_update', datetime.now().strftime('%H:%M:%S')),
         
-        # Top IPs (format simplifié pour JS)
+        # Top IPs (format simplifié pour JS, géo incluse : pas d'appel
+        # /api/geolocate par ligne côté frontend)
         'top_ips': [
             {
                 'ip': ip['ip'],
                 'attempts': ip['total_attempts'],
                 'country': ip.get('country_name', 'Unknown'),
-                'threat_level': ip.get('threat_level', 'Modéré')
+                'threat_level': ip.get('threat_level', 'Modéré'),
+                'geo': _geo_payload(ip)
             }
             for ip in top_ips_data
         ],
@@ -97,22 +154,390 @@ def get_stats():
         'peak_hour': peak_hour,
         'peak_attempts': peak_attempts,
         
-        # Tendance 24h (calcul simple pour l'instant)
-        'trend_24h': 0  # TODO: implémenter comparaison avec hier
+        # Tendance 24h vs 24h précédentes (rollup horaire)
+        'trend_24h': storage.get_attacks_trend(hours=24),
+        
+        # Serveurs surveillés (agents + local), les plus attaqués d'abord
+        'hosts': storage.get_hosts(limit=10),
+        
+        # Rafales de brute-force (fenêtres glissantes minute/heure/jour) sur
+        # 24h, et IPs proposées au ban (Critique + rafales récentes)
+        'bursts': storage.get_burst_summary(hours=24, limit=10),
+        'ban_candidates': storage.get_ban_candidate_count()
     }
     
-    return jsonify(response)
+    return response
+
+
+# ============================================
+# LISTE PAGINÉE (RECHERCHE / FILTRES)
+# ============================================
+
+# Valeurs du filtre niveau du frontend → threat_level en BDD
+THREAT_FILTERS = {
+    'critique': 'Critique',
+    'eleve': 'Élevé',
+    'modere': 'Modéré'
+}
+
+ATTACKS_PAGE_MAX = 500
+
+@api.route('/api/attacks', methods=['GET'])
+def list_attacks():
+    """
+    Liste paginée et filtrée côté serveur (applyFilters du JS).
+    
+    Query params :
+        limit (50, max 500), cursor (next_cursor de la page précédente),
+        sort (attempts | last_seen | ip), threat (critique | eleve | modere),
+        country (code pays), q (préfixe d'IP), min_attempts
+    
+    Pagination keyset : chaque page coûte quelques ms, même profonde.
+    """
+    args = request.args
+    threat = args.get('threat')
+    
+    try:
+        limit = min(max(int(args.get('limit', 50)), 1), ATTACKS_PAGE_MAX)
+        min_attempts = int(args['min_attempts']) if args.get('min_attempts') else None
+        page = storage.get_attacks_page(
+            limit=limit,
+            cursor=args.get('cursor') or None,
+            sort=args.get('sort', 'attempts'),
+            threat_filter=THREAT_FILTERS.get(threat, threat) if threat else None,
+            country_filter=(args.get('country') or '').upper() or None,
+            ip_prefix=(args.get('q') or '').strip() or None,
+            min_attempts=min_attempts
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'attacks': [
+            {
+                'ip': attack['ip'],
+                'attempts': attack['total_attempts'],
+                'country': attack.get('country_name', 'Unknown'),
+                'threat_level': attack.get('threat_level', 'Modéré'),
+                'first_seen': attack.get('first_seen'),
+                'last_seen': attack.get('last_seen'),
+                'is_banned': bool(attack.get('is_banned')),
+                'geo': _geo_payload(attack)
+            }
+            for attack in page['attacks']
+        ],
+        'next_cursor': page['next_cursor']
+    })
+
+# ============================================
+# EXPORT COMPLET (STREAMING)
+# ============================================
+
+@api.route('/api/export', methods=['GET'])
+def export_attacks():
+    """
+    Export de toute la table attacks (ou d'une tranche filtrée), généré
+    en flux : mémoire constante, premier octet envoyé immédiatement.
+    
+    Query params :
+        format (csv | ndjson | json), mêmes filtres que /api/attacks
+        (threat, country, q, min_attempts), since / until (ISO 8601 UTC :
+        IPs actives dans la fenêtre), gzip=1 (Content-Encoding gzip si
+        le client l'accepte)
+    """
+    args = request.args
+    export_format = args.get('format', 'csv')
+    threat = args.get('threat')
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown format: {export_format}'}), 400
+    
+    try:
+        min_attempts = int(args['min_attempts']) if args.get('min_attempts') else None
+        since = _parse_export_time(args.get('since'))
+        until = _parse_export_time(args.get('until'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = storage.iter_attacks(
+        threat_filter=THREAT_FILTERS.get(threat, threat) if threat else None,
+        country_filter=(args.get('country') or '').upper() or None,
+        ip_prefix=(args.get('q') or '').strip() or None,
+        min_attempts=min_attempts,
+        since=since,
+        until=until
+    )
+    body = EXPORT_FORMATS[export_format](EXPORT_COLUMNS, rows)
+    
+    compress = args.get('gzip') == '1' and 'gzip' in request.accept_encodings
+    if compress:
+        body = gzip_stream(body)
+    
+    filename = f'ssh-attacks_{datetime.now().strftime("%Y%m%d_%H%M")}.{export_format}'
+    response = current_app.response_class(body, mimetype=EXPORT_MIMETYPES[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _parse_export_time(value):
+    """'2025-10-17T00:00:00Z' → '2025-10-17 00:00:00' (format SQLite UTC)."""
+    if not value:
+        return None
+    
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+# ============================================
+# CLUSTERS (SOUS-RÉSEAUX / ASN)
+# ============================================
+
+CLUSTERS_MAX = 200
+
+@api.route('/api/clusters', methods=['GET'])
+def list_clusters():
+    """
+    Attaquants regroupés par réseau : top /24, /16 ou ASN par tentatives.
+    
+    Query params :
+        kind (net24 | net16 | asn), limit (20, max 200),
+        min_ips (IPs minimum par cluster, 2+ = attaque distribuée)
+        cidr (ex : 185.220.101.0/24) : IPs attaquantes du bloc à la place
+    """
+    args = request.args
+    
+    try:
+        limit = min(max(int(args.get('limit', 20)), 1), CLUSTERS_MAX)
+        
+        if args.get('cidr'):
+            network = ipaddress.ip_network(args['cidr'], strict=False)
+            if network.version != 4:
+                raise ValueError('Only IPv4 blocks are indexed')
+            members = storage.get_attacks_in_range(
+                int(network.network_address), int(network.broadcast_address), limit
+            )
+            return jsonify({'cidr': str(network), 'attacks': members})
+        
+        clusters = storage.get_clusters(
+            kind=args.get('kind', 'net24'),
+            limit=limit,
+            min_ips=max(int(args.get('min_ips', 1)), 1)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'kind': args.get('kind', 'net24'), 'clusters': clusters})
+
+# ============================================
+# FLUX TEMPS RÉEL (SSE)
+# ============================================
+
+@api.route('/api/stream', methods=['GET'])
+def stream():
+    """
+    Server-Sent Events : alertes (nouvelles IPs Élevé/Critique, escalades)
+    et compteurs poussés à chaque commit d'ingestion, heartbeat sinon.
+    
+    Reconnexion : le navigateur renvoie Last-Event-ID, les alertes
+    manquées sont rejouées depuis stream_events.
+    
+    En mode ASGI (app/asgi.py), le corps est servi par la boucle asyncio :
+    un client connecté n'occupe aucun thread.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    if last_event_id is not None:
+        last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+    
+    events = request.environ.get(STREAM_FACTORY_ENVIRON, stream_events)
+    response = current_app.response_class(
+        events(last_event_id),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx : pas de bufferisation
+    return response
+
+# ============================================
+# MULTI-SERVEURS (AGENTS)
+# ============================================
+
+# Taille max d'un batch agent une fois décompressé
+INGEST_MAX_BYTES = 16 * 1024 * 1024
+
+HOSTS_MAX = 200
+
+_HOST_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]{0,252}')
+_TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+_MINUTE_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}')
+
+@api.route('/api/ingest', methods=['POST'])
+def ingest_batch():
+    """
+    Batch poussé par un agent (`python run.py agent`), appliqué en une
+    transaction.
+    
+    Headers : Authorization: Bearer <SSH_DASHBOARD_INGEST_TOKEN>,
+    Content-Encoding: gzip (optionnel)
+    Body : {"host": "web-1", "seq": 42,
+            "attacks": [{"ip", "attempts", "first_seen", "last_seen"}],
+            "buckets": [["2025-10-17 00:15", "1.2.3.4", 3], ...]}
+    
+    `seq` croît de 1 par batch et par hôte : un renvoi (ack perdu) est
+    acquitté sans être recompté (applied = false).
+    """
+    error = _check_ingest_token()
+    if error:
+        return error
+    
+    try:
+        host, seq, attacks, buckets = _parse_ingest_payload(_read_ingest_body())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Buckets mis en file dans la transaction du batch : le process
+    # ingesteur les score (un worker ne voit qu'une part des batchs)
+    result = storage.apply_host_batch(host, seq, attacks, buckets)
+    if result is None:
+        return jsonify({'error': 'Database error'}), 500
+    
+    return jsonify({'success': True, 'host': host, **result})
+
+@api.route('/api/ingest/<host>', methods=['GET'])
+def ingest_host_state(host):
+    """Dernier seq accepté pour un hôte (reprise d'un agent sans état local)."""
+    error = _check_ingest_token()
+    if error:
+        return error
+    
+    return jsonify({'host': host, 'last_seq': storage.get_host_last_seq(host)})
+
+@api.route('/api/hosts', methods=['GET'])
+def list_hosts():
+    """Serveurs surveillés (agents + serveur local) avec leurs totaux."""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), HOSTS_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({'hosts': storage.get_hosts(limit=limit)})
+
+@api.route('/api/hosts/<host>', methods=['GET'])
+def host_top_ips(host):
+    """Top IPs d'un serveur : tentatives sur cet hôte, menace/géo de la flotte."""
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), ATTACKS_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({
+        'host': host,
+        'top_ips': [
+            {
+                'ip': ip['ip'],
+                'attempts': ip['attempts'],
+                'fleet_attempts': ip['total_attempts'],
+                'first_seen': ip['first_seen'],
+                'last_seen': ip['last_seen'],
+                'threat_level': ip.get('threat_level', 'Modéré'),
+                'geo': _geo_payload(ip)
+            }
+            for ip in storage.get_host_top_ips(host, limit=limit)
+        ]
+    })
+
+def _check_ingest_token():
+    """Réponse d'erreur si le jeton Bearer est absent/faux, None sinon."""
+    token = current_app.config.get('INGEST_TOKEN')
+    if not token:
+        return jsonify({'error': 'Remote ingestion disabled (SSH_DASHBOARD_INGEST_TOKEN)'}), 403
+    
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Invalid ingest token'}), 401
+    return None
 
+def _read_ingest_body() -> dict:
+    """Body JSON, décompressé si gzip, borné à INGEST_MAX_BYTES."""
+    data = request.get_data(cache=False)
+    
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        decompressor = zlib.decompressobj(31)  # wbits 31 = en-tête gzip
+        try:
+            data = decompressor.decompress(data, INGEST_MAX_BYTES)
+        except zlib.error:
+            raise ValueError('Invalid gzip body')
+        if decompressor.unconsumed_tail:
+            raise ValueError(f'Batch larger than {INGEST_MAX_BYTES} bytes')
+    elif len(data) > INGEST_MAX_BYTES:
+        raise ValueError(f'Batch larger than {INGEST_MAX_BYTES} bytes')
+    
+    try:
+        payload = json.loads(data)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('Body must be JSON')
+    if not isinstance(payload, dict):
+        raise ValueError('Body must be a JSON object')
+    return payload
+
+def _parse_ingest_payload(payload: dict):
+    """Valide un batch agent → (host, seq, attacks, buckets), ValueError sinon."""
+    host = payload.get('host')
+    if not isinstance(host, str) or not _HOST_RE.fullmatch(host):
+        raise ValueError('Invalid host')
+    
+    seq = payload.get('seq')
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 1:
+        raise ValueError('seq must be a positive integer')
+    
+    attacks = []
+    for attack in payload.get('attacks') or []:
+        try:
+            ip = str(ipaddress.ip_address(str(attack['ip'])))
+            attempts = attack['attempts']
+            first_seen, last_seen = attack['first_seen'], attack['last_seen']
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Invalid attack entry: {attack!r:.100}')
+        
+        if not isinstance(attempts, int) or isinstance(attempts, bool) or attempts < 1:
+            raise ValueError(f'Invalid attempts for {ip}')
+        if not all(isinstance(ts, str) and _TIMESTAMP_RE.fullmatch(ts) for ts in (first_seen, last_seen)):
+            raise ValueError(f'Invalid timestamps for {ip} (YYYY-MM-DD HH:MM:SS UTC)')
+        
+        attacks.append({'ip': ip, 'attempts': attempts, 'first_seen': first_seen, 'last_seen': last_seen})
+    
+    buckets = []
+    for bucket in payload.get('buckets') or []:
+        try:
+            minute, ip, attempts = bucket
+            ip = str(ipaddress.ip_address(str(ip)))
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid bucket: {bucket!r:.100}')
+        
+        if not (isinstance(minute, str) and _MINUTE_RE.fullmatch(minute)):
+            raise ValueError(f'Invalid bucket minute: {minute!r:.100}')
+        if not isinstance(attempts, int) or isinstance(attempts, bool) or attempts < 1:
+            raise ValueError(f'Invalid bucket attempts for {ip}')
+        
+        buckets.append((minute, ip, attempts))
+    
+    return host, seq, attacks, buckets
 
 # ============================================
 # GÉOLOCALISATION (APPELÉ PAR JS)
 # ============================================
 
+# IPs max par appel batch (une page de tableau)
+GEOLOCATE_BATCH_MAX = 1000
+
 @api.route('/api/geolocate/<ip>', methods=['GET'])
 def geolocate_ip(ip):
     """
-    Endpoint géolocalisation appelé par updateTableWithGeo()
-    Format attendu par JS ligne 350 :
+    Endpoint géolocalisation d'une IP
+    Format attendu par JS :
     {
         "success": true,
         "country": "France",
@@ -121,31 +546,52 @@ def geolocate_ip(ip):
         "city": "Paris"
     }
     """
-    # Récupère IP depuis BDD (déjà géolocalisée lors du parsing)
-    attack = get_attack_by_ip(ip)
+    # Récupère IP depuis BDD (géolocalisée en tâche de fond, app/geo.py)
+    return jsonify(_geo_payload(storage.get_attack_by_ip(ip)))
+
+@api.route('/api/geolocate', methods=['POST'])
+def geolocate_batch():
+    """
+    Géolocalisation d'un lot d'IPs en une requête (une page du tableau).
+    
+    Body : {"ips": ["1.2.3.4", ...]}
+    Réponse : {"results": {"1.2.3.4": {success, country, flag...}, ...}}
+    """
+    payload = request.get_json(silent=True) or {}
+    ips = payload.get('ips')
+    
+    if not isinstance(ips, list) or not all(isinstance(ip, str) for ip in ips):
+        return jsonify({'error': 'Body must be {"ips": [...]}'}), 400
+    if len(ips) > GEOLOCATE_BATCH_MAX:
+        return jsonify({'error': f'Max {GEOLOCATE_BATCH_MAX} IPs per request'}), 400
     
+    attacks = storage.get_attacks_by_ips(ips)
+    
+    return jsonify({
+        'results': {ip: _geo_payload(attacks.get(ip)) for ip in ips}
+    })
+
+def _geo_payload(attack):
+    """Format géo du JS depuis une ligne attacks (fallback Unknown)."""
     if attack and attack.get('country_name'):
-        # Flag emoji depuis code pays
-        flag = get_flag_emoji(attack.get('country', ''))
-        
-        return jsonify({
+        return {
             'success': True,
             'country': attack['country_name'],
-            'country_code': attack.get('country', 'XX'),
-            'flag': flag,
-            'city': attack.get('city', 'Unknown'),
-            'isp': attack.get('isp', 'Unknown')
-        })
-    else:
-        # Fallback si pas de géoloc en BDD
-        return jsonify({
-            'success': False,
-            'country': 'Unknown',
-            'country_code': 'XX',
-            'flag': '🏴',
-            'city': 'Unknown',
-            'isp': 'Unknown'
-        })
+            'country_code': attack.get('country') or 'XX',
+            'flag': get_flag_emoji(attack.get('country', '')),
+            'city': attack.get('city') or 'Unknown',
+            'isp': attack.get('isp') or 'Unknown'
+        }
+    
+    # Fallback si pas de géoloc en BDD
+    return {
+        'success': False,
+        'country': 'Unknown',
+        'country_code': 'XX',
+        'flag': '🏴',
+        'city': 'Unknown',
+        'isp': 'Unknown'
+    }
 
 def get_flag_emoji(country_code):
     """Convertit code pays en emoji drapeau"""
@@ -165,61 +611,100 @@ def generate_ban_script():
     """
     Génère script bash pour bannir IPs critiques.
     Appelé par openBanModal() dans ton JS ligne 1420.
+    
+    Les IPs critiques et les /24 (voire /16) où l'attaque est distribuée
+    sont regroupés en couverture CIDR minimale : une règle par bloc.
+    ?aggregate=0 : une règle par IP critique (ancien comportement).
+    
+    ?format=iptables|ipset|nftables : script téléchargé directement,
+    généré en flux (ipset / nftables : un set, pas N règles iptables).
+    Sans format : JSON {count, ips, script} pour le modal.
     """
-    critical_ips = get_critical_ips_for_ban()
+    aggregate = request.args.get('aggregate', '1') != '0'
+    ban_format = request.args.get('format')
     
-    if not critical_ips or len(critical_ips) == 0:
+    if ban_format is not None:
+        generator = BAN_SCRIPT_GENERATORS.get(ban_format)
+        if generator is None:
+            return jsonify({'error': f'Unknown format: {ban_format}'}), 400
+        
+        # Sans agrégation, les IPs passent du curseur SQL au script sans liste
+        targets = _ban_targets() if aggregate else (
+            (ip_data['ip'], ip_data['total_attempts']) for ip_data in storage.iter_critical_ips_for_ban()
+        )
+        filename = f'ban-ips-{datetime.now().strftime("%Y-%m-%d")}-{ban_format}.sh'
+        
+        response = current_app.response_class(generator(targets), mimetype='text/x-shellscript')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    critical_ips = storage.get_critical_ips_for_ban()
+    
+    if aggregate:
+        targets = _ban_targets(critical_ips)
+    else:
+        targets = [(ip_data['ip'], ip_data['total_attempts']) for ip_data in critical_ips]
+    
+    if not targets:
         return jsonify({
             'success': False,
             'error': 'Aucune IP critique détectée',
             'count': 0
         })
     
-    # Génère script bash
-    script_lines = [
-        '#!/bin/bash',
-        '# SSH Attack Dashboard - Auto-ban Script',
-        f'# Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-        f'# IPs to ban: {len(critical_ips)}',
-        '',
-        'echo "🔥 Banning malicious IPs..."',
-        ''
-    ]
-    
-    for ip_data in critical_ips:
-        ip = ip_data['ip']
-        attempts = ip_data['total_attempts']
-        script_lines.append(f'# {ip} - {attempts} attempts')
-        script_lines.append(f'iptables -A INPUT -s {ip} -j DROP')
-        script_lines.append(f'echo "✅ Banned {ip}"')
-        script_lines.append('')
-    
-    script_lines.extend([
-        'echo "💾 Saving iptables rules..."',
-        'iptables-save > /etc/iptables/rules.v4',
-        f'echo "✅ Done! Banned {len(critical_ips)} IPs"'
-    ])
-    
-    script = '\n'.join(script_lines)
-    
     return jsonify({
         'success': True,
-        'count': len(critical_ips),
-        'ips': [ip['ip'] for ip in critical_ips],
-        'script': script
+        'count': len(targets),
+        'ip_count': len(critical_ips),
+        'ips': [target for target, _ in targets],
+        'script': ''.join(iter_iptables_script(targets))
     })
 
+def _ban_targets(critical_ips=None):
+    """
+    Cibles (IP ou bloc, tentatives) en couverture CIDR minimale.
+    
+    La couverture se calcule sur l'ensemble trié : les IPs critiques
+    sont chargées (quelques dizaines d'octets par IP).
+    """
+    if critical_ips is None:
+        critical_ips = storage.get_critical_ips_for_ban()
+    
+    attempts_by_ip = {ip_data['ip']: ip_data['total_attempts'] for ip_data in critical_ips}
+    
+    targets = []
+    for cidr in build_ban_cidrs(attempts_by_ip):
+        # IP seule : /32 (/128) retiré, comme dans l'ancien script
+        target = cidr.split('/')[0] if cidr.endswith(('/32', '/128')) else cidr
+        targets.append((target, attempts_by_ip.get(target)))
+    return targets
+
 # ============================================
 # HISTORIQUE (BONUS)
 # ============================================
 
 @api.route('/api/history', methods=['GET'])
 def get_attack_history():
-    """Timeline 24h pour graphique Chart.js"""
-    hours = request.args.get('hours', default=24, type=int)
-    timeline = get_attacks_timeline(hours=hours)
+    """
+    Timeline pour graphique Chart.js.
+    
+    ?hours=24 (rollup horaire, défaut), ?minutes=60 (rollup minute)
+    ou ?days=365 (totaux par jour, sans limite d'ancienneté)
+    """
+    minutes = request.args.get('minutes', type=int)
+    days = request.args.get('days', type=int)
+    
+    if minutes:
+        timeline = storage.get_attacks_per_minute(minutes=minutes)
+        labels = [t['minute'] for t in timeline]
+    elif days:
+        timeline = storage.get_attacks_daily(days=days)
+        labels = [t['day'] for t in timeline]
+    else:
+        hours = request.args.get('hours', default=24, type=int)
+        timeline = storage.get_attacks_timeline(hours=hours)
+        labels = [t['hour'] for t in timeline]
     
-    labels = [t['hour'] for t in timeline]
     data = [t['attempts'] for t in timeline]
     
     return jsonify({
@@ -228,21 +713,97 @@ def get_attack_history():
         'data': data
     })
 
+@api.route('/api/history/top-ips', methods=['GET'])
+def get_history_top():
+    """
+    Top IPs sur une période quelconque, archives mensuelles comprises.
+    
+    ?from=2025-01-01&to=2025-03-31 (jours UTC inclus), ?limit=20 (max 100)
+    """
+    start = request.args.get('from', '')
+    end = request.args.get('to') or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    limit = min(request.args.get('limit', default=20, type=int), 100)
+    
+    try:
+        datetime.strptime(start, '%Y-%m-%d')
+        datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD dates'}), 400
+    
+    return jsonify({
+        'success': True,
+        'from': start,
+        'to': end,
+        'ips': get_history_top_ips(start, end, limit=limit)
+    })
+
 # ============================================
-# HEALTH CHECK
+# HEALTH CHECK & MÉTRIQUES
 # ============================================
 
 @api.route('/api/health', methods=['GET'])
 def health_check():
     """Monitoring production"""
-    stats = get_dashboard_stats()
+    stats = storage.get_dashboard_stats()
     
     return jsonify({
         'status': 'healthy',
         'database': {
-            'size': get_db_size(),
+            'backend': get_storage().name,
+            'size': storage.get_db_size(),
             'unique_ips': stats.get('unique_ips', 0),
             'total_attacks': stats.get('total_attempts', 0)
         },
         'timestamp': datetime.now().isoformat()
     })
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Métriques Prometheus (format texte) : durées journalctl / parsing /
+    géolocalisation / fonctions BDD, verrou écrivain, busy SQLite, lag
+    d'ingestion, requêtes HTTP. Compteurs propres à chaque process
+    (un scrape par worker gunicorn).
+    """
+    return current_app.response_class(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def _ingest_lag() -> Optional[float]:
+    """
+    Âge de la tentative la plus récente ingérée par ce process, sinon de
+    la plus récente en base (ingestion dans un process dédié).
+    """
+    lag = ingest_lag_seconds()
+    if lag is not None:
+        return lag
+    
+    newest = storage.get_newest_attack()
+    if not newest:
+        return None
+    
+    newest = datetime.strptime(newest[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - newest).total_seconds())
+
+INGEST_LAG.set_function(_ingest_lag)
+
+@api.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    
+    # Profilage à la demande : durée de chaque fonction BDD de la requête
+    if current_app.config.get('PROFILING') and request.headers.get('X-Profile'):
+        g.profile_token = start_profile()
+
+@api.after_request
+def _record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed,
+        endpoint=request.endpoint or 'unknown',
+        method=request.method,
+        status=response.status_code
+    )
+    
+    token = g.pop('profile_token', None)
+    if token is not None:
+        response.headers['Server-Timing'] = server_timing(stop_profile(token), elapsed)
+    return response
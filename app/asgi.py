@@ -0,0 +1,327 @@
+"""
+SSH Attack Dashboard - ASGI Server
+Même application Flask (mêmes routes, mêmes réponses JSON) servie par une
+boucle asyncio : les requêtes passent dans un pool de threads le temps de
+leurs appels BDD, les flux longs (/api/stream, exports) ne tiennent aucun
+thread entre deux morceaux. Un process garde des milliers de clients
+
+    pip install uvicorn
+    python run.py asgi
+    gunicorn -k uvicorn.workers.UvicornWorker 'app:create_asgi_app()'
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from .stream import STREAM_FACTORY_ENVIRON, stream_events_async
+
+# Threads du pool (requêtes Flask + BDD) ; les connexions en attente
+# (SSE, clients lents) n'en consomment aucun
+ASGI_THREADS = 32
+
+# Octets de corps WSGI lus par passage dans le pool (exports en flux)
+RESPONSE_CHUNK_BYTES = 64 * 1024
+
+# Corps de requête max (batch agent gzip : borné à 16 Mo une fois décompressé)
+REQUEST_MAX_BYTES = 16 * 1024 * 1024
+
+# Attente max des flux longs (SSE) à l'arrêt du serveur
+GRACEFUL_SHUTDOWN_TIMEOUT = 5
+
+# ============================================
+# APPLICATION ASGI
+# ============================================
+
+class DashboardASGI:
+    """
+    Adaptateur ASGI 3 de l'app Flask (WSGI) :
+
+    - chaque requête est exécutée par Flask dans le pool de threads
+      (before/after_request, CORS, métriques, profilage inchangés)
+    - le corps d'une réponse en flux est lu par morceaux dans le pool et
+      envoyé depuis la boucle : un client lent n'immobilise aucun thread
+    - /api/stream reçoit un corps asyncio (stream_events_async) : un client
+      SSE n'est qu'une coroutine en attente du hub
+    - lifespan : l'ingestion tourne en tâche asyncio (start_ingest_task)
+    """
+
+    def __init__(self, app, start_ingest: bool = False, threads: int = ASGI_THREADS):
+        self.app = app
+        self.start_ingest = start_ingest
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='ssh-asgi')
+        self._ingest_task: Optional[asyncio.Task] = None
+
+    async def __call__(self, scope: Dict, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        else:
+            await send({'type': 'websocket.close'})
+
+    # ============================================
+    # CYCLE DE VIE
+    # ============================================
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                if self.start_ingest:
+                    from .ingest import start_ingest_task
+                    config = self.app.config
+                    self._ingest_task = start_ingest_task(
+                        self.executor,
+                        interval=config['INGEST_INTERVAL'],
+                        mode=config['INGEST_MODE'],
+                        follow_source=config['INGEST_FOLLOW_SOURCE'],
+                        geo_backend=config['GEO_BACKEND'],
+                        geo_url=config['GEO_URL'],
+                        geo_db=config['GEO_DB']
+                    )
+                await send({'type': 'lifespan.startup.complete'})
+
+            elif message['type'] == 'lifespan.shutdown':
+                if self._ingest_task is not None:
+                    self._ingest_task.cancel()
+                    await asyncio.gather(self._ingest_task, return_exceptions=True)
+                    self._ingest_task = None
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ============================================
+    # REQUÊTES HTTP
+    # ============================================
+
+    async def _http(self, scope: Dict, receive, send):
+        body = await _read_request_body(receive)
+        if body is None:
+            await _send_error(send, 413, b'{"error": "Request body too large"}')
+            return
+
+        environ = _wsgi_environ(scope, body)
+
+        # Corps asyncio de /api/stream, créé par la route (mêmes en-têtes Flask)
+        async_body: List[AsyncIterator[str]] = []
+
+        def async_stream_events(last_event_id):
+            async_body.append(stream_events_async(last_event_id, self.executor))
+            return iter(())
+
+        environ[STREAM_FACTORY_ENVIRON] = async_stream_events
+
+        loop = asyncio.get_running_loop()
+        status, headers, first_chunk, rest = await loop.run_in_executor(
+            self.executor, _call_wsgi, self.app, environ
+        )
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+
+        if async_body:
+            chunks = _encode(async_body[0])
+        elif rest is None:
+            await send({'type': 'http.response.body', 'body': first_chunk})
+            return
+        else:
+            chunks = _iter_wsgi_body(*rest, first_chunk, self.executor)
+
+        await _send_stream(chunks, receive, send)
+
+async def _read_request_body(receive) -> Optional[bytes]:
+    """Corps complet de la requête, None au-delà de REQUEST_MAX_BYTES."""
+    body = bytearray()
+
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+
+        body += message.get('body', b'')
+        if len(body) > REQUEST_MAX_BYTES:
+            return None
+        if not message.get('more_body'):
+            break
+
+    return bytes(body)
+
+def _wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """Environ WSGI (PEP 3333) d'une requête ASGI dont le corps est déjà lu."""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+
+    for name, value in scope.get('headers', ()):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    # Corps déjà complet (y compris chunked) : longueur réelle
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+def _call_wsgi(app, environ: Dict) -> Tuple[int, List[Tuple[bytes, bytes]], bytes, Optional[Tuple]]:
+    """
+    Exécute l'app Flask (dans un thread du pool) et lit le début du corps.
+
+    Returns:
+        (status, en-têtes ASGI, premiers octets, (app_iter, itérateur) du
+        reste ou None) : une réponse JSON tient en un seul passage
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+
+    app_iter = app(environ, start_response)
+    iterator = iter(app_iter)
+    try:
+        chunk, finished = _read_chunk(iterator)
+    except BaseException:
+        _close(app_iter)
+        raise
+
+    if finished:
+        _close(app_iter)
+        return response['status'], response['headers'], chunk, None
+    return response['status'], response['headers'], chunk, (app_iter, iterator)
+
+def _read_chunk(iterator: Iterator[bytes]) -> Tuple[bytes, bool]:
+    """Jusqu'à RESPONSE_CHUNK_BYTES octets du corps. Returns: (octets, corps terminé)"""
+    parts = []
+    size = 0
+
+    for part in iterator:
+        if part:
+            parts.append(part)
+            size += len(part)
+        if size >= RESPONSE_CHUNK_BYTES:
+            return b''.join(parts), False
+
+    return b''.join(parts), True
+
+def _close(app_iter):
+    # PEP 3333 : close() libère le curseur BDD d'un export interrompu
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+async def _iter_wsgi_body(app_iter, iterator: Iterator[bytes], first_chunk: bytes, executor) -> AsyncIterator[bytes]:
+    """Corps WSGI en flux, un passage dans le pool par morceau."""
+    loop = asyncio.get_running_loop()
+    pending = None
+
+    try:
+        yield first_chunk
+
+        finished = False
+        while not finished:
+            pending = loop.run_in_executor(executor, _read_chunk, iterator)
+            chunk, finished = await pending
+            pending = None
+            if chunk:
+                yield chunk
+    finally:
+        # Jamais close() pendant qu'un thread lit encore le générateur
+        if pending is not None and not pending.done():
+            pending.add_done_callback(lambda _: executor.submit(_close, app_iter))
+        else:
+            executor.submit(_close, app_iter)
+
+async def _encode(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in chunks:
+            yield chunk.encode('utf-8')
+    finally:
+        await chunks.aclose()
+
+async def _send_stream(chunks: AsyncIterator[bytes], receive, send):
+    """
+    Envoie un corps en flux jusqu'à sa fin ou la déconnexion du client
+    (le flux est alors fermé aussitôt, sans attendre le morceau suivant).
+    """
+    async def pump():
+        async for chunk in chunks:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(disconnected())
+
+    try:
+        await asyncio.wait({pump_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(pump_task, disconnect_task, return_exceptions=True)
+        await chunks.aclose()
+
+    if pump_task.done() and not pump_task.cancelled() and pump_task.exception() is not None:
+        raise pump_task.exception()
+
+async def _send_error(send, status: int, body: bytes):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# ============================================
+# POINT D'ENTRÉE
+# ============================================
+
+def run_asgi(host: str = '0.0.0.0', port: int = 5001):
+    """Dashboard ASGI au premier plan (`python run.py asgi`), servi par uvicorn."""
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise RuntimeError("ASGI mode needs uvicorn: pip install uvicorn") from e
+
+    from . import create_asgi_app
+
+    uvicorn.run(
+        create_asgi_app(),
+        host=host,
+        port=port,
+        lifespan='on',
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT
+    )
@@ -0,0 +1,283 @@
+"""
+SSH Attack Dashboard - Historical Backfill
+Importe l'historique de fichiers auth.log* (rotations .gz comprises) :
+parsing parallèle (un process par fichier ou morceau de fichier),
+comptes partiels fusionnés par IP dans le parent, écrits par grosses
+transactions
+"""
+
+import gzip
+import hashlib
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .storage import storage
+from .ssh_parser import SSHEventParser, DB_TIMESTAMP_FORMAT
+
+# Taille d'un morceau de fichier texte confié à un worker (.gz : fichier entier)
+BACKFILL_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Lecture par blocs (lignes complètes) dans un worker
+BACKFILL_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Transaction écrite dès que N IPs de fichiers complets sont en attente
+BACKFILL_FLUSH_IPS = 100000
+
+# Empreinte d'un fichier : début du contenu décompressé (stable quand
+# logrotate renomme auth.log.1 → auth.log.2.gz)
+FINGERPRINT_BYTES = 65536
+
+# Clés ingest_state : empreintes importées / date limite de l'historique
+BACKFILL_STATE_PREFIX = 'backfill:'
+BACKFILL_UNTIL_KEY = 'backfill_until'
+
+# Morceau de travail : (chemin, début, fin) en octets, fin None = tout le fichier
+BackfillTask = Tuple[str, int, Optional[int]]
+
+# ============================================
+# ORCHESTRATION (PROCESS PARENT)
+# ============================================
+
+def run_backfill(
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    until: Optional[str] = None
+) -> Dict:
+    """
+    Importe des fichiers type auth.log (texte ou .gz) en parallèle.
+
+    Chaque fichier déjà importé (même empreinte) est ignoré : relancer le
+    backfill ne compte rien deux fois. Les lignes postérieures à `until`
+    sont ignorées : par défaut la première attaque déjà en base (ou
+    maintenant si la base est vide), ce que l'ingestion journalctl a
+    compté (sinon double comptage, journald et auth.log contenant les
+    mêmes messages sshd).
+
+    Args:
+        paths: Fichiers à importer (auth.log, auth.log.1, auth.log.2.gz...)
+        workers: Nombre de process (défaut : nombre de cœurs)
+        until: Date limite UTC 'YYYY-MM-DD HH:MM:SS' (exclue)
+
+    Returns:
+        {files, skipped_files, attempts, stored_ips, until}
+    """
+    storage.init_db()
+
+    # Date limite fixée au premier backfill puis réutilisée : les suivants
+    # ne doivent pas se caler sur l'historique qu'il vient d'importer
+    until = until or storage.get_ingest_state(BACKFILL_UNTIL_KEY) or (
+        storage.get_earliest_attack()
+        or datetime.now(timezone.utc).strftime(DB_TIMESTAMP_FORMAT)
+    )
+    storage.set_ingest_state(BACKFILL_UNTIL_KEY, until)
+    print(f"ℹ️  Backfill des lignes antérieures à {until} UTC")
+
+    files, skipped = _pending_files(paths)
+    tasks = _plan_tasks(files)
+
+    remaining = defaultdict(int)
+    for path, _, _ in tasks:
+        remaining[path] += 1
+
+    # Comptes par fichier en cours, puis fichiers complets en attente d'écriture
+    partial: Dict[str, Tuple[Dict, Dict]] = {}
+    ready_ips: Dict[str, list] = {}
+    ready_hours: Dict[Tuple[str, str], int] = defaultdict(int)
+    ready_state: Dict[str, str] = {}
+
+    summary = {'files': len(files), 'skipped_files': skipped, 'attempts': 0, 'stored_ips': 0}
+
+    with Pool(processes=workers) as pool:
+        for path, per_ip, per_hour in pool.imap_unordered(
+            _parse_task, [(task, until) for task in tasks]
+        ):
+            file_ips, file_hours = partial.setdefault(path, ({}, defaultdict(int)))
+            _merge_counts(file_ips, file_hours, per_ip, per_hour)
+
+            remaining[path] -= 1
+            if remaining[path]:
+                continue
+
+            # Fichier complet : ses comptes et son empreinte partent ensemble
+            attempts = sum(n for n, _, _ in file_ips.values())
+            print(f"✅ {path}: {attempts} tentatives, {len(file_ips)} IPs")
+            summary['attempts'] += attempts
+
+            _merge_counts(ready_ips, ready_hours, *partial.pop(path))
+            ready_state[BACKFILL_STATE_PREFIX + files[path]] = path
+
+            if len(ready_ips) >= BACKFILL_FLUSH_IPS:
+                summary['stored_ips'] += _flush(ready_ips, ready_hours, ready_state)
+
+    summary['stored_ips'] += _flush(ready_ips, ready_hours, ready_state)
+    summary['until'] = until
+
+    return summary
+
+def parse_until(value: Optional[str]) -> Optional[str]:
+    """'2025-10-17T00:00:00Z' (naïf = UTC) → '2025-10-17 00:00:00'."""
+    if not value:
+        return None
+
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(DB_TIMESTAMP_FORMAT)
+
+def _pending_files(paths: Sequence[str]) -> Tuple[Dict[str, str], int]:
+    """{chemin: empreinte} des fichiers pas encore importés, + nb ignorés."""
+    files = {}
+    skipped = 0
+
+    for path in paths:
+        fingerprint = _fingerprint(path)
+        if fingerprint is None:
+            print(f"⚠️  {path}: fichier vide, ignoré")
+            skipped += 1
+        elif fingerprint in files.values() or storage.get_ingest_state(BACKFILL_STATE_PREFIX + fingerprint):
+            print(f"ℹ️  {path}: déjà importé, ignoré")
+            skipped += 1
+        else:
+            files[path] = fingerprint
+
+    return files, skipped
+
+def _plan_tasks(files: Dict[str, str]) -> List[BackfillTask]:
+    """
+    Découpe en morceaux : un .gz par worker (pas d'accès aléatoire dans un
+    flux compressé), les fichiers texte par tranches de BACKFILL_CHUNK_BYTES.
+    Les plus gros d'abord pour équilibrer les workers.
+    """
+    tasks = []
+
+    for path in files:
+        size = os.path.getsize(path)
+        if _is_gzip(path):
+            tasks.append((size * 10, (path, 0, None)))  # ~10x une fois décompressé
+            continue
+
+        for start in range(0, size, BACKFILL_CHUNK_BYTES):
+            end = min(start + BACKFILL_CHUNK_BYTES, size)
+            tasks.append((end - start, (path, start, end)))
+
+    tasks.sort(key=lambda task: task[0], reverse=True)
+    return [task for _, task in tasks]
+
+def _flush(
+    ips: Dict[str, list],
+    hours: Dict[Tuple[str, str], int],
+    state: Dict[str, str]
+) -> int:
+    """Écrit les fichiers complets en attente (une transaction) puis vide les buffers."""
+    if not state:
+        return 0
+
+    attacks = [
+        {'ip': ip, 'attempts': attempts, 'first_seen': first_seen, 'last_seen': last_seen}
+        for ip, (attempts, first_seen, last_seen) in ips.items()
+    ]
+    count = storage.backfill_attacks(attacks, hours, state)
+
+    ips.clear()
+    hours.clear()
+    state.clear()
+    return count
+
+def _merge_counts(ips: Dict[str, list], hours: Dict, other_ips: Dict[str, list], other_hours: Dict):
+    """Fusionne des comptes partiels {ip: [tentatives, first_seen, last_seen]}."""
+    for ip, (attempts, first_seen, last_seen) in other_ips.items():
+        counts = ips.get(ip)
+        if counts is None:
+            ips[ip] = [attempts, first_seen, last_seen]
+        else:
+            counts[0] += attempts
+            counts[1] = min(counts[1], first_seen)
+            counts[2] = max(counts[2], last_seen)
+
+    for key, attempts in other_hours.items():
+        hours[key] += attempts
+
+# ============================================
+# WORKERS
+# ============================================
+
+def _parse_task(job: Tuple[BackfillTask, Optional[str]]) -> Tuple[str, Dict[str, list], Dict]:
+    """
+    Parse un morceau dans un process worker → comptes partiels :
+    ({ip: [tentatives, first_seen, last_seen]}, {(heure, ip): tentatives}).
+    """
+    (path, start, end), until = job
+    parser = SSHEventParser()
+    per_ip: Dict[str, list] = {}
+    per_hour: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    for block in _iter_blocks(path, start, end):
+        for event in parser.parse_text(block.decode('utf-8', 'replace')):
+            timestamp = event['timestamp']
+            if until and timestamp >= until:
+                continue
+
+            ip = event['ip']
+            counts = per_ip.get(ip)
+            if counts is None:
+                per_ip[ip] = [1, timestamp, timestamp]
+            else:
+                counts[0] += 1
+                if timestamp < counts[1]:
+                    counts[1] = timestamp
+                if timestamp > counts[2]:
+                    counts[2] = timestamp
+
+            per_hour[(timestamp[:13] + ':00', ip)] += 1
+
+    return path, per_ip, dict(per_hour)
+
+def _iter_blocks(path: str, start: int, end: Optional[int]) -> Iterator[bytes]:
+    """
+    Blocs de lignes complètes de [start, end) : un morceau possède les
+    lignes qui y commencent (celle à cheval sur `start` appartient au
+    précédent). .gz décompressé en flux, jamais chargé en entier.
+    """
+    opener = gzip.open if _is_gzip(path) else open
+
+    with opener(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+
+        while end is None or position < end:
+            block = f.read(BACKFILL_BLOCK_BYTES)
+            if not block:
+                break
+            if not block.endswith(b'\n'):
+                block += f.readline()
+
+            if end is not None and position + len(block) > end:
+                # Coupe après la dernière ligne commençant avant `end`
+                cut = block.find(b'\n', end - position - 1)
+                yield block if cut == -1 else block[:cut + 1]
+                break
+
+            position += len(block)
+            yield block
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _fingerprint(path: str) -> Optional[str]:
+    """SHA-1 du début du contenu décompressé, None si fichier vide."""
+    opener = gzip.open if _is_gzip(path) else open
+    with opener(path, 'rb') as f:
+        head = f.read(FINGERPRINT_BYTES)
+
+    return hashlib.sha1(head).hexdigest() if head else None
+
+def _is_gzip(path: str) -> bool:
+    """Détection par magic number (les rotations ne sont pas toujours en .gz)."""
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
@@ -0,0 +1,150 @@
+"""
+SSH Attack Dashboard - Ban Scripts
+Scripts de bannissement générés en flux (une ligne à la fois) :
+iptables (une règle par bloc), ipset (restore + swap atomique), nftables
+"""
+
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Sets ipset / table nftables créés par les scripts
+IPSET_NAME = 'ssh_dashboard_ban'
+IPSET_MAXELEM = 1048576
+NFT_TABLE = 'ssh_dashboard'
+
+# Éléments par instruction "add element" nftables
+NFT_ELEMENTS_PER_LINE = 500
+
+# Cible à bannir : (IP ou bloc CIDR, tentatives si IP connue, sinon None)
+BanTarget = Tuple[str, Optional[int]]
+
+# ============================================
+# FORMATS
+# ============================================
+
+def iter_iptables_script(targets: Iterable[BanTarget]) -> Iterator[str]:
+    """
+    Une règle iptables/ip6tables par cible, ajoutée seulement si absente
+    (iptables -C) : le script peut être relancé sans doublons.
+
+    Chaîne linéaire parcourue par chaque paquet : préférer ipset ou
+    nftables au-delà de quelques centaines de règles.
+    """
+    yield from _header('iptables')
+    yield 'echo "🔥 Banning malicious IPs..."\n\n'
+
+    count = 0
+    ipv6 = False
+    for target, attempts in targets:
+        command = 'ip6tables' if ':' in target else 'iptables'
+        ipv6 = ipv6 or command == 'ip6tables'
+        count += 1
+
+        yield _comment(target, attempts)
+        yield (
+            f'{command} -C INPUT -s {target} -j DROP 2>/dev/null'
+            f' || {command} -A INPUT -s {target} -j DROP\n'
+        )
+        yield f'echo "✅ Banned {target}"\n\n'
+
+    yield 'echo "💾 Saving iptables rules..."\n'
+    yield 'iptables-save > /etc/iptables/rules.v4\n'
+    if ipv6:
+        yield 'ip6tables-save > /etc/iptables/rules.v6\n'
+    yield f'echo "✅ Done! {count} rules"\n'
+
+def iter_ipset_script(targets: Iterable[BanTarget]) -> Iterator[str]:
+    """
+    Sets hash:net (IPv4 + IPv6) remplis par un seul `ipset restore`, puis
+    échangés atomiquement (swap) avec les sets en service : lookup O(1)
+    par paquet, une règle iptables par famille quel que soit le nombre d'IPs.
+    """
+    v4, v6 = IPSET_NAME, f'{IPSET_NAME}6'
+    tmp4, tmp6 = f'{v4}_tmp', f'{v6}_tmp'
+
+    yield from _header('ipset')
+    yield 'set -e\n\n'
+    yield f'ipset create {v4} hash:net family inet maxelem {IPSET_MAXELEM} -exist\n'
+    yield f'ipset create {v6} hash:net family inet6 maxelem {IPSET_MAXELEM} -exist\n\n'
+
+    yield "ipset -exist restore <<'IPSET'\n"
+    yield f'create {tmp4} hash:net family inet maxelem {IPSET_MAXELEM}\n'
+    yield f'create {tmp6} hash:net family inet6 maxelem {IPSET_MAXELEM}\n'
+    yield f'flush {tmp4}\n'
+    yield f'flush {tmp6}\n'
+
+    count = 0
+    for target, _ in targets:
+        yield f'add {tmp6 if ":" in target else tmp4} {target}\n'
+        count += 1
+
+    yield f'swap {tmp4} {v4}\n'
+    yield f'swap {tmp6} {v6}\n'
+    yield f'destroy {tmp4}\n'
+    yield f'destroy {tmp6}\n'
+    yield 'IPSET\n\n'
+
+    for command, name in (('iptables', v4), ('ip6tables', v6)):
+        rule = f'INPUT -m set --match-set {name} src -j DROP'
+        yield f'{command} -C {rule} 2>/dev/null || {command} -I {rule}\n'
+
+    yield f'\necho "✅ Done! {count} entries in {v4}/{v6}"\n'
+
+def iter_nftables_script(targets: Iterable[BanTarget]) -> Iterator[str]:
+    """
+    Script `nft -f` : table dédiée avec sets d'intervalles IPv4/IPv6,
+    recréée et remplie en une seule transaction (remplacement atomique).
+    """
+    yield '#!/usr/sbin/nft -f\n'
+    yield from _header('nftables', shebang=False)
+
+    # Crée la table si absente : le "delete" qui suit ne peut pas échouer
+    yield f'table inet {NFT_TABLE}\n'
+    yield f'delete table inet {NFT_TABLE}\n\n'
+    yield f'table inet {NFT_TABLE} {{\n'
+    yield '    set banned_v4 { type ipv4_addr; flags interval; auto-merge; }\n'
+    yield '    set banned_v6 { type ipv6_addr; flags interval; auto-merge; }\n\n'
+    yield '    chain input {\n'
+    yield '        type filter hook input priority filter - 10; policy accept;\n'
+    yield '        ip saddr @banned_v4 drop\n'
+    yield '        ip6 saddr @banned_v6 drop\n'
+    yield '    }\n'
+    yield '}\n\n'
+
+    batches = {'banned_v4': [], 'banned_v6': []}
+    for target, _ in targets:
+        name = 'banned_v6' if ':' in target else 'banned_v4'
+        batch = batches[name]
+        batch.append(target)
+        if len(batch) >= NFT_ELEMENTS_PER_LINE:
+            yield _nft_add_elements(name, batch)
+            batch.clear()
+
+    for name, batch in batches.items():
+        if batch:
+            yield _nft_add_elements(name, batch)
+
+BAN_SCRIPT_GENERATORS = {
+    'iptables': iter_iptables_script,
+    'ipset': iter_ipset_script,
+    'nftables': iter_nftables_script
+}
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _header(ban_format: str, shebang: bool = True) -> Iterator[str]:
+    if shebang:
+        yield '#!/bin/bash\n'
+    yield '# SSH Attack Dashboard - Auto-ban Script\n'
+    yield f'# Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n'
+    yield f'# Format: {ban_format}\n\n'
+
+def _comment(target: str, attempts: Optional[int]) -> str:
+    if attempts is None:
+        return f'# {target} - distributed attack subnet\n'
+    return f'# {target} - {attempts} attempts\n'
+
+def _nft_add_elements(name: str, elements: list) -> str:
+    return f'add element inet {NFT_TABLE} {name} {{ {", ".join(elements)} }}\n'
@@ -5,66 +5,301 @@ Gère toutes les interactions SQLite avec pattern UPSERT
 
 import sqlite3
 from datetime import datetime, timedelta
+import base64
+import heapq
+import json
 import os
-from typing import List, Dict, Optional
+import queue
+import shutil
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import List, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from .metrics import (
+    timed_query,
+    record_lock_wait,
+    record_sqlite_error,
+    record_newest_event,
+    DB_LOCK_HELD_SECONDS,
+    INGEST_CONFLICTS
+)
 
 # Chemin BDD (dans app/)
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'ssh_attacks.db')
 
+# Pool : connexions inactives gardées par (chemin, mode) et par process
+POOL_SIZE = 8
+
+# Requêtes préparées gardées en cache par connexion
+STATEMENT_CACHE_SIZE = 256
+
+# Nom de ce serveur dans la vue multi-serveurs (ingestion locale)
+LOCAL_HOST = os.environ.get('SSH_DASHBOARD_HOST') or socket.gethostname()
+
+# Seuils de menace (tentatives cumulées) : Critique / Élevé, sinon Modéré
+THREAT_CRITICAL_THRESHOLD = 50
+THREAT_HIGH_THRESHOLD = 20
+
 # ============================================
 # CONNEXION & INITIALISATION
 # ============================================
 
-def get_db_connection():
+class PooledConnection(sqlite3.Connection):
+    """
+    Connexion SQLite dont close() la rend au pool au lieu de la fermer.
+    
+    Le cache de pages (64MB) et les requêtes préparées survivent d'un
+    appel à l'autre : le pattern get_db_connection()/close() reste le même.
+    """
+    
+    pool: Optional[queue.LifoQueue] = None
+    pool_key: Optional[Tuple[str, bool]] = None
+    
+    def close(self):
+        if self.pool is not None and self.pool is _pools.get(self.pool_key):
+            # Jamais de transaction pendante rendue au pool
+            if self.in_transaction:
+                self.rollback()
+            try:
+                self.pool.put_nowait(self)
+                return
+            except queue.Full:
+                pass
+        super().close()
+
+_pools: Dict[Tuple[str, bool], queue.LifoQueue] = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+def _get_pool(key: Tuple[str, bool]) -> queue.LifoQueue:
+    global _pools, _pools_pid
+    
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Fork (workers gunicorn) : jamais de connexion héritée du parent
+            _pools, _pools_pid = {}, os.getpid()
+        
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return pool
+
+def get_db_connection(readonly: bool = False):
     """
-    Crée connexion SQLite avec row_factory pour accès dict-like.
+    Récupère une connexion SQLite du pool (ou en ouvre une) avec
+    row_factory pour accès dict-like.
     
     row_factory = permet d'accéder aux colonnes par nom :
     row['ip'] au lieu de row[0]
+    
+    Args:
+        readonly: Connexion lecture seule (mode=ro + query_only) pour les
+            endpoints de consultation : en WAL, un lecteur ne bloque jamais
+            l'écrivain d'ingestion et ne peut pas prendre son verrou.
+    
+    conn.close() rend la connexion au pool (voir PooledConnection).
     """
-    conn = sqlite3.connect(DATABASE_PATH, timeout=10.0)
+    key = (DATABASE_PATH, readonly)
+    pool = _get_pool(key)
+    
+    try:
+        return pool.get_nowait()
+    except queue.Empty:
+        pass
+    
+    if readonly:
+        conn = sqlite3.connect(
+            f'file:{quote(DATABASE_PATH)}?mode=ro',
+            uri=True,
+            timeout=10.0,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=PooledConnection
+        )
+        conn.execute('PRAGMA query_only=ON')
+    else:
+        conn = sqlite3.connect(
+            DATABASE_PATH,
+            timeout=10.0,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=PooledConnection
+        )
+        conn.execute('PRAGMA journal_mode=WAL')  # Write-Ahead Logging
+    
     conn.row_factory = sqlite3.Row
+    conn.pool = pool
+    conn.pool_key = key
     
     # Optimisations SQLite pour performance
-    conn.execute('PRAGMA journal_mode=WAL')      # Write-Ahead Logging
     conn.execute('PRAGMA synchronous=NORMAL')    # Balance perf/sécurité
     conn.execute('PRAGMA cache_size=-64000')     # 64MB cache
     conn.execute('PRAGMA temp_store=MEMORY')     # Tables temp en RAM
     
     return conn
 
+def close_db_connections():
+    """Ferme réellement toutes les connexions inactives du pool (reset, tests)."""
+    global _pools
+    
+    with _pools_lock:
+        pools, _pools = _pools, {}
+    
+    for pool in pools.values():
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+def _begin_immediate(conn: sqlite3.Connection, operation: str) -> float:
+    """
+    Prend le verrou écrivain (BEGIN IMMEDIATE) en mesurant l'attente.
+    Returns: instant d'obtention du verrou, pour _commit_write()
+    """
+    started = time.perf_counter()
+    conn.execute('BEGIN IMMEDIATE')
+    locked_at = time.perf_counter()
+    record_lock_wait(operation, locked_at - started)
+    return locked_at
+
+def _commit_write(conn: sqlite3.Connection, operation: str, locked_at: float):
+    """COMMIT + durée de détention du verrou écrivain."""
+    conn.commit()
+    DB_LOCK_HELD_SECONDS.observe(time.perf_counter() - locked_at, operation=operation)
+
 def init_db(force_reset: bool = False):
     """
     Initialise BDD avec schema.sql.
     
+    Le schéma est idempotent (IF NOT EXISTS) : il est rejoué sur une BDD
+    existante pour créer les tables ajoutées depuis sa création.
+    
     Args:
         force_reset: Si True, supprime BDD existante (DEV ONLY!)
     """
     schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
     
     if force_reset and os.path.exists(DATABASE_PATH):
+        close_db_connections()
         os.remove(DATABASE_PATH)
         print(f"⚠️  Database reset: {DATABASE_PATH}")
     
     if not os.path.exists(DATABASE_PATH):
         print(f"🔧 Initializing database at {DATABASE_PATH}...")
         
-        with open(schema_path, 'r') as f:
-            schema_sql = f.read()
-        
-        conn = get_db_connection()
-        conn.executescript(schema_sql)
-        conn.commit()
+        # auto_vacuum se fixe avant la première table (et avant le WAL) :
+        # la rétention rend l'espace libéré au disque par incremental_vacuum
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
         conn.close()
-        
-        print(f"✅ Database initialized successfully")
     else:
-        print(f"ℹ️  Database already exists: {DATABASE_PATH}")
+        print(f"ℹ️  Database already exists: {DATABASE_PATH} (schema update)")
+    
+    with open(schema_path, 'r') as f:
+        schema_sql = f.read()
+    
+    conn = get_db_connection()
+    
+    # Colonnes ajoutées depuis (CREATE TABLE IF NOT EXISTS ne les crée pas),
+    # avant le schéma : ses index et triggers les référencent
+    _ensure_columns(conn, 'attacks', {'ip_int': 'INTEGER', 'asn': 'TEXT'})
+    _ensure_columns(conn, 'attack_events', {'event_type': 'TEXT'})
+    conn.executescript(schema_sql)
+    
+    # Génération initiale horodatée : une BDD recréée ne réutilise pas d'anciens ETags
+    conn.execute(
+        'INSERT OR IGNORE INTO ingest_state (key, value) VALUES (?, ?)',
+        (DATA_GENERATION_KEY, str(int(datetime.now().timestamp() * 1000)))
+    )
+    
+    # Répare les niveaux calculés sur le batch au lieu du total (anciennes versions)
+    conn.execute(f'''
+        UPDATE attacks SET threat_level = {_threat_level_sql('total_attempts')}
+        WHERE threat_level != {_threat_level_sql('total_attempts')}
+    ''')
+    
+    # Compteurs matérialisés absents (nouvelle table) → amorçage par un scan unique
+    if conn.execute('SELECT 1 FROM dashboard_counters').fetchone() is None:
+        conn.execute('''
+            INSERT OR IGNORE INTO dashboard_counters
+            SELECT
+                1,
+                COUNT(*),
+                COALESCE(SUM(total_attempts), 0),
+                MAX(last_seen),
+                COUNT(CASE WHEN threat_level = 'Critique' THEN 1 END),
+                COUNT(CASE WHEN threat_level = 'Élevé' THEN 1 END),
+                COUNT(CASE WHEN threat_level = 'Modéré' THEN 1 END),
+                COUNT(CASE WHEN is_banned = 1 THEN 1 END)
+            FROM attacks
+        ''')
+    
+    # IPs d'avant la colonne ip_int (IPv6 : NULL, pas de clusters réseau)
+    missing = conn.execute(
+        "SELECT id, ip FROM attacks WHERE ip_int IS NULL AND ip NOT LIKE '%:%'"
+    ).fetchall()
+    backfill = [(_ip_to_int(row['ip']), row['id']) for row in missing]
+    conn.executemany(
+        'UPDATE attacks SET ip_int = ? WHERE id = ?',
+        [values for values in backfill if values[0] is not None]
+    )
+    
+    # Clusters absents (nouvelle table) → amorçage depuis attacks
+    if conn.execute('SELECT 1 FROM attack_clusters LIMIT 1').fetchone() is None:
+        _seed_attack_clusters(conn)
+    
+    # Vue par hôte absente (nouvelle table) : l'existant vient de ce serveur
+    if conn.execute('SELECT 1 FROM attack_hosts LIMIT 1').fetchone() is None:
+        conn.execute('''
+            INSERT INTO attack_hosts (host, ip, attempts, first_seen, last_seen)
+            SELECT ?, ip, total_attempts, first_seen, last_seen FROM attacks
+        ''', (LOCAL_HOST,))
+    conn.commit()
+    conn.close()
+    
+    print(f"✅ Database initialized successfully")
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+    """ALTER TABLE ADD COLUMN des colonnes manquantes (table absente : rien)."""
+    existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if not existing:
+        return
+    
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+            print(f"🔧 Added column {table}.{name}")
+
+def _seed_attack_clusters(conn: sqlite3.Connection):
+    """Recalcule attack_clusters (/24, /16, ASN) par un scan unique de attacks."""
+    conn.execute('DELETE FROM attack_clusters')
+    conn.execute(f'''
+        INSERT INTO attack_clusters (kind, cluster, ip_count, attempts, critical_count, last_seen)
+        SELECT kind, cluster, COUNT(*), SUM(total_attempts),
+               SUM(threat_level IS 'Critique'), MAX(last_seen)
+        FROM (
+            SELECT 'net24' AS kind, {_NET24_SQL} AS cluster, total_attempts, threat_level, last_seen
+            FROM attacks WHERE ip_int IS NOT NULL
+            UNION ALL
+            SELECT 'net16', {_NET16_SQL}, total_attempts, threat_level, last_seen
+            FROM attacks WHERE ip_int IS NOT NULL
+            UNION ALL
+            SELECT 'asn', asn, total_attempts, threat_level, last_seen
+            FROM attacks WHERE asn IS NOT NULL
+        )
+        GROUP BY kind, cluster
+    ''')
 
 # ============================================
 # CRUD - ATTACKS
 # ============================================
 
+@timed_query
 def upsert_attack(
     ip: str,
     attempts: int = 1,
@@ -92,9 +327,9 @@ def upsert_attack(
         # UPSERT
         cursor = conn.execute('''
             INSERT INTO attacks (
-                ip, total_attempts, country, country_name, city, isp, threat_level
+                ip, ip_int, total_attempts, country, country_name, city, isp, threat_level
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             
             ON CONFLICT(ip) DO UPDATE SET
                 total_attempts = total_attempts + excluded.total_attempts,
@@ -104,7 +339,15 @@ def upsert_attack(
                 country_name = COALESCE(excluded.country_name, country_name),
                 city = COALESCE(excluded.city, city),
                 isp = COALESCE(excluded.isp, isp)
-        ''', (ip, attempts, country, country_name, city, isp, threat_level))
+        ''', (ip, _ip_to_int(ip), attempts, country, country_name, city, isp, threat_level))
+        conn.execute('''
+            INSERT INTO attack_hosts (host, ip, attempts, first_seen, last_seen)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ON CONFLICT(host, ip) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                last_seen = excluded.last_seen
+        ''', (LOCAL_HOST, ip, attempts))
+        _bump_data_generation(conn)
         
         conn.commit()
         
@@ -114,61 +357,144 @@ def upsert_attack(
         
     except sqlite3.Error as e:
         print(f"❌ Database error upserting {ip}: {e}")
+        record_sqlite_error('upsert_attack', e)
         conn.rollback()
         return {}
     finally:
         conn.close()
 
-def bulk_upsert_attacks(attacks: List[Dict]) -> int:
+@timed_query
+def bulk_upsert_attacks(
+    attacks: List[Dict],
+    events: Optional[List[Dict]] = None,
+    state: Optional[Dict[str, str]] = None,
+    expected_state: Optional[Dict[str, Optional[str]]] = None,
+    bursts: Optional[List[Dict]] = None
+) -> int:
     """
     UPSERT en batch pour performance (évite N connexions).
     
+    L'état d'ingestion (ex : curseur journalctl) est écrit dans la MÊME
+    transaction que les compteurs : soit les deux sont commités, soit aucun
+    → chaque tentative est comptée exactement une fois.
+    
     Args:
         attacks: Liste de dicts avec clés ip, attempts, country...
+            (+ first_seen/last_seen UTC optionnels, sinon CURRENT_TIMESTAMP)
+        events: Tentatives unitaires (ip, timestamp, username, port,
+            auth_method, event_type) ajoutées à attack_events + rollups, même transaction
+        state: Valeurs ingest_state à persister avec le batch
+        expected_state: Valeurs ingest_state attendues avant écriture
+            (compare-and-set). Si un autre ingesteur a avancé le curseur
+            entre-temps, le batch est abandonné pour éviter un double comptage.
+        bursts: Rafales détectées dans le batch (app/detector.py)
     
     Returns:
         Nombre d'IPs traitées
     """
-    if not attacks:
+    if not attacks and not state:
         return 0
     
     conn = get_db_connection()
     count = 0
     
     try:
-        for attack in attacks:
-            threat_level = _calculate_threat_level(attack.get('attempts', 1))
-            
-            conn.execute('''
-                INSERT INTO attacks (
-                    ip, total_attempts, country, country_name, city, isp, threat_level
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                
-                ON CONFLICT(ip) DO UPDATE SET
-                    total_attempts = total_attempts + excluded.total_attempts,
-                    last_seen = CURRENT_TIMESTAMP,
-                    threat_level = excluded.threat_level,
-                    country = COALESCE(excluded.country, country),
-                    country_name = COALESCE(excluded.country_name, country_name),
-                    city = COALESCE(excluded.city, city),
-                    isp = COALESCE(excluded.isp, isp)
-            ''', (
-                attack['ip'],
-                attack.get('attempts', 1),
-                attack.get('country'),
-                attack.get('country_name'),
-                attack.get('city'),
-                attack.get('isp'),
-                threat_level
-            ))
-            count += 1
+        # Verrou écrivain dès le début : le compare-and-set reste atomique
+        locked_at = _begin_immediate(conn, 'bulk_upsert')
         
-        conn.commit()
+        for key, expected in (expected_state or {}).items():
+            row = conn.execute('SELECT value FROM ingest_state WHERE key = ?', (key,)).fetchone()
+            current = row['value'] if row else None
+            if current != expected:
+                print(f"⚠️  Ingest state '{key}' changed concurrently, batch skipped")
+                INGEST_CONFLICTS.inc()
+                conn.rollback()
+                return 0
+        
+        if attacks:
+            count = _merge_attacks(conn, attacks)
+            _bump_data_generation(conn)
+        
+        if events:
+            _record_events(conn, events)
+        
+        if bursts:
+            _record_bursts(conn, bursts)
+        
+        for key, value in (state or {}).items():
+            _set_ingest_state(conn, key, value)
+        
+        _commit_write(conn, 'bulk_upsert', locked_at)
         print(f"✅ Bulk upserted {count} attacks")
         
+        if events:
+            record_newest_event(max(event['timestamp'] for event in events))
+        
     except sqlite3.Error as e:
         print(f"❌ Bulk upsert error: {e}")
+        record_sqlite_error('bulk_upsert', e)
+        conn.rollback()
+        count = 0
+    finally:
+        conn.close()
+    
+    return count
+
+@timed_query
+def backfill_attacks(
+    attacks: List[Dict],
+    hour_counts: Dict[Tuple[str, str], int],
+    state: Dict[str, str]
+) -> int:
+    """
+    Import d'historique (python run.py backfill) en une transaction.
+    
+    Comme bulk_upsert_attacks, mais sans events bruts (rétention 7 jours) :
+    les tentatives pré-agrégées par (heure, IP) vont directement dans les
+    rollups horaires. Les alertes temps réel (stream_events) déclenchées
+    par l'import sont retirées : ce sont de vieilles attaques.
+    
+    Args:
+        attacks: [{ip, attempts, first_seen, last_seen}] déjà fusionnés par IP
+        hour_counts: {(heure 'YYYY-MM-DD HH:00', ip): tentatives}
+        state: Empreintes des fichiers importés (ingest_state). Si l'une
+            existe déjà (import concurrent), le batch est abandonné.
+    
+    Returns:
+        Nombre d'IPs traitées
+    """
+    conn = get_db_connection()
+    count = 0
+    
+    try:
+        locked_at = _begin_immediate(conn, 'backfill')
+        
+        placeholders = ','.join('?' * len(state))
+        if state and conn.execute(
+            f'SELECT 1 FROM ingest_state WHERE key IN ({placeholders})', list(state)
+        ).fetchone():
+            print("⚠️  Backfill batch already imported, skipped")
+            conn.rollback()
+            return 0
+        
+        last_event_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM stream_events').fetchone()[0]
+        
+        if attacks:
+            count = _merge_attacks(conn, attacks)
+            _bump_data_generation(conn)
+        
+        _add_hour_ip_rollups(conn, hour_counts)
+        conn.execute('DELETE FROM stream_events WHERE id > ?', (last_event_id,))
+        
+        for key, value in state.items():
+            _set_ingest_state(conn, key, value)
+        
+        _commit_write(conn, 'backfill', locked_at)
+        print(f"✅ Backfilled {count} attacks")
+        
+    except sqlite3.Error as e:
+        print(f"❌ Backfill error: {e}")
+        record_sqlite_error('backfill', e)
         conn.rollback()
         count = 0
     finally:
@@ -176,6 +502,120 @@ def bulk_upsert_attacks(attacks: List[Dict]) -> int:
     
     return count
 
+@timed_query
+def get_earliest_attack() -> Optional[str]:
+    """Plus ancien first_seen en base (UTC), None si aucune attaque."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT MIN(first_seen) FROM attacks').fetchone()
+    conn.close()
+    
+    return row[0] if row else None
+
+@timed_query
+def get_newest_attack() -> Optional[str]:
+    """Plus récent last_seen en base (UTC), None si aucune attaque."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT MAX(last_seen) FROM attacks').fetchone()
+    conn.close()
+    
+    return row[0] if row else None
+
+@timed_query
+def _merge_attacks(conn: sqlite3.Connection, attacks: List[Dict], host: str = LOCAL_HOST) -> int:
+    """
+    Fusion ensembliste d'un batch dans attacks (transaction de l'appelant).
+    
+    Les lignes sont chargées par executemany dans une table temporaire
+    (propre à la connexion), puis fusionnées par un seul INSERT ... SELECT
+    ... ON CONFLICT. Le niveau de menace est recalculé en SQL sur le total
+    fusionné : une IP qui arrive par petits batchs finit bien Critique.
+    Les mêmes tentatives sont ajoutées à la vue par hôte (attack_hosts).
+    """
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS attacks_staging (
+            ip TEXT NOT NULL,
+            ip_int INTEGER,
+            attempts INTEGER NOT NULL,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            country TEXT,
+            country_name TEXT,
+            city TEXT,
+            isp TEXT
+        )
+    ''')
+    conn.execute('DELETE FROM temp.attacks_staging')
+    
+    conn.executemany(
+        'INSERT INTO temp.attacks_staging VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [
+            (
+                attack['ip'],
+                _ip_to_int(attack['ip']),
+                attack.get('attempts', 1),
+                attack.get('first_seen'),
+                attack.get('last_seen'),
+                attack.get('country'),
+                attack.get('country_name'),
+                attack.get('city'),
+                attack.get('isp')
+            )
+            for attack in attacks
+        ]
+    )
+    
+    # GROUP BY : une IP présente 2x dans le batch est fusionnée avant l'UPSERT
+    # (WHERE true : lève l'ambiguïté ON CONFLICT / jointure du parseur SQLite)
+    conn.execute(f'''
+        INSERT INTO attacks (
+            ip, ip_int, total_attempts, first_seen, last_seen,
+            country, country_name, city, isp, threat_level
+        )
+        SELECT
+            ip,
+            MAX(ip_int),
+            SUM(attempts),
+            COALESCE(MIN(first_seen), CURRENT_TIMESTAMP),
+            COALESCE(MAX(last_seen), CURRENT_TIMESTAMP),
+            MAX(country), MAX(country_name), MAX(city), MAX(isp),
+            {_threat_level_sql('SUM(attempts)')}
+        FROM temp.attacks_staging
+        WHERE true
+        GROUP BY ip
+        
+        ON CONFLICT(ip) DO UPDATE SET
+            total_attempts = total_attempts + excluded.total_attempts,
+            first_seen = MIN(first_seen, excluded.first_seen),
+            last_seen = MAX(last_seen, excluded.last_seen),
+            threat_level = {_threat_level_sql('total_attempts + excluded.total_attempts')},
+            country = COALESCE(excluded.country, country),
+            country_name = COALESCE(excluded.country_name, country_name),
+            city = COALESCE(excluded.city, city),
+            isp = COALESCE(excluded.isp, isp)
+    ''')
+    
+    conn.execute('''
+        INSERT INTO attack_hosts (host, ip, attempts, first_seen, last_seen)
+        SELECT
+            ?, ip, SUM(attempts),
+            COALESCE(MIN(first_seen), CURRENT_TIMESTAMP),
+            COALESCE(MAX(last_seen), CURRENT_TIMESTAMP)
+        FROM temp.attacks_staging
+        WHERE true
+        GROUP BY ip
+        
+        ON CONFLICT(host, ip) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            first_seen = MIN(first_seen, excluded.first_seen),
+            last_seen = MAX(last_seen, excluded.last_seen)
+    ''', (host,))
+    
+    count = conn.execute('SELECT COUNT(DISTINCT ip) FROM temp.attacks_staging').fetchone()[0]
+    conn.execute('DELETE FROM temp.attacks_staging')
+    
+    return count
+
+@timed_query
 def get_all_attacks(
     limit: int = 100,
     offset: int = 0,
@@ -191,7 +631,7 @@ def get_all_attacks(
         threat_filter: Filtre par 'Critique', 'Élevé', 'Modéré'
         country_filter: Filtre par code pays (FR, CN...)
     """
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     
     query = 'SELECT * FROM attacks WHERE 1=1'
     params = []
@@ -212,34 +652,241 @@ def get_all_attacks(
     
     return [dict(attack) for attack in attacks]
 
+# Tris de /api/attacks : colonne de tri (keyset sur (colonne, id))
+ATTACKS_PAGE_SORTS = {
+    'attempts': 'total_attempts',
+    'last_seen': 'last_seen',
+    'ip': 'ip'
+}
+
+@timed_query
+def get_attacks_page(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = 'attempts',
+    threat_filter: Optional[str] = None,
+    country_filter: Optional[str] = None,
+    ip_prefix: Optional[str] = None,
+    min_attempts: Optional[int] = None
+) -> Dict:
+    """
+    Page d'attaques en pagination keyset (curseur) : coût constant quelle
+    que soit la profondeur, contrairement à OFFSET qui relit les lignes sautées.
+    
+    Args:
+        limit: Taille de page
+        cursor: next_cursor de la page précédente (opaque)
+        sort: 'attempts' (défaut), 'last_seen' ou 'ip' (décroissant, sauf ip)
+        threat_filter: 'Critique', 'Élevé', 'Modéré'
+        country_filter: Code pays (FR, CN...)
+        ip_prefix: Début d'IP ("185.220.") → plage sur l'index UNIQUE(ip),
+            résultats triés par IP
+        min_attempts: Tentatives minimum
+    
+    Returns:
+        {attacks: [...], next_cursor: str ou None si dernière page}
+    
+    Raises:
+        ValueError: tri ou curseur invalide
+    """
+    if ip_prefix:
+        sort = 'ip'
+    if sort not in ATTACKS_PAGE_SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    
+    column = ATTACKS_PAGE_SORTS[sort]
+    descending = sort != 'ip'
+    
+    where, params = _attacks_filter_sql(threat_filter, country_filter, ip_prefix, min_attempts)
+    query = f'SELECT * FROM attacks WHERE {where}'
+    
+    if cursor:
+        value, last_id = _decode_page_cursor(cursor)
+        if sort == 'ip':
+            query += ' AND ip > ?'
+            params.append(value)
+        else:
+            query += f' AND ({column}, id) < (?, ?)'
+            params.extend([value, last_id])
+    
+    if descending:
+        query += f' ORDER BY {column} DESC, id DESC LIMIT ?'
+    else:
+        query += f' ORDER BY {column} LIMIT ?'
+    params.append(limit + 1)
+    
+    conn = get_db_connection(readonly=True)
+    rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+    conn.close()
+    
+    # limit + 1 lignes lues : la dernière indique s'il reste une page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_page_cursor(rows[-1][column], rows[-1]['id'])
+    
+    return {'attacks': rows, 'next_cursor': next_cursor}
+
+# Colonnes exportées (/api/export), dans l'ordre
+EXPORT_COLUMNS = (
+    'ip', 'total_attempts', 'first_seen', 'last_seen', 'threat_level',
+    'country', 'country_name', 'city', 'isp', 'asn', 'is_banned', 'ban_date'
+)
+
+@timed_query
+def iter_attacks(
+    threat_filter: Optional[str] = None,
+    country_filter: Optional[str] = None,
+    ip_prefix: Optional[str] = None,
+    min_attempts: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    batch_size: int = 1000
+) -> Iterator[tuple]:
+    """
+    Toutes les attaques filtrées (EXPORT_COLUMNS), lues par paquets
+    (fetchmany) dans l'ordre d'insertion : mémoire constante et premières
+    lignes disponibles immédiatement, même sur des millions d'IPs.
+    
+    Args:
+        threat_filter, country_filter, ip_prefix, min_attempts: comme get_attacks_page
+        since / until: fenêtre UTC 'YYYY-MM-DD HH:MM:SS' → IPs actives
+            dans la fenêtre (last_seen >= since, first_seen <= until)
+    
+    Le curseur garde un snapshot WAL cohérent pendant tout l'export ;
+    les écritures continuent en parallèle.
+    """
+    where, params = _attacks_filter_sql(threat_filter, country_filter, ip_prefix, min_attempts)
+    
+    if since:
+        where += ' AND last_seen >= ?'
+        params.append(since)
+    if until:
+        where += ' AND first_seen <= ?'
+        params.append(until)
+    
+    conn = get_db_connection(readonly=True)
+    
+    try:
+        cursor = conn.execute(
+            f'SELECT {", ".join(EXPORT_COLUMNS)} FROM attacks WHERE {where} ORDER BY id',
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from (tuple(row) for row in rows)
+    finally:
+        conn.close()
+
+def _attacks_filter_sql(
+    threat_filter: Optional[str],
+    country_filter: Optional[str],
+    ip_prefix: Optional[str],
+    min_attempts: Optional[int]
+) -> Tuple[str, List]:
+    """Clause WHERE (+ paramètres) commune à la pagination et à l'export."""
+    query = '1=1'
+    params: List = []
+    
+    if threat_filter:
+        query += ' AND threat_level = ?'
+        params.append(threat_filter)
+        
+        # Niveau = fonction des tentatives : la plage équivalente permet à
+        # l'index (country, total_attempts) de sauter droit à la bonne tranche
+        low, high = {
+            'Critique': (THREAT_CRITICAL_THRESHOLD, None),
+            'Élevé': (THREAT_HIGH_THRESHOLD, THREAT_CRITICAL_THRESHOLD),
+            'Modéré': (None, THREAT_HIGH_THRESHOLD)
+        }.get(threat_filter, (None, None))
+        if low is not None:
+            query += ' AND total_attempts >= ?'
+            params.append(low)
+        if high is not None:
+            query += ' AND total_attempts < ?'
+            params.append(high)
+    
+    if country_filter:
+        query += ' AND country = ?'
+        params.append(country_filter)
+    
+    if min_attempts:
+        query += ' AND total_attempts >= ?'
+        params.append(min_attempts)
+    
+    if ip_prefix:
+        # Préfixe → plage [prefix, prefix+1[ : range scan sur l'index, pas de LIKE
+        query += ' AND ip >= ? AND ip < ?'
+        params.extend([ip_prefix, ip_prefix[:-1] + chr(ord(ip_prefix[-1]) + 1)])
+    
+    return query, params
+
+def _encode_page_cursor(value, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip('=')
+
+def _decode_page_cursor(cursor: str) -> Tuple:
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return value, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+@timed_query
 def get_attack_by_ip(ip: str) -> Optional[Dict]:
     """Récupère une IP spécifique."""
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     attack = conn.execute('SELECT * FROM attacks WHERE ip = ?', (ip,)).fetchone()
     conn.close()
     
     return dict(attack) if attack else None
 
+# Paramètres max par requête (limite SQLite historique : 999)
+IN_CLAUSE_CHUNK = 500
+
+@timed_query
+def get_attacks_by_ips(ips: List[str]) -> Dict[str, Dict]:
+    """
+    Récupère un lot d'IPs en une requête WHERE ip IN (...) par tranche
+    de IN_CLAUSE_CHUNK (une seule connexion). Returns: {ip: row}
+    """
+    unique_ips = list(dict.fromkeys(ips))
+    attacks: Dict[str, Dict] = {}
+    
+    conn = get_db_connection(readonly=True)
+    
+    for start in range(0, len(unique_ips), IN_CLAUSE_CHUNK):
+        chunk = unique_ips[start:start + IN_CLAUSE_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(f'SELECT * FROM attacks WHERE ip IN ({placeholders})', chunk).fetchall()
+        attacks.update((row['ip'], dict(row)) for row in rows)
+    
+    conn.close()
+    return attacks
+
 # ============================================
 # STATISTIQUES DASHBOARD
 # ============================================
 
+@timed_query
 def get_dashboard_stats() -> Dict:
     """
-    Stats globales via vue optimisée.
+    Stats globales via vue optimisée (compteurs matérialisés, O(1)).
     
     Returns:
         {unique_ips, total_attempts, critical_count, high_count...}
     """
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     stats = conn.execute('SELECT * FROM v_dashboard_stats').fetchone()
     conn.close()
     
     return dict(stats) if stats else {}
 
+@timed_query
 def get_top_countries(limit: int = 5) -> List[Dict]:
     """Top pays par nombre total d'attaques."""
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     
     countries = conn.execute('''
         SELECT 
@@ -257,6 +904,7 @@ def get_top_countries(limit: int = 5) -> List[Dict]:
     conn.close()
     return [dict(c) for c in countries]
 
+@timed_query
 def get_top_ips(limit: int = 10, critical_only: bool = False) -> List[Dict]:
     """
     Top IPs par nombre de tentatives.
@@ -264,7 +912,7 @@ def get_top_ips(limit: int = 10, critical_only: bool = False) -> List[Dict]:
     Args:
         critical_only: Si True, filtre seulement Critique
     """
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     
     query = '''
         SELECT * FROM attacks
@@ -281,25 +929,83 @@ def get_top_ips(limit: int = 10, critical_only: bool = False) -> List[Dict]:
     
     return [dict(ip) for ip in ips]
 
+# Candidats au ban : IPs Critique (cumul) + rafales signalées depuis N jours
+BURST_BAN_DAYS = 7
+
+_BAN_CANDIDATES_SQL = '''
+    SELECT a.ip, a.total_attempts, a.country_name, b.burst_window
+    FROM attacks a
+    LEFT JOIN burst_flags b ON b.ip = a.ip AND b.last_flagged >= datetime('now', '-' || :days || ' days')
+    WHERE a.threat_level = 'Critique'
+      AND a.is_banned = 0
+    
+    UNION ALL
+    
+    SELECT a.ip, a.total_attempts, a.country_name, b.burst_window
+    FROM burst_flags b
+    JOIN attacks a ON a.ip = b.ip
+    WHERE b.last_flagged >= datetime('now', '-' || :days || ' days')
+      AND a.threat_level != 'Critique'
+      AND a.is_banned = 0
+    
+    ORDER BY total_attempts DESC
+'''
+
+@timed_query
 def get_critical_ips_for_ban() -> List[Dict]:
     """
-    Récupère IPs critiques non bannies (pour auto-ban).
-    
-    Utilise index composite idx_attacks_critical pour perf.
+    Récupère les IPs à bannir non bannies (pour auto-ban) : Critique
+    au cumul, ou rafale de brute-force signalée depuis BURST_BAN_DAYS
+    (burst_window renseigné).
     """
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     
-    ips = conn.execute('''
-        SELECT ip, total_attempts, country_name
-        FROM attacks 
-        WHERE threat_level = 'Critique' 
-          AND is_banned = 0
-        ORDER BY total_attempts DESC
-    ''').fetchall()
+    ips = conn.execute(_BAN_CANDIDATES_SQL, {'days': BURST_BAN_DAYS}).fetchall()
     
     conn.close()
     return [dict(ip) for ip in ips]
 
+@timed_query
+def iter_critical_ips_for_ban(batch_size: int = 1000) -> Iterator[Dict]:
+    """
+    Comme get_critical_ips_for_ban(), lu par paquets (fetchmany) : les
+    scripts de ban générés en flux ne chargent jamais toute la liste.
+    """
+    conn = get_db_connection(readonly=True)
+    
+    try:
+        cursor = conn.execute(_BAN_CANDIDATES_SQL, {'days': BURST_BAN_DAYS})
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+@timed_query
+def get_ban_candidate_count() -> int:
+    """Nombre d'IPs proposées au ban (badge du bouton Auto-ban)."""
+    conn = get_db_connection(readonly=True)
+    
+    count = conn.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM attacks WHERE threat_level = 'Critique' AND is_banned = 0)
+            + (
+                SELECT COUNT(*)
+                FROM burst_flags b
+                JOIN attacks a ON a.ip = b.ip
+                WHERE b.last_flagged >= datetime('now', '-' || ? || ' days')
+                  AND a.threat_level != 'Critique'
+                  AND a.is_banned = 0
+            )
+    ''', (BURST_BAN_DAYS,)).fetchone()[0]
+    
+    conn.close()
+    return count
+
+@timed_query
 def mark_ip_as_banned(ip: str):
     """Marque IP comme bannie (évite de proposer 2x)."""
     conn = get_db_connection()
@@ -309,81 +1015,1240 @@ def mark_ip_as_banned(ip: str):
         SET is_banned = 1, ban_date = CURRENT_TIMESTAMP
         WHERE ip = ?
     ''', (ip,))
+    _bump_data_generation(conn)
     
     conn.commit()
     conn.close()
 
 # ============================================
-# HISTORIQUE TEMPOREL
+# CLUSTERS (SOUS-RÉSEAUX / ASN)
 # ============================================
 
-def get_attacks_timeline(hours: int = 24) -> List[Dict]:
+# Clés de cluster calculées depuis ip_int (mêmes expressions que les triggers)
+_NET24_SQL = "printf('%d.%d.%d.0/24', ip_int >> 24, (ip_int >> 16) & 255, (ip_int >> 8) & 255)"
+_NET16_SQL = "printf('%d.%d.0.0/16', ip_int >> 24, (ip_int >> 16) & 255)"
+
+CLUSTER_KINDS = ('net24', 'net16', 'asn')
+
+@timed_query
+def get_clusters(kind: str = 'net24', limit: int = 20, min_ips: int = 1) -> List[Dict]:
     """
-    Attaques des X dernières heures pour graphique Chart.js.
+    Top clusters d'un type par tentatives cumulées.
     
-    Groupe par heure pour éviter trop de points sur graphique.
+    Args:
+        kind: 'net24', 'net16' ou 'asn'
+        min_ips: IPs attaquantes minimum dans le cluster (2+ = attaque distribuée)
+    
+    Lit attack_clusters (tenue par triggers) via idx_clusters_attempts.
     """
-    conn = get_db_connection()
+    if kind not in CLUSTER_KINDS:
+        raise ValueError(f"Unknown cluster kind: {kind}")
     
-    # SQLite : datetime('now', '-24 hours')
-    attacks = conn.execute('''
-        SELECT 
-            strftime('%Y-%m-%d %H:00', last_seen) as hour,
-            COUNT(*) as ip_count,
-            SUM(total_attempts) as attempts
-        FROM attacks 
-        WHERE last_seen >= datetime('now', '-' || ? || ' hours')
-        GROUP BY hour
-        ORDER BY hour ASC
-    ''', (hours,)).fetchall()
+    conn = get_db_connection(readonly=True)
+    
+    clusters = conn.execute('''
+        SELECT cluster, ip_count, attempts, critical_count, last_seen
+        FROM attack_clusters
+        WHERE kind = ? AND ip_count >= ?
+        ORDER BY attempts DESC
+        LIMIT ?
+    ''', (kind, min_ips, limit)).fetchall()
     
     conn.close()
-    return [dict(a) for a in attacks]
+    return [dict(cluster) for cluster in clusters]
 
-def save_history_snapshot():
+@timed_query
+def get_hot_subnets(min_ips: int, min_attempts: int) -> List[Dict]:
     """
-    Sauvegarde snapshot actuel pour historique long-terme.
-    À appeler via cron/scheduler toutes les heures.
+    /24 avec au moins `min_ips` IPs attaquantes et `min_attempts` tentatives
+    cumulées : candidats au bannissement par bloc CIDR.
     """
-    stats = get_dashboard_stats()
-    top_country = get_top_countries(limit=1)
+    conn = get_db_connection(readonly=True)
     
-    conn = get_db_connection()
+    subnets = conn.execute('''
+        SELECT cluster, ip_count, attempts
+        FROM attack_clusters
+        WHERE kind = 'net24' AND ip_count >= ? AND attempts >= ?
+        ORDER BY attempts DESC
+    ''', (min_ips, min_attempts)).fetchall()
     
-    conn.execute('''
-        INSERT INTO attack_history (
-            total_attacks, unique_ips, critical_count, top_country
-        ) VALUES (?, ?, ?, ?)
-    ''', (
-        stats.get('total_attempts', 0),
-        stats.get('unique_ips', 0),
-        stats.get('critical_count', 0),
-        top_country[0]['country_name'] if top_country else None
-    ))
+    conn.close()
+    return [dict(subnet) for subnet in subnets]
+
+@timed_query
+def get_attacks_in_range(start: int, end: int, limit: int = 256) -> List[Dict]:
+    """
+    IPs attaquantes IPv4 entre deux entiers inclus (bloc CIDR), par
+    tentatives décroissantes. Range scan sur idx_attacks_ip_int.
+    """
+    conn = get_db_connection(readonly=True)
+    
+    attacks = conn.execute('''
+        SELECT ip, total_attempts, country, threat_level, last_seen, is_banned
+        FROM attacks
+        WHERE ip_int BETWEEN ? AND ?
+        ORDER BY total_attempts DESC
+        LIMIT ?
+    ''', (start, end, limit)).fetchall()
     
-    conn.commit()
     conn.close()
+    return [dict(attack) for attack in attacks]
 
 # ============================================
-# UTILS INTERNES
+# RAFALES (DÉTECTEUR FENÊTRES GLISSANTES)
 # ============================================
 
-def _calculate_threat_level(attempts: int) -> str:
-    """
-    Calcule threat_level selon seuil.
+@timed_query
+def get_burst_summary(hours: int = 24, limit: int = 10) -> Dict:
+    """Rafales signalées sur les N dernières heures : {count, recent: [...]}."""
+    conn = get_db_connection(readonly=True)
     
-    Modifie ces valeurs selon ton contexte :
-    - Critique: ≥50 tentatives (bannissement immédiat)
-    - Élevé: 20-49 tentatives (surveillance)
-    - Modéré: <20 tentatives (normal)
-    """
-    if attempts >= 50:
+    count = conn.execute(
+        "SELECT COUNT(*) FROM burst_flags WHERE last_flagged >= datetime('now', '-' || ? || ' hours')",
+        (hours,)
+    ).fetchone()[0]
+    
+    rows = conn.execute('''
+        SELECT
+            b.ip, b.burst_window, b.score, b.minute_rate, b.hour_rate, b.day_rate,
+            b.first_flagged, b.last_flagged, b.flag_count,
+            a.total_attempts, a.threat_level, a.country_name
+        FROM burst_flags b
+        LEFT JOIN attacks a ON a.ip = b.ip
+        WHERE b.last_flagged >= datetime('now', '-' || ? || ' hours')
+        ORDER BY b.last_flagged DESC
+        LIMIT ?
+    ''', (hours, limit)).fetchall()
+    
+    conn.close()
+    return {'count': count, 'recent': [dict(row) for row in rows]}
+
+@timed_query
+def get_burst_queue(limit: int = 5000) -> List[Dict]:
+    """Buckets agent en attente du détecteur, les plus anciens d'abord : [{id, minute, ip, attempts}]."""
+    conn = get_db_connection(readonly=True)
+    
+    rows = conn.execute('''
+        SELECT id, minute, ip, attempts FROM burst_queue
+        ORDER BY id
+        LIMIT ?
+    ''', (limit,)).fetchall()
+    
+    conn.close()
+    return [dict(row) for row in rows]
+
+@timed_query
+def ack_burst_queue(ids: List[int], bursts: List[Dict]) -> bool:
+    """
+    Rafales de buckets scorés + suppression de ces buckets de la file,
+    en une transaction.
+    
+    Returns:
+        True si commité (le détecteur peut alors compter les buckets)
+    """
+    conn = get_db_connection()
+    
+    try:
+        locked_at = _begin_immediate(conn, 'burst_queue')
+        
+        if bursts:
+            _record_bursts(conn, bursts)
+            _bump_data_generation(conn)
+        conn.executemany('DELETE FROM burst_queue WHERE id = ?', [(id_,) for id_ in ids])
+        
+        _commit_write(conn, 'burst_queue', locked_at)
+        return True
+        
+    except sqlite3.Error as e:
+        print(f"❌ Burst queue error: {e}")
+        record_sqlite_error('burst_queue', e)
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+@timed_query
+def get_burst_seed(since: str) -> List[Dict]:
+    """
+    Tentatives par (heure, ip) depuis l'heure `since` ('YYYY-MM-DD HH:00')
+    déjà passées par le détecteur : rollups horaires moins les buckets
+    encore en file (ils seront comptés au prochain passage). Reconstruit
+    la fenêtre jour d'un détecteur qui démarre.
+    
+    Returns:
+        [{bucket, ip, attempts}] par heure croissante
+    """
+    conn = get_db_connection(readonly=True)
+    
+    rows = conn.execute('''
+        SELECT h.bucket, h.ip, h.attempts - COALESCE(q.attempts, 0) AS attempts
+        FROM attack_rollup_hour_ip h
+        LEFT JOIN (
+            SELECT substr(minute, 1, 13) || ':00' AS bucket, ip, SUM(attempts) AS attempts
+            FROM burst_queue
+            GROUP BY 1, 2
+        ) q ON q.bucket = h.bucket AND q.ip = h.ip
+        WHERE h.bucket >= ? AND h.attempts > COALESCE(q.attempts, 0)
+        ORDER BY h.bucket, h.ip
+    ''', (since,)).fetchall()
+    
+    conn.close()
+    return [dict(row) for row in rows]
+
+def _queue_bursts(conn: sqlite3.Connection, buckets: List[Tuple[str, str, int]]):
+    """Buckets agent mis en file pour le détecteur (transaction de l'appelant)."""
+    conn.executemany(
+        'INSERT INTO burst_queue (minute, ip, attempts) VALUES (?, ?, ?)',
+        buckets
+    )
+
+def _record_bursts(conn: sqlite3.Connection, bursts: List[Dict]):
+    """UPSERT des rafales (transaction de l'appelant), score max conservé."""
+    conn.executemany('''
+        INSERT INTO burst_flags (
+            ip, burst_window, score, minute_rate, hour_rate, day_rate,
+            first_flagged, last_flagged
+        )
+        VALUES (
+            :ip, :burst_window, :score, :minute_rate, :hour_rate, :day_rate,
+            :flagged_at, :flagged_at
+        )
+        ON CONFLICT(ip) DO UPDATE SET
+            burst_window = CASE WHEN excluded.score > score THEN excluded.burst_window ELSE burst_window END,
+            score = MAX(score, excluded.score),
+            minute_rate = excluded.minute_rate,
+            hour_rate = excluded.hour_rate,
+            day_rate = excluded.day_rate,
+            first_flagged = MIN(first_flagged, excluded.first_flagged),
+            last_flagged = MAX(last_flagged, excluded.last_flagged),
+            flag_count = flag_count + 1
+    ''', bursts)
+
+# ============================================
+# MULTI-SERVEURS (AGENTS)
+# ============================================
+
+@timed_query
+def apply_host_batch(
+    host: str,
+    seq: int,
+    attacks: List[Dict],
+    buckets: List[Tuple[str, str, int]]
+) -> Optional[Dict]:
+    """
+    Applique un batch poussé par un agent (POST /api/ingest) en une transaction.
+    
+    Idempotent : un batch dont le numéro `seq` n'est pas supérieur au
+    dernier accepté pour cet hôte est un renvoi (ack perdu) et n'est
+    pas recompté.
+    
+    Args:
+        host: Nom du serveur émetteur
+        seq: Numéro de batch, croissant par hôte
+        attacks: Deltas par IP [{ip, attempts, first_seen, last_seen}]
+        buckets: Tentatives par (minute 'YYYY-MM-DD HH:MM', ip) pour les
+            rollups, mises en file pour le détecteur de rafales
+    
+    Returns:
+        {applied, last_seq, stored_ips}, None si erreur BDD
+    """
+    conn = get_db_connection()
+    
+    try:
+        locked_at = _begin_immediate(conn, 'host_batch')
+        
+        row = conn.execute('SELECT last_seq FROM ingest_hosts WHERE host = ?', (host,)).fetchone()
+        last_seq = row['last_seq'] if row else 0
+        if seq <= last_seq:
+            conn.rollback()
+            return {'applied': False, 'last_seq': last_seq, 'stored_ips': 0}
+        
+        count = _merge_attacks(conn, attacks, host=host) if attacks else 0
+        
+        minute_counts = defaultdict(int)
+        hour_ip_counts = defaultdict(int)
+        for minute, ip, attempts in buckets:
+            minute_counts[minute] += attempts
+            hour_ip_counts[(minute[:13] + ':00', ip)] += attempts
+        _add_minute_rollups(conn, minute_counts)
+        _add_hour_ip_rollups(conn, hour_ip_counts)
+        
+        # Scorés par le process ingesteur (app/detector.py), pas par ce
+        # worker qui ne voit qu'une part des batchs
+        _queue_bursts(conn, buckets)
+        
+        conn.execute('''
+            INSERT INTO ingest_hosts (host, last_seq, last_push)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(host) DO UPDATE SET
+                last_seq = excluded.last_seq,
+                last_push = excluded.last_push
+        ''', (host, seq))
+        
+        if attacks:
+            _bump_data_generation(conn)
+        _commit_write(conn, 'host_batch', locked_at)
+        
+        if attacks:
+            record_newest_event(max(attack['last_seen'] for attack in attacks))
+        
+        return {'applied': True, 'last_seq': seq, 'stored_ips': count}
+        
+    except sqlite3.Error as e:
+        print(f"❌ Host batch error ({host} #{seq}): {e}")
+        record_sqlite_error('host_batch', e)
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+@timed_query
+def get_host_last_seq(host: str) -> int:
+    """Dernier numéro de batch accepté pour un hôte (0 si inconnu)."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT last_seq FROM ingest_hosts WHERE host = ?', (host,)).fetchone()
+    conn.close()
+    
+    return row['last_seq'] if row else 0
+
+@timed_query
+def get_hosts(limit: int = 100) -> List[Dict]:
+    """Serveurs surveillés, les plus attaqués d'abord (totaux tenus par triggers)."""
+    conn = get_db_connection(readonly=True)
+    
+    rows = conn.execute('''
+        SELECT host, attempts, ip_count, last_seen, last_seq, last_push
+        FROM ingest_hosts
+        ORDER BY attempts DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+    
+    conn.close()
+    return [dict(row) for row in rows]
+
+@timed_query
+def get_host_top_ips(host: str, limit: int = 10) -> List[Dict]:
+    """Top IPs d'un serveur (tentatives sur cet hôte + géo/menace flotte)."""
+    conn = get_db_connection(readonly=True)
+    
+    rows = conn.execute('''
+        SELECT
+            h.ip, h.attempts, h.first_seen, h.last_seen,
+            a.total_attempts, a.country, a.country_name, a.city, a.isp,
+            a.threat_level, a.is_banned
+        FROM attack_hosts h
+        JOIN attacks a ON a.ip = h.ip
+        WHERE h.host = ?
+        ORDER BY h.attempts DESC
+        LIMIT ?
+    ''', (host, limit)).fetchall()
+    
+    conn.close()
+    return [dict(row) for row in rows]
+
+# ============================================
+# HISTORIQUE TEMPOREL
+# ============================================
+
+@timed_query
+def get_attacks_timeline(hours: int = 24) -> List[Dict]:
+    """
+    Attaques des X dernières heures pour graphique Chart.js.
+    
+    Lit le rollup horaire (une ligne par heure) : compte les tentatives
+    à l'heure où elles ont eu lieu, pas à la dernière activité de l'IP.
+    """
+    conn = get_db_connection(readonly=True)
+    
+    attacks = conn.execute('''
+        SELECT 
+            bucket as hour,
+            ip_count,
+            attempts
+        FROM attack_rollup_hour 
+        WHERE bucket >= strftime('%Y-%m-%d %H:00', 'now', '-' || ? || ' hours')
+        ORDER BY bucket ASC
+    ''', (hours,)).fetchall()
+    
+    conn.close()
+    return [dict(a) for a in attacks]
+
+@timed_query
+def get_attacks_daily(days: int = 90) -> List[Dict]:
+    """
+    Tentatives par jour (UTC) des X derniers jours pour timeline longue.
+    
+    Les totaux horaires ne sont jamais compactés ni archivés : la BDD
+    répond seule, quelle que soit l'ancienneté.
+    """
+    conn = get_db_connection(readonly=True)
+    
+    attacks = conn.execute('''
+        SELECT substr(bucket, 1, 10) as day, SUM(attempts) as attempts
+        FROM attack_rollup_hour
+        WHERE bucket >= strftime('%Y-%m-%d', 'now', '-' || ? || ' days')
+        GROUP BY day
+        ORDER BY day ASC
+    ''', (days,)).fetchall()
+    
+    conn.close()
+    return [dict(a) for a in attacks]
+
+@timed_query
+def get_attacks_per_minute(minutes: int = 60) -> List[Dict]:
+    """Tentatives par minute (rollup minute) pour vue temps réel."""
+    conn = get_db_connection(readonly=True)
+    
+    attacks = conn.execute('''
+        SELECT bucket as minute, attempts
+        FROM attack_rollup_minute
+        WHERE bucket >= strftime('%Y-%m-%d %H:%M', 'now', '-' || ? || ' minutes')
+        ORDER BY bucket ASC
+    ''', (minutes,)).fetchall()
+    
+    conn.close()
+    return [dict(a) for a in attacks]
+
+@timed_query
+def get_attacks_trend(hours: int = 24) -> int:
+    """
+    Tendance en % : tentatives des X dernières heures vs les X précédentes.
+    
+    Returns:
+        Variation arrondie (ex : 25 = +25%, -40 = -40%)
+    """
+    conn = get_db_connection(readonly=True)
+    
+    row = conn.execute('''
+        SELECT
+            SUM(CASE WHEN bucket >= strftime('%Y-%m-%d %H:00', 'now', '-' || ? || ' hours')
+                     THEN attempts ELSE 0 END) as current,
+            SUM(CASE WHEN bucket < strftime('%Y-%m-%d %H:00', 'now', '-' || ? || ' hours')
+                     THEN attempts ELSE 0 END) as previous
+        FROM attack_rollup_hour
+        WHERE bucket >= strftime('%Y-%m-%d %H:00', 'now', '-' || (? * 2) || ' hours')
+    ''', (hours, hours, hours)).fetchone()
+    
+    conn.close()
+    
+    current = row['current'] or 0
+    previous = row['previous'] or 0
+    
+    if previous == 0:
+        return 100 if current > 0 else 0
+    return round((current - previous) * 100 / previous)
+
+@timed_query
+def save_history_snapshot():
+    """
+    Sauvegarde snapshot actuel pour historique long-terme.
+    Appelé toutes les heures par la rétention (app/retention.py).
+    """
+    stats = get_dashboard_stats()
+    top_country = get_top_countries(limit=1)
+    
+    conn = get_db_connection()
+    
+    conn.execute('''
+        INSERT INTO attack_history (
+            total_attacks, unique_ips, critical_count, top_country
+        ) VALUES (?, ?, ?, ?)
+    ''', (
+        stats.get('total_attempts', 0),
+        stats.get('unique_ips', 0),
+        stats.get('critical_count', 0),
+        top_country[0]['country_name'] if top_country else None
+    ))
+    
+    conn.commit()
+    conn.close()
+
+# ============================================
+# GÉOLOCALISATION (CACHE)
+# ============================================
+
+# Durée de validité du cache géo (succès / échec)
+GEO_CACHE_TTL_DAYS = 30
+GEO_FAIL_TTL_DAYS = 1
+
+@timed_query
+def get_ips_missing_geo(
+    limit: int = 100,
+    ttl_days: int = GEO_CACHE_TTL_DAYS,
+    fail_ttl_days: int = GEO_FAIL_TTL_DAYS
+) -> List[str]:
+    """
+    IPs sans géolocalisation ET absentes du cache (ou cache expiré),
+    les plus actives d'abord (index partiel idx_attacks_missing_geo).
+    """
+    conn = get_db_connection(readonly=True)
+    
+    ips = conn.execute('''
+        SELECT a.ip FROM attacks a
+        WHERE a.country IS NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM geo_cache g
+              WHERE g.ip = a.ip
+                AND g.fetched_at >= datetime('now', '-' ||
+                    CASE g.status WHEN 'success' THEN ? ELSE ? END || ' days')
+          )
+        ORDER BY a.total_attempts DESC
+        LIMIT ?
+    ''', (ttl_days, fail_ttl_days, limit)).fetchall()
+    
+    conn.close()
+    return [row['ip'] for row in ips]
+
+@timed_query
+def apply_cached_geo() -> int:
+    """Recopie le cache géo sur les IPs sans pays (aucun appel réseau)."""
+    conn = get_db_connection()
+    
+    try:
+        cursor = conn.execute('''
+            UPDATE attacks SET
+                country = (SELECT g.country FROM geo_cache g WHERE g.ip = attacks.ip),
+                country_name = (SELECT g.country_name FROM geo_cache g WHERE g.ip = attacks.ip),
+                city = (SELECT g.city FROM geo_cache g WHERE g.ip = attacks.ip),
+                isp = (SELECT g.isp FROM geo_cache g WHERE g.ip = attacks.ip),
+                asn = (SELECT g.asn FROM geo_cache g WHERE g.ip = attacks.ip)
+            WHERE country IS NULL
+              AND ip IN (SELECT ip FROM geo_cache WHERE status = 'success')
+        ''')
+        if cursor.rowcount:
+            _bump_data_generation(conn)
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"❌ Geo cache apply error: {e}")
+        record_sqlite_error('apply_cached_geo', e)
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+@timed_query
+def store_geolocations(results: Dict[str, Optional[Dict]], cache_success: bool = True) -> int:
+    """
+    Enregistre un batch de géolocalisations (cache + table attacks)
+    en une transaction.
+    
+    Args:
+        results: {ip: {country, country_name, city, isp, asn, lat, lon}}
+            ou {ip: None} si l'IP n'a pas pu être localisée (un lieu sans
+            pays compte comme un échec : sinon l'IP reste sans pays et
+            serait redemandée à chaque cycle)
+        cache_success: False pour un backend local (lookup gratuit) :
+            seuls les échecs sont mis en cache, pour ne pas les redemander
+    
+    Returns:
+        Nombre d'IPs localisées
+    """
+    if not results:
+        return 0
+    
+    found = {ip: geo for ip, geo in results.items() if geo and geo.get('country')}
+    conn = get_db_connection()
+    
+    try:
+        conn.executemany('''
+            INSERT INTO geo_cache (
+                ip, status, country, country_name, city, isp, asn, lat, lon
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ip) DO UPDATE SET
+                status = excluded.status,
+                country = excluded.country,
+                country_name = excluded.country_name,
+                city = excluded.city,
+                isp = excluded.isp,
+                asn = excluded.asn,
+                lat = excluded.lat,
+                lon = excluded.lon,
+                fetched_at = CURRENT_TIMESTAMP
+        ''', [
+            (
+                ip, 'success' if ip in found else 'fail',
+                (geo or {}).get('country'), (geo or {}).get('country_name'),
+                (geo or {}).get('city'), (geo or {}).get('isp'), (geo or {}).get('asn'),
+                (geo or {}).get('lat'), (geo or {}).get('lon')
+            )
+            for ip, geo in results.items()
+            if cache_success or ip not in found
+        ])
+        
+        conn.executemany('''
+            UPDATE attacks SET
+                country = ?, country_name = ?, city = ?, isp = ?, asn = ?
+            WHERE ip = ?
+        ''', [
+            (
+                geo.get('country'), geo.get('country_name'), geo.get('city'),
+                geo.get('isp'), geo.get('asn'), ip
+            )
+            for ip, geo in found.items()
+        ])
+        if found:
+            _bump_data_generation(conn)
+        
+        conn.commit()
+        return len(found)
+        
+    except sqlite3.Error as e:
+        print(f"❌ Geo store error: {e}")
+        record_sqlite_error('store_geolocations', e)
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+# ============================================
+# ÉVÉNEMENTS BRUTS & ROLLUPS
+# ============================================
+
+# Rétention par défaut (prune_attack_events)
+EVENTS_RETENTION_DAYS = 7
+MINUTE_ROLLUP_RETENTION_HOURS = 48
+STREAM_EVENTS_RETENTION_HOURS = 24
+
+@timed_query
+def _record_events(conn: sqlite3.Connection, events: List[Dict]):
+    """
+    Ajoute les events bruts + met à jour les rollups minute/heure
+    (transaction de l'appelant). Les timestamps sont en UTC
+    'YYYY-MM-DD HH:MM:SS' : les buckets sont de simples préfixes.
+    """
+    minute_counts = defaultdict(int)
+    hour_ip_counts = defaultdict(int)
+    
+    for event in events:
+        timestamp = event['timestamp']
+        minute_counts[timestamp[:16]] += 1
+        hour_ip_counts[(timestamp[:13] + ':00', event['ip'])] += 1
+    
+    conn.executemany('''
+        INSERT INTO attack_events (ip, timestamp, username, port, auth_method, event_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (
+            e['ip'], e['timestamp'], e.get('username'), e.get('port'),
+            e.get('auth_method'), e.get('event_type')
+        )
+        for e in events
+    ])
+    
+    _add_minute_rollups(conn, minute_counts)
+    _add_hour_ip_rollups(conn, hour_ip_counts)
+
+def _add_minute_rollups(conn: sqlite3.Connection, counts: Dict[str, int]):
+    """Ajoute {minute 'YYYY-MM-DD HH:MM': tentatives} aux rollups minute."""
+    conn.executemany('''
+        INSERT INTO attack_rollup_minute (bucket, attempts) VALUES (?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET attempts = attempts + excluded.attempts
+    ''', list(counts.items()))
+
+def _add_hour_ip_rollups(conn: sqlite3.Connection, counts: Dict[Tuple[str, str], int]):
+    """Ajoute {(heure 'YYYY-MM-DD HH:00', ip): tentatives} aux rollups horaires."""
+    # attack_rollup_hour est maintenu par triggers sur cette table
+    conn.executemany('''
+        INSERT INTO attack_rollup_hour_ip (bucket, ip, attempts) VALUES (?, ?, ?)
+        ON CONFLICT(bucket, ip) DO UPDATE SET attempts = attempts + excluded.attempts
+    ''', [(bucket, ip, n) for (bucket, ip), n in counts.items()])
+
+@timed_query
+def prune_attack_events(
+    retention_days: int = EVENTS_RETENTION_DAYS,
+    minute_retention_hours: int = MINUTE_ROLLUP_RETENTION_HOURS,
+    batch_size: int = 10000
+) -> int:
+    """
+    Purge events bruts, rollups minute et alertes SSE au-delà de la rétention.
+    
+    Les events expirés sont d'abord compactés par jour dans
+    attack_rollup_day_detail (utilisateurs, méthodes, types), dans la
+    transaction qui les supprime. Traite par lots pour ne jamais garder
+    le verrou écrivain longtemps. Les rollups horaires sont conservés
+    (compactés à part, compact_hour_rollups).
+    
+    Returns:
+        Nombre d'events supprimés
+    """
+    conn = get_db_connection()
+    deleted = 0
+    
+    try:
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS _expired_events (id INTEGER PRIMARY KEY)')
+        
+        while True:
+            locked_at = _begin_immediate(conn, 'prune')
+            conn.execute('DELETE FROM _expired_events')
+            cursor = conn.execute('''
+                INSERT INTO _expired_events (id)
+                SELECT id FROM attack_events
+                WHERE timestamp < datetime('now', '-' || ? || ' days')
+                LIMIT ?
+            ''', (retention_days, batch_size))
+            expired = cursor.rowcount
+            
+            conn.execute('''
+                INSERT INTO attack_rollup_day_detail (day, kind, value, attempts)
+                SELECT day, kind, value, COUNT(*)
+                FROM (
+                    SELECT substr(timestamp, 1, 10) AS day, 'username' AS kind, username AS value
+                    FROM attack_events WHERE id IN _expired_events
+                    UNION ALL
+                    SELECT substr(timestamp, 1, 10), 'auth_method', auth_method
+                    FROM attack_events WHERE id IN _expired_events
+                    UNION ALL
+                    SELECT substr(timestamp, 1, 10), 'event_type', event_type
+                    FROM attack_events WHERE id IN _expired_events
+                )
+                WHERE value IS NOT NULL
+                GROUP BY day, kind, value
+                ON CONFLICT(day, kind, value) DO UPDATE SET attempts = attempts + excluded.attempts
+            ''')
+            conn.execute('DELETE FROM attack_events WHERE id IN _expired_events')
+            _commit_write(conn, 'prune', locked_at)
+            
+            deleted += expired
+            if expired < batch_size:
+                break
+        
+        conn.execute('''
+            DELETE FROM attack_rollup_minute
+            WHERE bucket < strftime('%Y-%m-%d %H:%M', 'now', '-' || ? || ' hours')
+        ''', (minute_retention_hours,))
+        
+        conn.execute('''
+            DELETE FROM stream_events
+            WHERE created_at < datetime('now', '-' || ? || ' hours')
+        ''', (STREAM_EVENTS_RETENTION_HOURS,))
+        conn.commit()
+        
+    except sqlite3.Error as e:
+        print(f"❌ Prune error: {e}")
+        record_sqlite_error('prune_attack_events', e)
+        conn.rollback()
+    finally:
+        conn.close()
+    
+    if deleted:
+        print(f"🧹 Compacted and pruned {deleted} raw events older than {retention_days} days")
+    return deleted
+
+# ============================================
+# RÉTENTION & ARCHIVES
+# ============================================
+
+# Rollups heure×IP gardés tels quels, compactés par jour au-delà
+HOUR_IP_RETENTION_DAYS = 30
+
+# Snapshots attack_history horaires gardés, un par jour au-delà
+HISTORY_HOURLY_DAYS = 30
+
+# Tables partitionnées par mois vers les archives :
+# (table, colonne date, clé de fusion additive ou None = lignes à id unique, colonne de contrôle)
+ARCHIVE_TABLES = (
+    ('attack_rollup_day_ip', 'day', 'day, ip', 'attempts'),
+    ('attack_rollup_day_detail', 'day', 'day, kind, value', 'attempts'),
+    ('attack_history', 'timestamp', None, 'id')
+)
+
+# Schéma recréé dans chaque fichier d'archive (repris de la BDD, triggers compris)
+ARCHIVE_SCHEMA_TABLES = (
+    'attack_rollup_day_ip', 'attack_rollup_day', 'attack_rollup_day_detail', 'attack_history'
+)
+
+# Clé ingest_state de la dernière passe d'archivage validée d'un mois
+ARCHIVE_STATE_PREFIX = 'archive:'
+
+# Archives ATTACHées par requête (limite SQLite par défaut : 10)
+ARCHIVE_ATTACH_BATCH = 8
+
+@timed_query
+def compact_hour_rollups(
+    retention_days: int = HOUR_IP_RETENTION_DAYS,
+    deadline: Optional[float] = None
+) -> int:
+    """
+    Compacte les rollups heure×IP de plus de `retention_days` jours en
+    rollups jour×IP (attack_rollup_day_ip), un jour par transaction.
+    
+    attack_rollup_hour (totaux horaires, 24 lignes par jour) est conservé :
+    la timeline longue reste exacte sans les lignes par IP.
+    
+    Args:
+        deadline: time.monotonic() au-delà duquel s'arrêter (suite à la passe suivante)
+    
+    Returns:
+        Nombre de jours compactés
+    """
+    conn = get_db_connection()
+    days = 0
+    
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            locked_at = _begin_immediate(conn, 'compact')
+            row = conn.execute('''
+                SELECT substr(MIN(bucket), 1, 10) AS day
+                FROM attack_rollup_hour_ip
+                WHERE bucket < strftime('%Y-%m-%d', 'now', '-' || ? || ' days')
+            ''', (retention_days,)).fetchone()
+            
+            if row['day'] is None:
+                conn.rollback()
+                break
+            
+            day = row['day']
+            next_day = _next_day(day)
+            
+            conn.execute('''
+                INSERT INTO attack_rollup_day_ip (day, ip, attempts)
+                SELECT ?, ip, SUM(attempts)
+                FROM attack_rollup_hour_ip
+                WHERE bucket >= ? AND bucket < ?
+                GROUP BY ip
+                ON CONFLICT(day, ip) DO UPDATE SET attempts = attempts + excluded.attempts
+            ''', (day, day, next_day))
+            conn.execute(
+                'DELETE FROM attack_rollup_hour_ip WHERE bucket >= ? AND bucket < ?',
+                (day, next_day)
+            )
+            _commit_write(conn, 'compact', locked_at)
+            days += 1
+        
+    except sqlite3.Error as e:
+        print(f"❌ Rollup compaction error: {e}")
+        record_sqlite_error('compact_hour_rollups', e)
+        conn.rollback()
+    finally:
+        conn.close()
+    
+    if days:
+        print(f"🧹 Compacted {days} days of hourly rollups into daily rollups")
+    return days
+
+@timed_query
+def thin_history_snapshots(retention_days: int = HISTORY_HOURLY_DAYS) -> int:
+    """
+    Ne garde que le dernier snapshot attack_history de chaque jour
+    au-delà de `retention_days` jours.
+    
+    Returns:
+        Nombre de snapshots supprimés
+    """
+    conn = get_db_connection()
+    
+    cursor = conn.execute('''
+        DELETE FROM attack_history
+        WHERE timestamp < datetime('now', '-' || ? || ' days')
+          AND id NOT IN (
+              SELECT MAX(id) FROM attack_history
+              WHERE timestamp < datetime('now', '-' || ? || ' days')
+              GROUP BY date(timestamp)
+          )
+    ''', (retention_days, retention_days))
+    
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+@timed_query
+def get_last_history_snapshot() -> Optional[str]:
+    """Date du dernier snapshot attack_history (UTC), None si aucun."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT MAX(timestamp) AS last FROM attack_history').fetchone()
+    conn.close()
+    
+    return row['last']
+
+@timed_query
+def get_oldest_archivable_month(before_day: str) -> Optional[str]:
+    """
+    Plus ancien mois 'YYYY-MM' ayant encore des lignes à archiver
+    (ARCHIVE_TABLES) avant le jour `before_day` 'YYYY-MM-DD'.
+    """
+    conn = get_db_connection(readonly=True)
+    
+    oldest = [
+        conn.execute(
+            f'SELECT MIN({column}) AS oldest FROM {table} WHERE {column} < ?',
+            (before_day,)
+        ).fetchone()['oldest']
+        for table, column, _, _ in ARCHIVE_TABLES
+    ]
+    
+    conn.close()
+    
+    oldest = [value for value in oldest if value]
+    return min(oldest)[:7] if oldest else None
+
+@timed_query
+def archive_month(month: str, path: str) -> Optional[Dict[str, int]]:
+    """
+    Déplace un mois 'YYYY-MM' d'agrégats (rollups jour, détail, snapshots)
+    de la BDD vers le fichier SQLite `path`, ATTACH-able pour l'historique.
+    
+    Deux étapes, reprise sûre après un crash à n'importe quel moment :
+    1. copie de l'archive existante en .tmp, fusion additive du mois lu
+       dans la BDD (ATTACH lecture seule, sans verrou écrivain), numéro de
+       passe et comptes de contrôle écrits dans archive_meta ;
+    2. BEGIN IMMEDIATE : si le mois n'a pas bougé depuis la copie (COUNT
+       et somme par table), suppression des lignes + marqueur
+       'archive:YYYY-MM' = passe, .tmp renommé sur l'archive, COMMIT.
+    
+    Une archive de passe supérieure au marqueur (crash entre le renommage
+    et le COMMIT) a déjà reçu les lignes : seules celles de la BDD sont
+    supprimées, après la même vérification.
+    
+    Returns:
+        Lignes archivées par table, None si rien fait (mois modifié
+        pendant la copie : retenté à la passe suivante)
+    """
+    start, end = _month_bounds(month)
+    state_key = ARCHIVE_STATE_PREFIX + month
+    done = int(get_ingest_state(state_key) or 0)
+    archive_pass, expected = _read_archive_meta(path)
+    tmp_path = None
+    
+    if archive_pass <= done:
+        tmp_path = path + '.tmp'
+        archive_pass, expected = done + 1, _write_archive_pass(month, path, tmp_path, done + 1)
+    
+    conn = get_db_connection()
+    
+    try:
+        locked_at = _begin_immediate(conn, 'archive')
+        
+        if _month_stats(conn, 'main', start, end) != expected:
+            conn.rollback()
+            print(f"⚠️  Archive {month}: rows changed since the copy, will retry")
+            return None
+        
+        for table, column, _, _ in ARCHIVE_TABLES:
+            conn.execute(f'DELETE FROM {table} WHERE {column} >= ? AND {column} < ?', (start, end))
+        _set_ingest_state(conn, state_key, str(archive_pass))
+        
+        if tmp_path:
+            os.replace(tmp_path, path)
+            _fsync_directory(os.path.dirname(path))
+        
+        _commit_write(conn, 'archive', locked_at)
+        
+    except (sqlite3.Error, OSError) as e:
+        print(f"❌ Archive {month} error: {e}")
+        if isinstance(e, sqlite3.Error):
+            record_sqlite_error('archive_month', e)
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    print(f"📦 Archived {month} → {path}")
+    return {table: stats[0] for table, stats in expected.items()}
+
+def _write_archive_pass(month: str, path: str, tmp_path: str, archive_pass: int) -> Dict[str, List[int]]:
+    """
+    Étape 1 de archive_month : archive existante + mois de la BDD → tmp_path.
+    Returns: comptes de contrôle du mois tel que copié (_month_stats)
+    """
+    start, end = _month_bounds(month)
+    
+    if os.path.exists(path):
+        shutil.copyfile(path, tmp_path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    conn = sqlite3.connect(f'file:{quote(tmp_path)}', uri=True, isolation_level=None)
+    
+    try:
+        conn.execute('ATTACH DATABASE ? AS hot', (f'file:{quote(DATABASE_PATH)}?mode=ro',))
+        conn.execute('BEGIN')
+        
+        # Nouvelle archive : mêmes tables, index et triggers que la BDD
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'archive_meta'").fetchone() is None:
+            conn.execute('CREATE TABLE archive_meta (key TEXT PRIMARY KEY, value TEXT)')
+            placeholders = ','.join('?' * len(ARCHIVE_SCHEMA_TABLES))
+            schema = conn.execute(f'''
+                SELECT sql FROM hot.sqlite_master
+                WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL
+                ORDER BY type = 'trigger', type = 'index'
+            ''', ARCHIVE_SCHEMA_TABLES).fetchall()
+            for (sql,) in schema:
+                conn.execute(sql)
+        
+        # Snapshot de lecture unique : contrôle et copie voient les mêmes lignes
+        stats = _month_stats(conn, 'hot', start, end)
+        
+        for table, column, key, _ in ARCHIVE_TABLES:
+            if key:
+                conn.execute(f'''
+                    INSERT INTO {table} SELECT * FROM hot.{table}
+                    WHERE {column} >= ? AND {column} < ?
+                    ON CONFLICT({key}) DO UPDATE SET attempts = attempts + excluded.attempts
+                ''', (start, end))
+            else:
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {table} SELECT * FROM hot.{table}
+                    WHERE {column} >= ? AND {column} < ?
+                ''', (start, end))
+        
+        conn.executemany('INSERT OR REPLACE INTO archive_meta (key, value) VALUES (?, ?)', [
+            ('month', month),
+            ('pass', str(archive_pass)),
+            ('stats', json.dumps(stats))
+        ])
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    
+    return stats
+
+def _read_archive_meta(path: str) -> Tuple[int, Optional[Dict[str, List[int]]]]:
+    """(passe, comptes de contrôle) d'un fichier d'archive, (0, None) s'il n'existe pas."""
+    if not os.path.exists(path):
+        return 0, None
+    
+    conn = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True)
+    try:
+        meta = dict(conn.execute('SELECT key, value FROM archive_meta').fetchall())
+    finally:
+        conn.close()
+    
+    return int(meta.get('pass', 0)), json.loads(meta['stats']) if 'stats' in meta else None
+
+def _month_stats(conn: sqlite3.Connection, schema: str, start: str, end: str) -> Dict[str, List[int]]:
+    """{table: [lignes, somme de contrôle]} du mois dans `schema` (main, hot...)."""
+    stats = {}
+    for table, column, _, checksum in ARCHIVE_TABLES:
+        row = conn.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM({checksum}), 0)
+            FROM {schema}.{table}
+            WHERE {column} >= ? AND {column} < ?
+        ''', (start, end)).fetchone()
+        stats[table] = [row[0], row[1]]
+    return stats
+
+def _month_bounds(month: str) -> Tuple[str, str]:
+    """'YYYY-MM' → ('YYYY-MM-01', premier jour du mois suivant)."""
+    year, number = map(int, month.split('-'))
+    next_year, next_number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return f'{year:04d}-{number:02d}-01', f'{next_year:04d}-{next_number:02d}-01'
+
+def _next_day(day: str) -> str:
+    """'YYYY-MM-DD' → lendemain."""
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def _fsync_directory(path: str):
+    """Rend un renommage durable (entrée de répertoire sur disque)."""
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@timed_query
+def get_top_ips_between(start_day: str, end_day: str, archives: List[str], limit: int = 20) -> List[Dict]:
+    """
+    Top IPs par tentatives entre deux jours 'YYYY-MM-DD' inclus, sur toute
+    la durée : rollups horaires et journaliers de la BDD + archives
+    mensuelles `archives` ATTACHées par lots, en lecture seule.
+    """
+    end = _next_day(end_day)
+    totals = defaultdict(int)
+    
+    # Connexion dédiée : les ATTACH ne reviennent jamais dans le pool
+    conn = sqlite3.connect(f'file:{quote(DATABASE_PATH)}?mode=ro', uri=True, timeout=10.0)
+    
+    try:
+        rows = conn.execute('''
+            SELECT ip, SUM(attempts) FROM (
+                SELECT ip, attempts FROM attack_rollup_hour_ip
+                WHERE bucket >= ? AND bucket < ?
+                UNION ALL
+                SELECT ip, attempts FROM attack_rollup_day_ip
+                WHERE day >= ? AND day < ?
+            )
+            GROUP BY ip
+        ''', (start_day, end, start_day, end))
+        for ip, attempts in rows:
+            totals[ip] += attempts
+        
+        for offset in range(0, len(archives), ARCHIVE_ATTACH_BATCH):
+            batch = archives[offset:offset + ARCHIVE_ATTACH_BATCH]
+            for number, path in enumerate(batch):
+                conn.execute(f'ATTACH DATABASE ? AS archive{number}', (f'file:{quote(path)}?mode=ro',))
+            
+            union = ' UNION ALL '.join(
+                f'SELECT ip, attempts FROM archive{number}.attack_rollup_day_ip WHERE day >= ? AND day < ?'
+                for number in range(len(batch))
+            )
+            rows = conn.execute(
+                f'SELECT ip, SUM(attempts) FROM ({union}) GROUP BY ip',
+                (start_day, end) * len(batch)
+            )
+            for ip, attempts in rows:
+                totals[ip] += attempts
+            
+            for number in range(len(batch)):
+                conn.execute(f'DETACH DATABASE archive{number}')
+    finally:
+        conn.close()
+    
+    top = heapq.nlargest(limit, totals.items(), key=lambda item: item[1])
+    return [{'ip': ip, 'attempts': attempts} for ip, attempts in top]
+
+@timed_query
+def incremental_vacuum(pages: int) -> Tuple[int, int]:
+    """
+    Rend au plus `pages` pages libres au disque (auto_vacuum=INCREMENTAL),
+    verrou écrivain pris le temps de cette seule étape.
+    
+    Returns:
+        (pages rendues, pages libres restantes)
+    """
+    conn = get_db_connection()
+    
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if before:
+        # Chaque ligne du résultat = une page rendue : tout lire pour tout exécuter
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    
+    conn.close()
+    return before - after, after
+
+@timed_query
+def get_auto_vacuum_mode() -> int:
+    """PRAGMA auto_vacuum : 0 = NONE, 1 = FULL, 2 = INCREMENTAL."""
+    # Connexion écrivain : une connexion lecture seule garde la valeur lue à son ouverture
+    conn = get_db_connection()
+    mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    conn.close()
+    
+    return mode
+
+# ============================================
+# ÉTAT D'INGESTION (CURSEURS)
+# ============================================
+
+@timed_query
+def get_ingest_state(key: str) -> Optional[str]:
+    """Lit une valeur ingest_state (ex : dernier curseur journalctl)."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT value FROM ingest_state WHERE key = ?', (key,)).fetchone()
+    conn.close()
+    
+    return row['value'] if row else None
+
+@timed_query
+def set_ingest_state(key: str, value: Optional[str]):
+    """Écrit une valeur ingest_state hors batch (reset manuel du curseur...)."""
+    conn = get_db_connection()
+    _set_ingest_state(conn, key, value)
+    conn.commit()
+    conn.close()
+
+def _set_ingest_state(conn: sqlite3.Connection, key: str, value: Optional[str]):
+    """UPSERT ingest_state sur une connexion/transaction existante."""
+    conn.execute('''
+        INSERT INTO ingest_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET
+            value = excluded.value,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (key, value))
+
+# ============================================
+# GÉNÉRATION DES DONNÉES (INVALIDATION CACHE)
+# ============================================
+
+# Compteur ingest_state incrémenté par chaque écriture visible du dashboard
+DATA_GENERATION_KEY = 'data_generation'
+
+@timed_query
+def get_data_generation() -> int:
+    """
+    Génération courante des données : change à chaque écriture visible
+    (ingestion, géolocalisation, ban). Sert de clé de cache / ETag.
+    """
+    value = get_ingest_state(DATA_GENERATION_KEY)
+    return int(value) if value else 0
+
+def _bump_data_generation(conn: sqlite3.Connection):
+    """Incrémente la génération dans la transaction de l'écriture."""
+    conn.execute('''
+        UPDATE ingest_state SET
+            value = CAST(value AS INTEGER) + 1,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE key = ?
+    ''', (DATA_GENERATION_KEY,))
+
+# ============================================
+# FLUX TEMPS RÉEL (SSE)
+# ============================================
+
+@timed_query
+def get_stream_events(after_id: int = 0, limit: int = 500) -> List[Dict]:
+    """Alertes (new_ip / escalation) d'id > after_id, dans l'ordre."""
+    conn = get_db_connection(readonly=True)
+    
+    events = conn.execute('''
+        SELECT id, type, ip, threat_level, total_attempts
+        FROM stream_events
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit)).fetchall()
+    
+    conn.close()
+    return [dict(row) for row in events]
+
+@timed_query
+def get_last_stream_event_id() -> int:
+    """Id de la dernière alerte (point de départ d'un nouveau client SSE)."""
+    conn = get_db_connection(readonly=True)
+    row = conn.execute('SELECT MAX(id) AS last_id FROM stream_events').fetchone()
+    conn.close()
+    
+    return row['last_id'] or 0
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _calculate_threat_level(attempts: int) -> str:
+    """
+    Calcule threat_level selon seuil.
+    
+    Modifie ces valeurs selon ton contexte (THREAT_*_THRESHOLD) :
+    - Critique: ≥50 tentatives (bannissement immédiat)
+    - Élevé: 20-49 tentatives (surveillance)
+    - Modéré: <20 tentatives (normal)
+    """
+    if attempts >= THREAT_CRITICAL_THRESHOLD:
         return 'Critique'
-    elif attempts >= 20:
+    elif attempts >= THREAT_HIGH_THRESHOLD:
         return 'Élevé'
     else:
         return 'Modéré'
 
+def _threat_level_sql(attempts_expr: str) -> str:
+    """Équivalent SQL de _calculate_threat_level (mêmes seuils)."""
+    return (
+        f"CASE WHEN {attempts_expr} >= {THREAT_CRITICAL_THRESHOLD} THEN 'Critique' "
+        f"WHEN {attempts_expr} >= {THREAT_HIGH_THRESHOLD} THEN 'Élevé' "
+        f"ELSE 'Modéré' END"
+    )
+
+def _ip_to_int(ip: str) -> Optional[int]:
+    """IPv4 texte → entier non signé 32 bits (None pour IPv6 / invalide)."""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, TypeError):
+        return None
+
 def get_db_size() -> str:
     """Retourne taille BDD en MB (pour monitoring)."""
     if os.path.exists(DATABASE_PATH):
@@ -392,12 +2257,16 @@ def get_db_size() -> str:
         return f"{size_mb:.2f} MB"
     return "0 MB"
 
+@timed_query
 def vacuum_database():
     """
-    Compacte BDD pour récupérer espace (exécuter manuellement).
+    VACUUM complet (exécuter manuellement, une fois) : recrée la BDD en
+    auto_vacuum=INCREMENTAL. Ensuite la rétention (app/retention.py)
+    rend l'espace libre par petites étapes sans bloquer l'ingestion.
     VACUUM recrée entièrement la BDD → peut prendre du temps.
     """
     conn = get_db_connection()
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
     conn.execute('VACUUM')
     conn.close()
-    print("✅ Database vacuumed")
+    print("✅ Database vacuumed (auto_vacuum=INCREMENTAL)")
@@ -0,0 +1,352 @@
+"""
+SSH Attack Dashboard - Burst Detector
+Débit d'attaque par IP sur fenêtres glissantes (minute / heure / jour),
+en mémoire bornée : repère les rafales de brute-force au moment où
+elles arrivent, là où threat_level ne voit que le cumul à vie
+
+Un seul détecteur actif : celui du process qui détient le verrou
+d'ingestion (app/ingest.py). Il score l'ingestion locale et la file des
+batchs agent (burst_queue), reçus par n'importe quel worker.
+"""
+
+import calendar
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .storage import storage
+
+# Fenêtres glissantes : (nom, largeur d'un bucket en secondes, nombre de buckets)
+BURST_WINDOWS = (
+    ('minute', 10, 6),
+    ('hour', 60, 60),
+    ('day', 3600, 24)
+)
+
+# Rafale : tentatives dans la fenêtre à partir desquelles l'IP est signalée
+BURST_THRESHOLDS = {
+    'minute': 20,
+    'hour': 300,
+    'day': 2000
+}
+
+# IPs suivies au plus (LRU) : ~0,5 Ko par IP
+DETECTOR_MAX_IPS = 50000
+
+# Une IP déjà signalée n'est re-signalée que si son score a doublé,
+# ou après ce délai (rafale qui reprend : last_flagged rafraîchi)
+BURST_REFLAG_FACTOR = 2.0
+BURST_REFLAG_INTERVAL = 3600
+
+# Plus petite largeur de bucket : les tentatives sont regroupées à ce pas
+BURST_RESOLUTION = 10
+
+# Buckets agent lus par passage dans la file burst_queue
+BURST_QUEUE_BATCH = 5000
+
+# (position dans le tableau de compteurs d'une IP, largeur, nombre de buckets)
+_RINGS = []
+_SLOTS = 0
+for _name, _width, _count in BURST_WINDOWS:
+    _RINGS.append((_SLOTS, _width, _count))
+    _SLOTS += _count
+_RINGS = tuple(_RINGS)
+
+# ============================================
+# DÉTECTEUR
+# ============================================
+
+class _IPWindows:
+    """
+    Buckets tournants d'une IP (un tableau de compteurs pour toutes les
+    fenêtres) + total courant par fenêtre : score en O(1) par batch.
+    """
+
+    __slots__ = ('counts', 'heads', 'totals', 'flagged_score', 'flagged_epoch')
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * _SLOTS))
+        self.heads = [-1] * len(_RINGS)  # index du bucket le plus récent
+        self.totals = [0] * len(_RINGS)
+        self.flagged_score = 0.0
+        self.flagged_epoch = 0
+
+    def add(self, epoch: int, attempts: int, first_window: int = 0):
+        counts = self.counts
+        heads = self.heads
+        totals = self.totals
+
+        for window, (offset, width, size) in enumerate(_RINGS[first_window:], first_window):
+            index = epoch // width
+            head = heads[window]
+
+            if index == head:
+                # Cas courant (rafale) : même bucket que la tentative précédente
+                counts[offset + index % size] += attempts
+                totals[window] += attempts
+                continue
+
+            if index > head:
+                # Avance la fenêtre : les buckets sortis sont retirés du total
+                if index - head >= size:
+                    counts[offset:offset + size] = array('I', bytes(4 * size))
+                    totals[window] = 0
+                else:
+                    for stale in range(head + 1, index + 1):
+                        slot = offset + stale % size
+                        totals[window] -= counts[slot]
+                        counts[slot] = 0
+                heads[window] = index
+            elif index <= head - size:
+                continue  # plus vieux que la fenêtre
+
+            counts[offset + index % size] += attempts
+            totals[window] += attempts
+
+    def rates(self) -> Dict[str, int]:
+        return {name: total for (name, _, _), total in zip(BURST_WINDOWS, self.totals)}
+
+    def copy(self) -> '_IPWindows':
+        windows = _IPWindows.__new__(_IPWindows)
+        windows.counts = array('I', self.counts)
+        windows.heads = list(self.heads)
+        windows.totals = list(self.totals)
+        windows.flagged_score = self.flagged_score
+        windows.flagged_epoch = self.flagged_epoch
+        return windows
+
+class BurstObservation:
+    """
+    Batch scoré par BurstDetector.score() : `bursts` s'écrit dans la
+    transaction du batch, commit() ne l'applique au détecteur qu'une fois
+    cette transaction validée.
+    """
+
+    __slots__ = ('hits', 'flags', 'bursts')
+
+    def __init__(self, hits: Dict[str, List[Tuple[int, int]]], flags: Dict[str, Tuple[float, int]], bursts: List[Dict]):
+        self.hits = hits      # ip → [(epoch, tentatives)]
+        self.flags = flags    # ip → (score, epoch) des IPs signalées
+        self.bursts = bursts
+
+class BurstDetector:
+    """
+    Alimenté par le pipeline d'ingestion (batchs d'events ou buckets
+    minute des agents), thread-safe. Le temps est celui des logs, pas
+    l'horloge : un batch en retard est scoré à sa date réelle.
+
+    Score d'une IP = max sur les fenêtres de (tentatives / seuil) : une
+    rafale est signalée dès que le score atteint 1, puis à nouveau
+    seulement s'il a doublé ou après BURST_REFLAG_INTERVAL (pas une
+    écriture BDD par batch).
+
+    Deux temps : score() calcule les rafales sur une copie des fenêtres,
+    commit() les met à jour après le COMMIT du batch. Un batch rejeté
+    (compare-and-set, renvoi d'agent, erreur BDD) sera relu : il ne doit
+    pas avoir été compté.
+    """
+
+    def __init__(
+        self,
+        thresholds: Optional[Dict[str, int]] = None,
+        max_ips: int = DETECTOR_MAX_IPS
+    ):
+        self.thresholds = thresholds or BURST_THRESHOLDS
+        self.max_ips = max_ips
+        self._inverse = [1 / self.thresholds[name] for name, _, _ in BURST_WINDOWS]
+        self._ips: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def score(self, hits: Iterable[Tuple[str, int, int]]) -> BurstObservation:
+        """
+        Rafales que déclencheraient des tentatives (ip, epoch UTC, nombre),
+        sans modifier le détecteur :
+        bursts = [{ip, burst_window, score, minute_rate, hour_rate, day_rate, flagged_at}]
+        """
+        per_ip = defaultdict(list)
+        for ip, epoch, attempts in hits:
+            per_ip[ip].append((epoch, attempts))
+
+        inverse = self._inverse
+        flags = {}
+        bursts = []
+
+        with self._lock:
+            ips = self._ips
+            for ip, ip_hits in per_ip.items():
+                current = ips.get(ip)
+                windows = current.copy() if current is not None else _IPWindows()
+
+                for epoch, attempts in ip_hits:
+                    windows.add(epoch, attempts)
+
+                scores = [total * factor for total, factor in zip(windows.totals, inverse)]
+                score = max(scores)
+                if score < 1:
+                    continue
+
+                # Scoré à la date de sa tentative la plus récente
+                epoch = max(epoch for epoch, _ in ip_hits)
+                if (
+                    score >= windows.flagged_score * BURST_REFLAG_FACTOR
+                    or epoch - windows.flagged_epoch >= BURST_REFLAG_INTERVAL
+                ):
+                    flags[ip] = (score, epoch)
+                    bursts.append(self._burst(ip, windows, scores, epoch))
+
+        return BurstObservation(per_ip, flags, bursts)
+
+    def commit(self, observation: BurstObservation):
+        """Applique un batch scoré dont la transaction est commitée."""
+        with self._lock:
+            ips = self._ips
+            for ip, ip_hits in observation.hits.items():
+                windows = ips.get(ip)
+                if windows is None:
+                    windows = ips[ip] = _IPWindows()
+                    if len(ips) > self.max_ips:
+                        ips.popitem(last=False)
+                else:
+                    ips.move_to_end(ip)
+
+                # Les tentatives sont rejouées (pas la copie de score()) :
+                # deux batchs concurrents de la même IP s'additionnent
+                for epoch, attempts in ip_hits:
+                    windows.add(epoch, attempts)
+
+                flag = observation.flags.get(ip)
+                if flag is not None and flag[0] >= windows.flagged_score:
+                    windows.flagged_score, windows.flagged_epoch = flag
+
+    def observe(self, hits: Iterable[Tuple[str, int, int]]) -> List[Dict]:
+        """score() + commit() : tentatives déjà persistées. Returns: rafales détectées"""
+        observation = self.score(hits)
+        self.commit(observation)
+        return observation.bursts
+
+    def seed(self, hits: Iterable[Tuple[str, int, int]]) -> int:
+        """
+        Remplace les fenêtres par un historique horaire (ip, epoch de
+        l'heure, tentatives), du plus ancien au plus récent : seule la
+        fenêtre jour a des buckets d'une heure, minute et heure repartent
+        vides. Returns: nombre d'IPs suivies
+        """
+        day = len(_RINGS) - 1
+
+        with self._lock:
+            ips = self._ips
+            ips.clear()
+            for ip, epoch, attempts in hits:
+                windows = ips.get(ip)
+                if windows is None:
+                    windows = ips[ip] = _IPWindows()
+                    if len(ips) > self.max_ips:
+                        ips.popitem(last=False)
+                else:
+                    ips.move_to_end(ip)
+                windows.add(epoch, attempts, first_window=day)
+            return len(ips)
+
+    def rates(self, ip: str) -> Optional[Dict[str, int]]:
+        """Tentatives de l'IP par fenêtre (None si non suivie)."""
+        with self._lock:
+            windows = self._ips.get(ip)
+            return windows.rates() if windows else None
+
+    def _burst(self, ip: str, windows: _IPWindows, scores: List[float], epoch: int) -> Dict:
+        # Fenêtre la plus courte au score max : la rafale la plus "serrée"
+        window = scores.index(max(scores))
+        rates = windows.rates()
+
+        return {
+            'ip': ip,
+            'burst_window': BURST_WINDOWS[window][0],
+            'score': round(scores[window], 2),
+            'minute_rate': rates['minute'],
+            'hour_rate': rates['hour'],
+            'day_rate': rates['day'],
+            'flagged_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+        }
+
+# Détecteur du process (actif dans le process ingesteur seulement)
+_detector = BurstDetector()
+
+def score_events(events: List[Dict]) -> BurstObservation:
+    """
+    Rafales d'un batch d'events {ip, timestamp UTC...}, à écrire avec le
+    batch puis commit_bursts() si la transaction est validée.
+    """
+    # Regroupées par (ip, bucket de 10s) : sans perte, toutes les
+    # fenêtres ont des buckets multiples de BURST_RESOLUTION
+    epochs = {}
+    hits = Counter()
+    for event in events:
+        timestamp = event['timestamp']
+        epoch = epochs.get(timestamp)
+        if epoch is None:
+            epoch = epochs[timestamp] = _timestamp_to_epoch(timestamp) // BURST_RESOLUTION * BURST_RESOLUTION
+        hits[(event['ip'], epoch)] += 1
+
+    return _detector.score((ip, epoch, attempts) for (ip, epoch), attempts in hits.items())
+
+def score_buckets(buckets: List[Tuple[str, str, int]]) -> BurstObservation:
+    """Comme score_events pour des buckets agent (minute, ip, tentatives)."""
+    return _detector.score(
+        (ip, _minute_to_epoch(minute), attempts)
+        for minute, ip, attempts in buckets
+    )
+
+def commit_bursts(observation: BurstObservation):
+    """Batch commité en BDD : ses tentatives entrent dans les fenêtres du détecteur."""
+    _detector.commit(observation)
+
+def process_burst_queue(limit: int = BURST_QUEUE_BATCH) -> int:
+    """
+    Score les buckets agent en file (process ingesteur) : rafales écrites
+    et buckets retirés de la file en une transaction, fenêtres mises à
+    jour après le COMMIT. Returns: nombre de buckets traités
+    """
+    processed = 0
+
+    while True:
+        rows = storage.get_burst_queue(limit)
+        if not rows:
+            break
+
+        observation = score_buckets([(row['minute'], row['ip'], row['attempts']) for row in rows])
+        if not storage.ack_burst_queue([row['id'] for row in rows], observation.bursts):
+            break  # relus au prochain passage
+        commit_bursts(observation)
+
+        processed += len(rows)
+        if len(rows) < limit:
+            break
+
+    return processed
+
+def seed_detector() -> int:
+    """
+    Reconstruit la fenêtre jour depuis les rollups horaires par IP (process
+    qui devient ingesteur : démarrage, reprise du verrou d'un autre worker).
+    Returns: nombre d'IPs suivies
+    """
+    _, width, size = BURST_WINDOWS[-1]
+    oldest = (int(time.time()) // width - (size - 1)) * width
+    rows = storage.get_burst_seed(time.strftime('%Y-%m-%d %H:00', time.gmtime(oldest)))
+
+    return _detector.seed((row['ip'], _minute_to_epoch(row['bucket']), row['attempts']) for row in rows)
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _timestamp_to_epoch(timestamp: str) -> int:
+    """'2025-10-17 00:15:32' (UTC) → epoch, une conversion par minute."""
+    return _minute_to_epoch(timestamp[:16]) + int(timestamp[17:19] or 0)
+
+@lru_cache(maxsize=4096)
+def _minute_to_epoch(minute: str) -> int:
+    return calendar.timegm(time.strptime(minute, '%Y-%m-%d %H:%M'))
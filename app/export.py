@@ -0,0 +1,96 @@
+"""
+SSH Attack Dashboard - Streaming Export
+Sérialise un flux de lignes attacks en CSV / NDJSON / JSON, par
+morceaux : l'export démarre tout de suite et reste en mémoire constante
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, Sequence
+
+# Lignes sérialisées par morceau envoyé au client
+EXPORT_CHUNK_ROWS = 500
+
+# Encodeur partagé : json.dumps(..., ensure_ascii=False) en recrée un à chaque appel
+_json_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+# ============================================
+# FORMATS
+# ============================================
+
+def iter_csv(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[str]:
+    """CSV avec en-tête (BOM UTF-8 : accents corrects à l'ouverture dans Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[str]:
+    """Un objet JSON par ligne (chargeable ligne à ligne : jq, pandas...)."""
+    for chunk in _chunks(rows):
+        yield ''.join(_json_encode(dict(zip(columns, row))) + '\n' for row in chunk)
+
+def iter_json(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[str]:
+    """Tableau JSON écrit au fil de l'eau (jamais construit en mémoire)."""
+    yield '['
+    separator = '\n'
+
+    for chunk in _chunks(rows):
+        # Un appel d'encodeur par morceau (crochets retirés) plutôt que par ligne
+        yield separator + _json_encode([dict(zip(columns, row)) for row in chunk])[1:-1]
+        separator = ',\n'
+
+    yield '\n]\n'
+
+EXPORT_FORMATS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'json': iter_json
+}
+
+# ============================================
+# COMPRESSION
+# ============================================
+
+def gzip_stream(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """Compresse un flux texte en gzip morceau par morceau (Content-Encoding: gzip)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = en-tête gzip
+
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _chunks(rows: Iterable[tuple]) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,234 @@
+"""
+SSH Attack Dashboard - Geolocation Enrichment
+Géolocalise les IPs hors ingestion : cache SQLite, lookups batch,
+limiteur token-bucket et backends interchangeables
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from .storage import storage
+from .metrics import GEO_LOOKUP_SECONDS, GEO_LOCATED, GEO_ERRORS
+
+# API ip-api.com (surchargeable pour pointer vers un serveur stub local)
+IP_API_URL = 'http://ip-api.com'
+
+# Champs demandés à ip-api (réponse plus légère)
+IP_API_FIELDS = 'status,message,query,country,countryCode,city,isp,as,lat,lon'
+
+# ============================================
+# LIMITEUR DE DÉBIT
+# ============================================
+
+class TokenBucket:
+    """
+    Token bucket thread-safe : `rate_per_minute` jetons par minute,
+    au plus `capacity` d'avance (capacity=1 → requêtes régulièrement espacées).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = 1.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Attend un jeton. False si stop_event est levé pendant l'attente."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+    def pause(self, seconds: float):
+        """Bloque les jetons (quota serveur épuisé, HTTP 429...)."""
+        with self._lock:
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class GeoBackend:
+    """
+    Interface backend : lookup_batch(ips) → {ip: geo ou None}.
+
+    geo = {country, country_name, city, isp, asn, lat, lon}, None = IP non
+    localisable (privée, réservée...). Une erreur réseau doit lever une
+    exception (rien n'est mis en cache, on réessaiera).
+    """
+
+    # Nom du backend (label des métriques)
+    name = 'generic'
+
+    # IPs max par appel / appels max par minute / batchs max par cycle
+    batch_size = 100
+    requests_per_minute = 60
+    max_batches = 10
+
+    # False si le lookup est local et gratuit : pas la peine de remplir geo_cache
+    cache_results = True
+
+    def lookup_batch(self, ips: List[str]) -> Dict[str, Optional[Dict]]:
+        raise NotImplementedError
+
+class IpApiBackend(GeoBackend):
+    """
+    Endpoint /batch d'ip-api.com : 100 IPs par requête POST.
+
+    ip-api limite /batch à 15 requêtes/min (45/min concerne /json, une IP
+    par requête) : 1500 IPs/min. Les en-têtes X-Rl / X-Ttl (quota restant,
+    secondes avant reset) sont respectés via le limiteur.
+    """
+
+    name = 'ip-api'
+    batch_size = 100
+    requests_per_minute = 15
+
+    def __init__(self, base_url: str = IP_API_URL, timeout: float = 10.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.limiter: Optional[TokenBucket] = None
+
+    def lookup_batch(self, ips: List[str]) -> Dict[str, Optional[Dict]]:
+        body = json.dumps([{'query': ip, 'fields': IP_API_FIELDS} for ip in ips]).encode()
+        request = urllib.request.Request(
+            f'{self.base_url}/batch',
+            data=body,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                self._respect_quota(response.headers)
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                self._respect_quota(e.headers, default_ttl=60)
+            raise
+
+        results: Dict[str, Optional[Dict]] = {ip: None for ip in ips}
+        for data in payload:
+            if data.get('status') == 'success' and data.get('query') in results:
+                results[data['query']] = {
+                    'country': data.get('countryCode'),
+                    'country_name': data.get('country'),
+                    'city': data.get('city'),
+                    'isp': data.get('isp'),
+                    'asn': data.get('as'),
+                    'lat': data.get('lat'),
+                    'lon': data.get('lon')
+                }
+
+        return results
+
+    def _respect_quota(self, headers, default_ttl: Optional[float] = None):
+        """Quota serveur épuisé → pause du limiteur jusqu'au reset."""
+        if self.limiter is None:
+            return
+
+        remaining = headers.get('X-Rl')
+        ttl = headers.get('X-Ttl')
+
+        if remaining == '0' or default_ttl is not None:
+            self.limiter.pause(float(ttl) if ttl else (default_ttl or 60))
+
+# ============================================
+# ENRICHISSEMENT
+# ============================================
+
+class GeoEnricher:
+    """
+    Géolocalise les IPs de `attacks` sans pays, par batchs, en respectant
+    le débit du backend. Tourne dans son propre thread (jamais dans le
+    chemin d'ingestion) : un backend lent ou limité ne bloque pas le parsing.
+    """
+
+    def __init__(
+        self,
+        backend: GeoBackend,
+        limiter: Optional[TokenBucket] = None,
+        interval: float = 5.0
+    ):
+        self.backend = backend
+        self.limiter = limiter or TokenBucket(backend.requests_per_minute)
+        self.interval = interval
+
+        if hasattr(backend, 'limiter'):
+            backend.limiter = self.limiter
+
+    def run_once(self, max_batches: Optional[int] = None, stop_event: Optional[threading.Event] = None) -> int:
+        """
+        Un cycle : applique le cache, puis géolocalise jusqu'à max_batches
+        batchs d'IPs inconnues. Returns: nombre d'IPs localisées.
+        """
+        located = storage.apply_cached_geo()
+
+        for _ in range(max_batches or self.backend.max_batches):
+            ips = storage.get_ips_missing_geo(limit=self.backend.batch_size)
+            if not ips:
+                break
+
+            if not self.limiter.acquire(stop_event):
+                break
+
+            name = self.backend.name
+            try:
+                with GEO_LOOKUP_SECONDS.time(backend=name):
+                    results = self.backend.lookup_batch(ips)
+            except Exception as e:
+                print(f"⚠️  Geolocation batch failed ({len(ips)} IPs): {e}")
+                GEO_ERRORS.inc(backend=name)
+                break
+
+            stored = storage.store_geolocations(results, cache_success=self.backend.cache_results)
+            GEO_LOCATED.inc(stored, backend=name)
+            located += stored
+
+        if located:
+            print(f"🌍 Geolocated {located} IPs")
+        return located
+
+def create_enricher(
+    backend: str = 'ip-api',
+    url: Optional[str] = None,
+    db_path: Optional[str] = None
+) -> Optional[GeoEnricher]:
+    """
+    Construit l'enrichisseur configuré.
+
+    Args:
+        backend: 'ip-api', 'offline' (base de plages IP locale) ou 'off'
+        url: URL de base de l'API (serveur stub local pour les tests)
+        db_path: base de plages IP (.bin compilé ou .csv) pour 'offline'
+    """
+    if backend == 'off':
+        return None
+    if backend == 'ip-api':
+        return GeoEnricher(IpApiBackend(base_url=url or IP_API_URL))
+    if backend == 'offline':
+        from .geo_offline import OfflineBackend
+        if not db_path:
+            raise ValueError("Offline geolocation needs an IP range database path")
+        return GeoEnricher(OfflineBackend(db_path), interval=1.0)
+
+    raise ValueError(f"Unknown geolocation backend: {backend}")
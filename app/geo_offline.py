@@ -0,0 +1,242 @@
+"""
+SSH Attack Dashboard - Offline Geolocation
+Base de plages IP locale compilée en binaire et memory-mappée :
+lookup par recherche dichotomique, aucun appel réseau
+"""
+
+import csv
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+from .geo import GeoBackend
+
+# Format binaire : en-tête + tableaux triés little-endian + table des lieux (JSON)
+MAGIC = b'SSHGEO1\0'
+HEADER = struct.Struct('<8sIII12x')  # magic, nb plages v4, nb plages v6, taille JSON
+
+# ============================================
+# COMPILATION CSV → BINAIRE
+# ============================================
+
+def compile_ip_ranges(csv_path: str, out_path: str) -> int:
+    """
+    Compile un CSV de plages IP en fichier binaire memory-mappable.
+
+    Format CSV (une plage par ligne, en-tête/commentaires ignorés) :
+        start_ip,end_ip,country_code[,country_name[,city[,asn]]]
+    Les IPs peuvent être textuelles (1.2.3.0, 2001:db8::) ou entières
+    (format IP2Location / DB-IP numérique).
+
+    Returns:
+        Nombre de plages compilées
+    """
+    ranges_v4, ranges_v6 = [], []
+    locations: Dict[tuple, int] = {}
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3 or row[0].startswith('#'):
+                continue
+
+            try:
+                start, start_version = _parse_ip_field(row[0])
+                end, _ = _parse_ip_field(row[1])
+            except ValueError:
+                continue  # en-tête
+
+            location = tuple((row[i].strip() or None) if len(row) > i else None for i in range(2, 6))
+            index = locations.setdefault(location, len(locations))
+
+            if start_version == 4:
+                ranges_v4.append((start, end, index))
+            else:
+                ranges_v6.append((start, end, index))
+
+    ranges_v4.sort()
+    ranges_v6.sort()
+    location_table = json.dumps(list(locations)).encode()
+
+    with open(out_path + '.tmp', 'wb') as out:
+        out.write(HEADER.pack(MAGIC, len(ranges_v4), len(ranges_v6), len(location_table)))
+
+        for column in range(3):
+            values = array('I', (r[column] for r in ranges_v4))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            out.write(values.tobytes())
+
+        for column in range(2):
+            out.write(b''.join(r[column].to_bytes(16, 'big') for r in ranges_v6))
+        values = array('I', (r[2] for r in ranges_v6))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        out.write(values.tobytes())
+
+        out.write(location_table)
+
+    # Remplacement atomique : les workers qui mappent l'ancien fichier continuent
+    os.replace(out_path + '.tmp', out_path)
+
+    return len(ranges_v4) + len(ranges_v6)
+
+def _parse_ip_field(value: str):
+    """'1.2.3.4' / '16909060' / '2001:db8::' → (entier, version IP)."""
+    value = value.strip()
+
+    if value.isdigit():
+        number = int(value)
+        return number, 4 if number < 2 ** 32 else 6
+
+    for family, version in ((socket.AF_INET, 4), (socket.AF_INET6, 6)):
+        try:
+            return int.from_bytes(socket.inet_pton(family, value), 'big'), version
+        except OSError:
+            continue
+
+    raise ValueError(f"Invalid IP: {value}")
+
+# ============================================
+# LOOKUP (MEMORY-MAPPED)
+# ============================================
+
+class _Ipv6Keys:
+    """Vue séquence sur un tableau de clés 16 octets (bisect-compatible)."""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view) // 16
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.view[index * 16:(index + 1) * 16].tobytes()
+
+class OfflineGeoDatabase:
+    """
+    Base de plages IP mappée en mémoire (mmap lecture seule) : les pages
+    sont partagées entre workers gunicorn via le page cache du noyau.
+
+    Lookup = bisect sur les débuts de plage triés → quelques µs par IP.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n4, n6, table_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a compiled IP range database: {path}")
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def take(size: int) -> memoryview:
+            nonlocal offset
+            chunk = view[offset:offset + size]
+            offset += size
+            return chunk
+
+        self._starts_v4 = self._uint32(take(4 * n4))
+        self._ends_v4 = self._uint32(take(4 * n4))
+        self._locations_v4 = self._uint32(take(4 * n4))
+        self._starts_v6 = _Ipv6Keys(take(16 * n6))
+        self._ends_v6 = _Ipv6Keys(take(16 * n6))
+        self._locations_v6 = self._uint32(take(4 * n6))
+
+        # Table des lieux (petite, dédupliquée) décodée une fois par process
+        self._locations = [
+            {
+                'country': country,
+                'country_name': country_name,
+                'city': city,
+                'isp': asn,
+                'asn': asn
+            }
+            for country, country_name, city, asn in json.loads(bytes(take(table_size)))
+        ]
+
+    @staticmethod
+    def _uint32(chunk: memoryview):
+        if sys.byteorder == 'big':
+            # Copie byteswappée : pas de partage de pages sur big-endian
+            values = array('I', chunk.tobytes())
+            values.byteswap()
+            return values
+        return chunk.cast('I')
+
+    def __len__(self):
+        return len(self._starts_v4) + len(self._starts_v6)
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """
+        Lieu de l'IP ({country, country_name, city, isp, asn}) ou None,
+        y compris pour une plage sans pays (l'IP resterait sinon « à
+        géolocaliser » et serait redemandée à chaque cycle).
+        """
+        try:
+            key = int.from_bytes(socket.inet_aton(ip), 'big') if ':' not in ip else None
+        except OSError:
+            return None
+
+        if key is not None:
+            index = bisect_right(self._starts_v4, key) - 1
+            if index >= 0 and key <= self._ends_v4[index]:
+                return self._located(self._locations_v4[index])
+            return None
+
+        try:
+            key6 = socket.inet_pton(socket.AF_INET6, ip)
+        except OSError:
+            return None
+
+        index = bisect_right(self._starts_v6, key6) - 1
+        if index >= 0 and key6 <= self._ends_v6[index]:
+            return self._located(self._locations_v6[index])
+        return None
+
+    def _located(self, index: int) -> Optional[Dict]:
+        location = self._locations[index]
+        return location if location['country'] else None
+
+def open_geo_database(path: str) -> OfflineGeoDatabase:
+    """
+    Ouvre une base compilée. Un .csv est compilé à côté (path + '.bin')
+    si le binaire est absent ou plus ancien que le CSV.
+    """
+    if path.endswith('.csv'):
+        compiled = path + '.bin'
+        if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(path):
+            count = compile_ip_ranges(path, compiled)
+            print(f"🗺️  Compiled {count} IP ranges into {compiled}")
+        path = compiled
+
+    return OfflineGeoDatabase(path)
+
+# ============================================
+# BACKEND D'ENRICHISSEMENT
+# ============================================
+
+class OfflineBackend(GeoBackend):
+    """Backend local : pas de quota, gros batchs (100k IPs ≈ 1s)."""
+
+    name = 'offline'
+    batch_size = 10000
+    requests_per_minute = 600000
+    max_batches = 100
+    cache_results = False
+
+    def __init__(self, path: str):
+        self.database = open_geo_database(path)
+
+    def lookup_batch(self, ips: List[str]) -> Dict[str, Optional[Dict]]:
+        lookup = self.database.lookup
+        return {ip: lookup(ip) for ip in ips}
@@ -0,0 +1,365 @@
+"""
+SSH Attack Dashboard - Ingestion Scheduler
+Parse les logs SSH en tâche de fond, hors du chemin des requêtes API
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-process
+    fcntl = None
+
+from . import database
+from .detector import process_burst_queue, seed_detector
+from .geo import GeoEnricher, create_enricher
+from .retention import run_retention
+from .storage import storage
+from .ssh_parser import (
+    parse_and_store_ssh_logs,
+    parse_and_store_ssh_logs_async,
+    follow_ssh_logs,
+    follow_journal_async
+)
+
+# Cadence par défaut (alignée sur le refresh 10s du frontend)
+DEFAULT_INGEST_INTERVAL = 10.0
+
+# Maintenance (snapshots, rétention, archives, incremental_vacuum)
+MAINTENANCE_INTERVAL = 3600.0
+
+# Passage du détecteur de rafales sur la file des batchs agent
+BURST_QUEUE_INTERVAL = 2.0
+
+# ============================================
+# SCHEDULER
+# ============================================
+
+class IngestScheduler:
+    """
+    Thread unique qui parse les logs à cadence fixe.
+
+    Sous gunicorn, chaque worker crée son scheduler mais un verrou fichier
+    (flock) garantit qu'un seul process ingère à la fois. Les autres
+    retentent le verrou à chaque cycle → reprise auto si l'ingesteur meurt.
+
+    La géolocalisation (enricher) tourne dans un thread séparé : un
+    backend lent ou rate-limité ne retarde jamais le parsing.
+
+    Le détecteur de rafales (app/detector.py) n'est actif que dans le
+    process ingesteur : fenêtre jour reconstruite à la prise du verrou,
+    batchs agent reçus par les autres workers scorés depuis burst_queue.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INGEST_INTERVAL,
+        lock_path: Optional[str] = None,
+        maintenance_interval: float = MAINTENANCE_INTERVAL,
+        enricher: Optional[GeoEnricher] = None
+    ):
+        self.interval = interval
+        self.maintenance_interval = maintenance_interval
+        self.enricher = enricher
+        self.lock_path = lock_path or database.DATABASE_PATH + '.ingest.lock'
+        self.last_result: Dict = {}
+        self._lock_file = None
+        self._detector_ready = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._enrich_thread: Optional[threading.Thread] = None
+        self._burst_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Démarre le thread d'ingestion (daemon, idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='ssh-ingest', daemon=True)
+        self._thread.start()
+        self.start_background_tasks()
+
+    def start_background_tasks(self):
+        """Démarre les threads maintenance + géolocalisation + rafales (idempotent)."""
+        self._stop.clear()
+
+        if not (self._maintenance_thread and self._maintenance_thread.is_alive()):
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, name='ssh-maintenance', daemon=True
+            )
+            self._maintenance_thread.start()
+
+        if self.enricher and not (self._enrich_thread and self._enrich_thread.is_alive()):
+            self._enrich_thread = threading.Thread(
+                target=self._enrich_loop, name='ssh-geo', daemon=True
+            )
+            self._enrich_thread.start()
+
+        if not (self._burst_thread and self._burst_thread.is_alive()):
+            self._burst_thread = threading.Thread(
+                target=self._burst_loop, name='ssh-bursts', daemon=True
+            )
+            self._burst_thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Arrête le thread et libère le verrou."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._release_lock()
+
+    def run_forever(self):
+        """Boucle d'ingestion : un parse par intervalle tant que non stoppé."""
+        while not self._stop.is_set():
+            started = time.monotonic()
+
+            if self._acquire_lock():
+                self.run_once()
+
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0.0, self.interval - elapsed))
+
+    def run_once(self) -> Dict:
+        """Un cycle d'ingestion (ne lève jamais : le thread doit survivre)."""
+        try:
+            self.last_result = parse_and_store_ssh_logs()
+        except Exception as e:
+            print(f"❌ Ingest cycle failed: {e}")
+            self.last_result = {'error': str(e), 'source': 'error'}
+
+        return self.last_result
+
+    async def run_async(self, executor=None):
+        """
+        Boucle d'ingestion du mode ASGI, en tâche asyncio : journalctl via
+        asyncio.create_subprocess_exec, BDD dans le pool `executor`. Même
+        verrou fichier que run_forever ; annuler la tâche arrête l'ingesteur.
+        """
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+
+                if self._acquire_lock():
+                    self.last_result = await parse_and_store_ssh_logs_async(executor)
+
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(max(0.0, self.interval - elapsed))
+        finally:
+            self.stop(timeout=5)
+
+    def run_maintenance(self):
+        """Passe de rétention : snapshot, compaction, archives, vacuum."""
+        try:
+            run_retention()
+        except Exception as e:
+            print(f"❌ Maintenance failed: {e}")
+
+    def _maintenance_loop(self):
+        # Seul le process qui détient le verrou d'ingestion purge et archive
+        while not self._stop.wait(self.maintenance_interval):
+            if self._owns_ingest():
+                self.run_maintenance()
+
+    def _enrich_loop(self):
+        # Un seul process géolocalise : pas d'appels API en double entre workers
+        while not self._stop.wait(self.enricher.interval):
+            if self._owns_ingest():
+                try:
+                    self.enricher.run_once(stop_event=self._stop)
+                except Exception as e:
+                    print(f"❌ Geolocation cycle failed: {e}")
+
+    def _burst_loop(self):
+        # Un seul process score les batchs agent : fenêtres complètes quel
+        # que soit le worker qui a reçu le POST
+        while not self._stop.wait(BURST_QUEUE_INTERVAL):
+            if self._owns_ingest() and self._detector_ready:
+                try:
+                    process_burst_queue()
+                except Exception as e:
+                    print(f"❌ Burst scoring failed: {e}")
+
+    def _owns_ingest(self) -> bool:
+        return self._lock_file is not None or fcntl is None
+
+    def _acquire_lock(self) -> bool:
+        """Verrou fichier non bloquant : True si ce process est l'ingesteur."""
+        if self._lock_file is None and fcntl is not None:
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+
+            self._lock_file = lock_file
+            print(f"🔒 Ingest lock acquired (pid {os.getpid()})")
+
+        if not self._detector_ready:
+            self._seed_detector()
+        return True
+
+    def _seed_detector(self):
+        # Avant la première ingestion de ce process : rien n'est compté deux fois
+        try:
+            print(f"📈 Burst detector: day window rebuilt for {seed_detector()} IPs")
+        except Exception as e:
+            print(f"⚠️  Burst detector starts empty: {e}")
+        self._detector_ready = True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._detector_ready = False
+
+class FollowIngester(IngestScheduler):
+    """
+    Variante streaming : suit journalctl -f (ou un fichier auth.log) en
+    continu au lieu de poller. Même verrou fichier que le scheduler.
+    """
+
+    def __init__(self, source: str = 'journal', **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+
+    def run_forever(self):
+        """Attend le verrou d'ingestion puis suit les logs jusqu'au stop."""
+        while not self._stop.is_set():
+            if not self._acquire_lock():
+                self._stop.wait(self.interval)
+                continue
+
+            if self.source == 'journal':
+                print("📡 Following journalctl (streaming ingest)")
+                follow_ssh_logs('journal', stop_event=self._stop)
+            else:
+                print(f"📡 Following {self.source} (streaming ingest)")
+                follow_ssh_logs('file', path=self.source, stop_event=self._stop)
+
+    async def run_async(self, executor=None):
+        """
+        Mode follow de l'ASGI : journalctl -f lu sur la boucle asyncio. Un
+        fichier auth.log (pas de sous-process) reste suivi par le thread
+        de start().
+        """
+        try:
+            if self.source != 'journal':
+                self.start()
+                while not self._stop.is_set():
+                    await asyncio.sleep(self.interval)
+                return
+
+            while not self._stop.is_set():
+                if not self._acquire_lock():
+                    await asyncio.sleep(self.interval)
+                    continue
+
+                print("📡 Following journalctl (streaming ingest, asyncio)")
+                await follow_journal_async(executor)
+        finally:
+            self.stop(timeout=5)
+
+# ============================================
+# POINTS D'ENTRÉE
+# ============================================
+
+_scheduler: Optional[IngestScheduler] = None
+
+def start_ingest_scheduler(
+    interval: float = DEFAULT_INGEST_INTERVAL,
+    mode: str = 'thread',
+    follow_source: str = 'journal',
+    geo_backend: str = 'ip-api',
+    geo_url: Optional[str] = None,
+    geo_db: Optional[str] = None
+) -> IngestScheduler:
+    """
+    Démarre l'ingesteur du process (appelé par create_app).
+
+    Args:
+        mode: 'thread' (polling à cadence fixe) ou 'follow' (streaming)
+        follow_source: 'journal' ou chemin d'un fichier auth.log (mode follow)
+        geo_backend: backend de géolocalisation ('ip-api', 'offline' ou 'off')
+        geo_url: URL de base de l'API géo (stub local pour les tests)
+        geo_db: base de plages IP locale (backend 'offline')
+    """
+    scheduler = _get_scheduler(interval, mode, follow_source, geo_backend, geo_url, geo_db)
+    scheduler.start()
+
+    return scheduler
+
+def start_ingest_task(
+    executor=None,
+    interval: float = DEFAULT_INGEST_INTERVAL,
+    mode: str = 'thread',
+    follow_source: str = 'journal',
+    geo_backend: str = 'ip-api',
+    geo_url: Optional[str] = None,
+    geo_db: Optional[str] = None
+) -> asyncio.Task:
+    """
+    Ingesteur du mode ASGI (démarrage de app/asgi.py), mêmes arguments que
+    start_ingest_scheduler : la boucle d'ingestion est une tâche asyncio
+    (sous-process journalctl sans thread bloqué), maintenance et
+    géolocalisation gardent leurs threads. Annuler la tâche l'arrête.
+    """
+    scheduler = _get_scheduler(interval, mode, follow_source, geo_backend, geo_url, geo_db)
+    scheduler.start_background_tasks()
+
+    return asyncio.ensure_future(scheduler.run_async(executor))
+
+def _get_scheduler(interval, mode, follow_source, geo_backend, geo_url, geo_db) -> IngestScheduler:
+    """Ingesteur unique du process, créé au premier appel."""
+    global _scheduler
+
+    if _scheduler is None:
+        enricher = create_enricher(geo_backend, geo_url, geo_db)
+        if mode == 'follow':
+            _scheduler = FollowIngester(source=follow_source, interval=interval, enricher=enricher)
+        else:
+            _scheduler = IngestScheduler(interval=interval, enricher=enricher)
+    return _scheduler
+
+def run_ingest_forever(interval: float = DEFAULT_INGEST_INTERVAL):
+    """Ingestion seule au premier plan (`python run.py ingest`)."""
+    storage.init_db()
+
+    scheduler = IngestScheduler(interval=interval, enricher=_enricher_from_env())
+    print(f"🔄 Ingesting SSH logs every {interval:g}s (Ctrl+C to stop)")
+    scheduler.start_background_tasks()
+
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("👋 Ingest stopped")
+    finally:
+        scheduler.stop()
+
+def run_follow_forever(source: str = 'journal'):
+    """Ingestion streaming au premier plan (`python run.py follow`)."""
+    storage.init_db()
+
+    follower = FollowIngester(source=source, enricher=_enricher_from_env())
+    follower.start_background_tasks()
+
+    try:
+        follower.run_forever()
+    except KeyboardInterrupt:
+        print("👋 Follow stopped")
+    finally:
+        follower.stop()
+
+def _enricher_from_env() -> Optional[GeoEnricher]:
+    """Géolocalisation des process dédiés (mêmes variables que create_app)."""
+    return create_enricher(
+        os.environ.get('SSH_DASHBOARD_GEO', 'ip-api'),
+        os.environ.get('SSH_DASHBOARD_GEO_URL'),
+        os.environ.get('SSH_DASHBOARD_GEO_DB')
+    )
@@ -0,0 +1,388 @@
+"""
+SSH Attack Dashboard - Metrics
+Compteurs, jauges et histogrammes en mémoire (par process, bibliothèque
+standard uniquement), exposés au format texte Prometheus sur /api/metrics,
++ profilage des requêtes BDD d'une requête HTTP (en-tête X-Profile)
+"""
+
+import calendar
+import contextvars
+import functools
+import inspect
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bornes des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Attente du verrou écrivain au-delà de laquelle SQLite a dû réessayer (busy)
+BUSY_WAIT_THRESHOLD = 0.001
+
+# Exceptions comptées comme erreurs BDD (+ psycopg.Error avec PostgreSQL)
+DB_ERROR_TYPES: Tuple[type, ...] = (sqlite3.Error,)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ============================================
+# TYPES DE MÉTRIQUES
+# ============================================
+
+class _Metric:
+    """Une famille de séries : une valeur par combinaison de labels."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}'
+        ]
+        for name, key, value in self._samples():
+            lines.append(f'{name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        if not self.labels:
+            self._values[()] = 0  # série exposée dès le démarrage
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Jauge fixée par set(), ou calculée à chaque scrape (set_function)."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._function: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], Optional[float]]):
+        """Valeur sans labels lue au scrape (None = série absente)."""
+        self._function = function
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+
+        value = self._function()
+        return [] if value is None else [(self.name, (), value)]
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [compteurs par bucket (+Inf en dernier), somme, nombre]
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels) -> '_Timer':
+        """with HISTOGRAM.time(label=...): ... → durée du bloc observée."""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}'
+        ]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), key + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+# Toutes les métriques du process, dans l'ordre de déclaration
+REGISTRY: List[_Metric] = []
+
+# ============================================
+# MÉTRIQUES DE L'APPLICATION
+# ============================================
+
+# Ingestion
+JOURNALCTL_SECONDS = Histogram(
+    'ssh_dashboard_journalctl_seconds', 'Durée des appels journalctl (sous-process)'
+)
+PARSE_SECONDS = Histogram(
+    'ssh_dashboard_parse_seconds', 'Durée du parsing d\'un bloc de logs sshd'
+)
+PARSED_LINES = Counter('ssh_dashboard_parsed_lines_total', 'Lignes de logs parsées')
+PARSED_EVENTS = Counter('ssh_dashboard_parsed_events_total', 'Tentatives extraites des logs')
+INGEST_CYCLE_SECONDS = Histogram(
+    'ssh_dashboard_ingest_cycle_seconds', 'Durée d\'un cycle d\'ingestion complet (lecture, parsing, écriture)',
+    ['source']
+)
+INGEST_CONFLICTS = Counter(
+    'ssh_dashboard_ingest_conflicts_total', 'Batchs abandonnés : état d\'ingestion modifié par un autre ingesteur'
+)
+INGEST_LAG = Gauge(
+    'ssh_dashboard_ingest_lag_seconds', 'Âge de la tentative la plus récente ingérée'
+)
+
+# Géolocalisation
+GEO_LOOKUP_SECONDS = Histogram(
+    'ssh_dashboard_geo_lookup_seconds', 'Durée d\'un lookup géo par batch', ['backend']
+)
+GEO_LOCATED = Counter('ssh_dashboard_geo_located_total', 'IPs géolocalisées', ['backend'])
+GEO_ERRORS = Counter('ssh_dashboard_geo_errors_total', 'Batchs de géolocalisation en échec', ['backend'])
+
+# Base de données
+DB_QUERY_SECONDS = Histogram(
+    'ssh_dashboard_db_query_seconds', 'Durée des fonctions de app/database.py', ['function']
+)
+DB_ERRORS = Counter(
+    'ssh_dashboard_db_errors_total', 'Erreurs SQLite remontées par app/database.py', ['function']
+)
+DB_LOCK_WAIT_SECONDS = Histogram(
+    'ssh_dashboard_db_lock_wait_seconds', 'Attente du verrou écrivain (BEGIN IMMEDIATE)', ['operation']
+)
+DB_LOCK_HELD_SECONDS = Histogram(
+    'ssh_dashboard_db_lock_held_seconds', 'Verrou écrivain tenu (BEGIN IMMEDIATE → COMMIT)', ['operation']
+)
+SQLITE_BUSY = Counter(
+    'ssh_dashboard_sqlite_busy_total',
+    'Verrou écrivain occupé : retry par le busy handler (waited) ou abandon (failed)',
+    ['operation', 'outcome']
+)
+
+# HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    'ssh_dashboard_http_request_seconds', 'Durée des requêtes API (hors corps streamé)',
+    ['endpoint', 'method', 'status']
+)
+STATS_CACHE = Counter(
+    'ssh_dashboard_stats_cache_total', 'Requêtes /api/stats par résultat de cache', ['result']
+)
+STREAM_CLIENTS = Gauge(
+    'ssh_dashboard_stream_clients', 'Clients /api/stream (SSE) connectés'
+)
+
+# ============================================
+# INSTRUMENTATION
+# ============================================
+
+class _Profile:
+    """Appels BDD d'une requête HTTP profilée : (fonction, durée, imbriqué)."""
+
+    __slots__ = ('calls', 'depth')
+
+    def __init__(self):
+        self.calls: List[Tuple[str, float, bool]] = []
+        self.depth = 0
+
+# Profil de la requête HTTP en cours (None = profilage inactif)
+_profile: contextvars.ContextVar = contextvars.ContextVar('profile', default=None)
+
+def timed_query(function: Callable) -> Callable:
+    """
+    Chronomètre une fonction de app/database.py (histogramme par nom de
+    fonction + erreurs SQLite propagées). Générateur : seul le temps
+    passé à produire les lignes est compté, pas celui du consommateur.
+    """
+    name = function.__name__
+
+    def record(elapsed: float, profile: Optional[_Profile] = None):
+        DB_QUERY_SECONDS.observe(elapsed, function=name)
+        if profile is not None:
+            profile.calls.append((name, elapsed, profile.depth > 0))
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            elapsed = 0.0
+            iterator = function(*args, **kwargs)
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield item
+            except DB_ERROR_TYPES:
+                DB_ERRORS.inc(function=name)
+                raise
+            finally:
+                iterator.close()
+                record(elapsed, _profile.get())
+
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = _profile.get()
+        if profile is not None:
+            profile.depth += 1  # appels imbriqués : exclus du temps BDD total
+
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except DB_ERROR_TYPES:
+            DB_ERRORS.inc(function=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.depth -= 1
+            record(elapsed, profile)
+
+    return wrapper
+
+def register_db_error_type(error_type: type):
+    """Ajoute les exceptions d'un backend de stockage (app/storage_postgres.py)."""
+    global DB_ERROR_TYPES
+
+    if error_type not in DB_ERROR_TYPES:
+        DB_ERROR_TYPES = DB_ERROR_TYPES + (error_type,)
+
+def record_lock_wait(operation: str, waited: float):
+    """Attente de BEGIN IMMEDIATE : au-delà du seuil, SQLite a dû réessayer."""
+    DB_LOCK_WAIT_SECONDS.observe(waited, operation=operation)
+    if waited >= BUSY_WAIT_THRESHOLD:
+        SQLITE_BUSY.inc(operation=operation, outcome='waited')
+
+def record_sqlite_error(operation: str, error: Exception):
+    """Erreur SQLite attrapée par une fonction d'écriture (compte les verrous perdus)."""
+    DB_ERRORS.inc(function=operation)
+    message = str(error).lower()
+    if 'locked' in message or 'busy' in message:
+        SQLITE_BUSY.inc(operation=operation, outcome='failed')
+
+_newest_event = {'timestamp': None, 'epoch': None}
+_newest_event_lock = threading.Lock()
+
+def record_newest_event(timestamp: Optional[str]):
+    """Tentative la plus récente ingérée ('YYYY-MM-DD HH:MM:SS' UTC)."""
+    if not timestamp:
+        return
+
+    with _newest_event_lock:
+        if _newest_event['timestamp'] is not None and timestamp <= _newest_event['timestamp']:
+            return
+        _newest_event['timestamp'] = timestamp
+        _newest_event['epoch'] = calendar.timegm(time.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S'))
+
+def ingest_lag_seconds() -> Optional[float]:
+    """Âge de la tentative la plus récente ingérée par ce process (None si aucune)."""
+    epoch = _newest_event['epoch']
+    return None if epoch is None else max(0.0, time.time() - epoch)
+
+def start_profile():
+    """Active la collecte des durées BDD pour la requête en cours."""
+    return _profile.set(_Profile())
+
+def stop_profile(token) -> List[Tuple[str, float, bool]]:
+    """Appels (fonction, secondes, imbriqué) collectés depuis start_profile()."""
+    profile = _profile.get()
+    _profile.reset(token)
+    return profile.calls if profile else []
+
+def server_timing(calls: List[Tuple[str, float, bool]], total: float) -> str:
+    """En-tête Server-Timing : total, temps BDD, puis chaque fonction (cumul, nb d'appels)."""
+    per_function: Dict[str, List[float]] = {}
+    for name, elapsed, _ in calls:
+        entry = per_function.setdefault(name, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+
+    db_total = sum(elapsed for _, elapsed, nested in calls if not nested)
+    parts = [f'total;dur={total * 1000:.2f}', f'db;dur={db_total * 1000:.2f}']
+    for name, (elapsed, calls) in sorted(per_function.items(), key=lambda item: -item[1][0]):
+        parts.append(f'{name};dur={elapsed * 1000:.2f};desc="x{calls}"')
+    return ', '.join(parts)
+
+def render_metrics() -> str:
+    """Toutes les métriques du process au format texte Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
@@ -0,0 +1,205 @@
+"""
+SSH Attack Dashboard - Retention & Archives
+Garde la BDD chaude bornée quelle que soit la durée de fonctionnement :
+snapshots horaires, compaction des données anciennes en agrégats
+journaliers, archives mensuelles ATTACH-ables et incremental_vacuum
+par petites étapes (archives et vacuum : SQLite seulement, PostgreSQL
+a son autovacuum)
+
+    python run.py retention              # une passe complète au premier plan
+    python run.py retention --vacuum     # + conversion unique en auto_vacuum=INCREMENTAL
+"""
+
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from . import database
+from .storage import get_storage, storage
+
+# Archives mensuelles ssh_attacks-YYYY-MM.db (hors de la BDD chaude)
+ARCHIVE_DIR = os.environ.get('SSH_DASHBOARD_ARCHIVE_DIR') or os.path.join(os.path.dirname(__file__), 'archives')
+ARCHIVE_PATTERN = re.compile(r'^ssh_attacks-(\d{4}-\d{2})\.db$')
+
+# Mois archivé une fois entièrement plus vieux que N jours
+ARCHIVE_AFTER_DAYS = 90
+
+# Un snapshot attack_history par heure (marge pour la dérive du scheduler)
+SNAPSHOT_INTERVAL = timedelta(minutes=55)
+
+# Durée max d'une passe (compaction + archivage + vacuum), reprise à la suivante
+RETENTION_TIME_BUDGET = 30.0
+
+# incremental_vacuum : pages rendues par étape, pause laissant passer l'ingestion
+VACUUM_STEP_PAGES = 512
+VACUUM_STEP_PAUSE = 0.05
+
+# ============================================
+# PASSE DE RÉTENTION
+# ============================================
+
+def run_retention(time_budget: float = RETENTION_TIME_BUDGET) -> Dict:
+    """
+    Une passe complète (maintenance horaire du process ingesteur) :
+
+    1. snapshot attack_history si le dernier a plus d'une heure
+    2. events bruts expirés → détail journalier, puis purge
+    3. rollups heure×IP de plus de 30 jours → rollups jour×IP
+    4. snapshots de plus de 30 jours → un par jour
+    5. mois de plus de 90 jours → archives mensuelles
+    6. espace libéré rendu au disque (incremental_vacuum)
+
+    Les étapes 3, 5 et 6 s'arrêtent au budget de temps : un long
+    rattrapage (backfill de plusieurs années) s'étale sur plusieurs passes.
+    """
+    deadline = time.monotonic() + time_budget
+
+    summary = {
+        'snapshot': take_snapshot_if_due(),
+        'pruned_events': storage.prune_attack_events(),
+        'compacted_days': storage.compact_hour_rollups(deadline=deadline),
+        'thinned_snapshots': storage.thin_history_snapshots(),
+        'archived_months': archive_old_months(deadline=deadline)
+    }
+    summary['freed_pages'] = reclaim_space(deadline=deadline)
+
+    return summary
+
+def take_snapshot_if_due() -> bool:
+    """Snapshot attack_history si aucun depuis SNAPSHOT_INTERVAL."""
+    last = storage.get_last_history_snapshot()
+    now = datetime.now(timezone.utc)
+
+    if last:
+        last = datetime.strptime(last[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if now - last < SNAPSHOT_INTERVAL:
+            return False
+
+    storage.save_history_snapshot()
+    return True
+
+# ============================================
+# ARCHIVES MENSUELLES
+# ============================================
+
+def archive_path(month: str) -> str:
+    """Fichier d'archive d'un mois 'YYYY-MM'."""
+    return os.path.join(ARCHIVE_DIR, f'ssh_attacks-{month}.db')
+
+def list_archives() -> Dict[str, str]:
+    """{mois 'YYYY-MM': chemin} des archives existantes, par mois croissant."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return {}
+
+    archives = {}
+    for name in sorted(os.listdir(ARCHIVE_DIR)):
+        match = ARCHIVE_PATTERN.match(name)
+        if match:
+            archives[match.group(1)] = os.path.join(ARCHIVE_DIR, name)
+    return archives
+
+def archive_old_months(
+    after_days: int = ARCHIVE_AFTER_DAYS,
+    deadline: Optional[float] = None
+) -> List[str]:
+    """
+    Archive, du plus ancien au plus récent, les mois entièrement plus
+    vieux que `after_days` jours.
+
+    Returns:
+        Mois archivés pendant cette passe
+    """
+    if get_storage().name != 'sqlite':
+        return []
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=after_days)
+    before_day = cutoff.strftime('%Y-%m-01')
+    archived = []
+
+    while deadline is None or time.monotonic() < deadline:
+        month = database.get_oldest_archivable_month(before_day)
+        if month is None:
+            break
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        if database.archive_month(month, archive_path(month)) is None:
+            # Mois modifié pendant la copie ou erreur : passe suivante
+            break
+        archived.append(month)
+
+    return archived
+
+def get_history_top_ips(start_day: str, end_day: str, limit: int = 20) -> List[Dict]:
+    """
+    Top IPs entre deux jours 'YYYY-MM-DD' inclus : BDD chaude + seules
+    archives des mois couverts par la période.
+    """
+    archives = [
+        path for month, path in list_archives().items()
+        if start_day[:7] <= month <= end_day[:7]
+    ] if get_storage().name == 'sqlite' else []
+    return storage.get_top_ips_between(start_day, end_day, archives, limit=limit)
+
+# ============================================
+# ESPACE DISQUE
+# ============================================
+
+def reclaim_space(
+    step_pages: int = VACUUM_STEP_PAGES,
+    pause: float = VACUUM_STEP_PAUSE,
+    deadline: Optional[float] = None
+) -> int:
+    """
+    Rend les pages libres au disque par étapes de `step_pages`, verrou
+    écrivain relâché entre deux étapes (l'ingestion n'attend jamais plus
+    d'une étape), au lieu d'un VACUUM complet bloquant.
+
+    BDD créée avant auto_vacuum=INCREMENTAL : rien (conversion unique
+    par `python run.py retention --vacuum`).
+
+    Returns:
+        Pages rendues
+    """
+    if get_storage().name != 'sqlite' or database.get_auto_vacuum_mode() != 2:
+        return 0
+
+    freed = 0
+    while deadline is None or time.monotonic() < deadline:
+        step, remaining = database.incremental_vacuum(step_pages)
+        freed += step
+        if not remaining or not step:
+            break
+        time.sleep(pause)
+
+    return freed
+
+# ============================================
+# POINT D'ENTRÉE
+# ============================================
+
+def run_retention_once(time_budget: float = RETENTION_TIME_BUDGET, convert: bool = False):
+    """
+    Passe de rétention au premier plan (`python run.py retention`).
+
+    Args:
+        convert: VACUUM complet préalable vers auto_vacuum=INCREMENTAL
+            (BDD créées avant la rétention, une seule fois, bloquant)
+    """
+    storage.init_db()
+
+    if get_storage().name == 'sqlite':
+        if convert:
+            database.vacuum_database()
+        elif database.get_auto_vacuum_mode() != 2:
+            print("⚠️  auto_vacuum is not INCREMENTAL: run `python run.py retention --vacuum` once to reclaim space")
+
+    summary = run_retention(time_budget)
+    print(
+        f"✅ Retention : {summary['pruned_events']} events, "
+        f"{summary['compacted_days']} jours compactés, "
+        f"{summary['thinned_snapshots']} snapshots, "
+        f"{len(summary['archived_months'])} mois archivés, "
+        f"{summary['freed_pages']} pages rendues"
+    )
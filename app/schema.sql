@@ -2,14 +2,13 @@
 -- SSH Attack Dashboard - Database Schema
 -- ============================================
 
--- Supprime tables existantes (dev only)
-DROP TABLE IF EXISTS attacks;
-DROP TABLE IF EXISTS attack_history;
+-- Schéma idempotent : rejoué à chaque init_db() pour créer les nouvelles
+-- tables sur une BDD existante (reset complet = init_db(force_reset=True))
 
 -- ============================================
 -- Table principale : attacks
 -- ============================================
-CREATE TABLE attacks (
+CREATE TABLE IF NOT EXISTS attacks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     
     -- Identification IP (UNIQUE = pas de doublons)
@@ -27,6 +26,10 @@ CREATE TABLE attacks (
     country_name TEXT,                    -- Nom complet
     city TEXT,
     isp TEXT,
+    asn TEXT,                             -- "AS15169 Google LLC" (clusters ASN)
+    
+    -- IPv4 en entier (NULL pour IPv6) : plages CIDR = BETWEEN sur index
+    ip_int INTEGER,
     
     -- Classification menace (calculé automatiquement)
     threat_level TEXT DEFAULT 'Modéré',   -- Critique/Élevé/Modéré
@@ -44,25 +47,40 @@ CREATE TABLE attacks (
 -- Index pour performance
 -- ============================================
 
--- Index sur IP pour recherches rapides
-CREATE INDEX idx_attacks_ip ON attacks(ip);
+-- Recherche par IP : l'index implicite de la contrainte UNIQUE suffit
+-- (l'ancien idx_attacks_ip le doublait et ralentissait chaque écriture)
+DROP INDEX IF EXISTS idx_attacks_ip;
+
+-- Index sur last_seen pour trier par date DESC : ASC parcouru à l'envers
+-- donne (last_seen DESC, id DESC), l'ordre keyset de /api/attacks
+-- (l'ancien idx_attacks_last_seen en DESC forçait un tri temporaire sur id)
+DROP INDEX IF EXISTS idx_attacks_last_seen;
+CREATE INDEX IF NOT EXISTS idx_attacks_recent ON attacks(last_seen);
+
+-- Pagination keyset /api/attacks : (filtre, total_attempts, id) par index.
+-- id = rowid, présent implicitement en fin de chaque index SQLite
+CREATE INDEX IF NOT EXISTS idx_attacks_attempts ON attacks(total_attempts);
 
--- Index sur last_seen pour trier par date DESC
-CREATE INDEX idx_attacks_last_seen ON attacks(last_seen DESC);
+-- Filtre niveau + tri tentatives (sert aussi les "top IPs critiques" / auto-ban)
+CREATE INDEX IF NOT EXISTS idx_attacks_threat_attempts ON attacks(threat_level, total_attempts);
 
--- Index sur threat_level pour filtres dashboard
-CREATE INDEX idx_attacks_threat ON attacks(threat_level);
+-- Filtre pays + tri tentatives
+CREATE INDEX IF NOT EXISTS idx_attacks_country_attempts ON attacks(country, total_attempts);
 
--- Index composite pour requêtes "top IPs critiques"
-CREATE INDEX idx_attacks_critical ON attacks(threat_level, total_attempts DESC) 
-    WHERE threat_level = 'Critique';
+-- Index sous-réseau : IPs d'un bloc CIDR (ip_int ne change jamais après insertion)
+CREATE INDEX IF NOT EXISTS idx_attacks_ip_int ON attacks(ip_int);
+
+-- Remplacés par les index composites ci-dessus (préfixes redondants)
+DROP INDEX IF EXISTS idx_attacks_threat;
+DROP INDEX IF EXISTS idx_attacks_critical;
 
 -- ============================================
 -- Table historique : attack_history (bonus)
 -- ============================================
--- Stocke snapshots horaires pour graphique temporel
+-- Stocke snapshots horaires pour graphique temporel (app/retention.py),
+-- un seul gardé par jour au-delà de 30 jours
 
-CREATE TABLE attack_history (
+CREATE TABLE IF NOT EXISTS attack_history (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     total_attacks INTEGER,
@@ -72,19 +90,487 @@ CREATE TABLE attack_history (
 );
 
 -- Index pour requêtes temporelles
-CREATE INDEX idx_history_timestamp ON attack_history(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON attack_history(timestamp DESC);
+
+-- ============================================
+-- Compteurs dashboard matérialisés : dashboard_counters
+-- ============================================
+-- Une seule ligne (id = 1) tenue exacte par triggers sur attacks :
+-- lire les totaux du dashboard = O(1) au lieu d'un scan complet
+
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    unique_ips INTEGER NOT NULL DEFAULT 0,
+    total_attempts INTEGER NOT NULL DEFAULT 0,
+    last_update TIMESTAMP,
+    critical_count INTEGER NOT NULL DEFAULT 0,
+    high_count INTEGER NOT NULL DEFAULT 0,
+    moderate_count INTEGER NOT NULL DEFAULT 0,
+    banned_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Amorçage depuis les données existantes : init_db() (un seul scan, à la création)
+
+-- x IS 'valeur' vaut toujours 0 ou 1 (jamais NULL) : additionnable
+CREATE TRIGGER IF NOT EXISTS trg_counters_insert
+AFTER INSERT ON attacks
+BEGIN
+    UPDATE dashboard_counters SET
+        unique_ips = unique_ips + 1,
+        total_attempts = total_attempts + new.total_attempts,
+        last_update = MAX(COALESCE(last_update, new.last_seen), new.last_seen),
+        critical_count = critical_count + (new.threat_level IS 'Critique'),
+        high_count = high_count + (new.threat_level IS 'Élevé'),
+        moderate_count = moderate_count + (new.threat_level IS 'Modéré'),
+        banned_count = banned_count + (new.is_banned IS 1)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_counters_update
+AFTER UPDATE OF total_attempts, last_seen, threat_level, is_banned ON attacks
+BEGIN
+    UPDATE dashboard_counters SET
+        total_attempts = total_attempts + new.total_attempts - old.total_attempts,
+        last_update = CASE
+            WHEN new.last_seen >= COALESCE(last_update, new.last_seen) THEN new.last_seen
+            WHEN old.last_seen IS last_update THEN (SELECT MAX(last_seen) FROM attacks)
+            ELSE last_update
+        END,
+        critical_count = critical_count + (new.threat_level IS 'Critique') - (old.threat_level IS 'Critique'),
+        high_count = high_count + (new.threat_level IS 'Élevé') - (old.threat_level IS 'Élevé'),
+        moderate_count = moderate_count + (new.threat_level IS 'Modéré') - (old.threat_level IS 'Modéré'),
+        banned_count = banned_count + (new.is_banned IS 1) - (old.is_banned IS 1)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_counters_delete
+AFTER DELETE ON attacks
+BEGIN
+    UPDATE dashboard_counters SET
+        unique_ips = unique_ips - 1,
+        total_attempts = total_attempts - old.total_attempts,
+        last_update = CASE
+            WHEN old.last_seen IS last_update THEN (SELECT MAX(last_seen) FROM attacks)
+            ELSE last_update
+        END,
+        critical_count = critical_count - (old.threat_level IS 'Critique'),
+        high_count = high_count - (old.threat_level IS 'Élevé'),
+        moderate_count = moderate_count - (old.threat_level IS 'Modéré'),
+        banned_count = banned_count - (old.is_banned IS 1)
+    WHERE id = 1;
+END;
+
+-- ============================================
+-- Clusters d'attaquants : attack_clusters
+-- ============================================
+-- Agrégats par /24, /16 (IPv4) et par ASN, tenus exacts par triggers
+-- sur attacks : top sous-réseaux et blocs CIDR à bannir sans GROUP BY
+-- sur toute la table. Amorcé depuis les données existantes par init_db()
+
+CREATE TABLE IF NOT EXISTS attack_clusters (
+    kind TEXT NOT NULL,                   -- net24 / net16 / asn
+    cluster TEXT NOT NULL,                -- "185.220.101.0/24" ou "AS4134 ..."
+    ip_count INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    critical_count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP,
+    PRIMARY KEY (kind, cluster)
+) WITHOUT ROWID;
+
+-- Top clusters par tentatives / clusters multi-IPs (candidats au ban CIDR)
+CREATE INDEX IF NOT EXISTS idx_clusters_attempts ON attack_clusters(kind, attempts);
+CREATE INDEX IF NOT EXISTS idx_clusters_ip_count ON attack_clusters(kind, ip_count);
+
+CREATE TRIGGER IF NOT EXISTS trg_clusters_insert
+AFTER INSERT ON attacks
+BEGIN
+    INSERT INTO attack_clusters (kind, cluster, ip_count, attempts, critical_count, last_seen)
+    SELECT kind, cluster, 1, new.total_attempts, new.threat_level IS 'Critique', new.last_seen
+    FROM (
+        SELECT 'net24' AS kind,
+               printf('%d.%d.%d.0/24', new.ip_int >> 24, (new.ip_int >> 16) & 255, (new.ip_int >> 8) & 255) AS cluster
+        WHERE new.ip_int IS NOT NULL
+        UNION ALL
+        SELECT 'net16', printf('%d.%d.0.0/16', new.ip_int >> 24, (new.ip_int >> 16) & 255)
+        WHERE new.ip_int IS NOT NULL
+        UNION ALL
+        SELECT 'asn', new.asn
+        WHERE new.asn IS NOT NULL
+    )
+    WHERE true
+    ON CONFLICT(kind, cluster) DO UPDATE SET
+        ip_count = ip_count + 1,
+        attempts = attempts + excluded.attempts,
+        critical_count = critical_count + excluded.critical_count,
+        last_seen = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clusters_update
+AFTER UPDATE OF total_attempts, threat_level, last_seen ON attacks
+WHEN new.ip_int IS NOT NULL OR new.asn IS NOT NULL
+BEGIN
+    UPDATE attack_clusters SET
+        attempts = attempts + new.total_attempts - old.total_attempts,
+        critical_count = critical_count + (new.threat_level IS 'Critique') - (old.threat_level IS 'Critique'),
+        last_seen = MAX(COALESCE(last_seen, new.last_seen), new.last_seen)
+    WHERE kind = 'net24'
+      AND cluster = printf('%d.%d.%d.0/24', new.ip_int >> 24, (new.ip_int >> 16) & 255, (new.ip_int >> 8) & 255);
+    
+    UPDATE attack_clusters SET
+        attempts = attempts + new.total_attempts - old.total_attempts,
+        critical_count = critical_count + (new.threat_level IS 'Critique') - (old.threat_level IS 'Critique'),
+        last_seen = MAX(COALESCE(last_seen, new.last_seen), new.last_seen)
+    WHERE kind = 'net16'
+      AND cluster = printf('%d.%d.0.0/16', new.ip_int >> 24, (new.ip_int >> 16) & 255);
+    
+    -- ASN inchangé seulement (sinon trg_clusters_asn déplace la ligne entière)
+    UPDATE attack_clusters SET
+        attempts = attempts + new.total_attempts - old.total_attempts,
+        critical_count = critical_count + (new.threat_level IS 'Critique') - (old.threat_level IS 'Critique'),
+        last_seen = MAX(COALESCE(last_seen, new.last_seen), new.last_seen)
+    WHERE kind = 'asn' AND cluster = new.asn AND new.asn IS old.asn;
+END;
+
+-- ASN connu après coup (géolocalisation) ou modifié : l'IP change de cluster
+CREATE TRIGGER IF NOT EXISTS trg_clusters_asn
+AFTER UPDATE OF asn ON attacks
+WHEN new.asn IS NOT old.asn
+BEGIN
+    UPDATE attack_clusters SET
+        ip_count = ip_count - 1,
+        attempts = attempts - old.total_attempts,
+        critical_count = critical_count - (old.threat_level IS 'Critique')
+    WHERE kind = 'asn' AND cluster = old.asn;
+    
+    DELETE FROM attack_clusters WHERE kind = 'asn' AND cluster = old.asn AND ip_count <= 0;
+    
+    INSERT INTO attack_clusters (kind, cluster, ip_count, attempts, critical_count, last_seen)
+    SELECT 'asn', new.asn, 1, new.total_attempts, new.threat_level IS 'Critique', new.last_seen
+    WHERE new.asn IS NOT NULL
+    ON CONFLICT(kind, cluster) DO UPDATE SET
+        ip_count = ip_count + 1,
+        attempts = attempts + excluded.attempts,
+        critical_count = critical_count + excluded.critical_count,
+        last_seen = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clusters_delete
+AFTER DELETE ON attacks
+WHEN old.ip_int IS NOT NULL OR old.asn IS NOT NULL
+BEGIN
+    UPDATE attack_clusters SET
+        ip_count = ip_count - 1,
+        attempts = attempts - old.total_attempts,
+        critical_count = critical_count - (old.threat_level IS 'Critique')
+    WHERE (kind = 'net24' AND cluster = printf('%d.%d.%d.0/24', old.ip_int >> 24, (old.ip_int >> 16) & 255, (old.ip_int >> 8) & 255))
+       OR (kind = 'net16' AND cluster = printf('%d.%d.0.0/16', old.ip_int >> 24, (old.ip_int >> 16) & 255))
+       OR (kind = 'asn' AND cluster = old.asn);
+    
+    DELETE FROM attack_clusters
+    WHERE ip_count <= 0
+      AND ((kind = 'net24' AND cluster = printf('%d.%d.%d.0/24', old.ip_int >> 24, (old.ip_int >> 16) & 255, (old.ip_int >> 8) & 255))
+        OR (kind = 'net16' AND cluster = printf('%d.%d.0.0/16', old.ip_int >> 24, (old.ip_int >> 16) & 255))
+        OR (kind = 'asn' AND cluster = old.asn));
+END;
+
+-- ============================================
+-- Flux d'alertes temps réel : stream_events
+-- ============================================
+-- Rempli par triggers à l'ingestion (nouvelle IP Élevé/Critique,
+-- escalade de niveau), lu par /api/stream (SSE) : l'id sert de
+-- Last-Event-ID pour reprendre après une reconnexion. Purgé après 24h.
+
+CREATE TABLE IF NOT EXISTS stream_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    type TEXT NOT NULL,                   -- new_ip / escalation
+    ip TEXT NOT NULL,
+    threat_level TEXT,
+    total_attempts INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_stream_events_created ON stream_events(created_at);
+
+CREATE TRIGGER IF NOT EXISTS trg_stream_new_ip
+AFTER INSERT ON attacks
+WHEN new.threat_level IN ('Critique', 'Élevé')
+BEGIN
+    INSERT INTO stream_events (type, ip, threat_level, total_attempts)
+    VALUES ('new_ip', new.ip, new.threat_level, new.total_attempts);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stream_escalation
+AFTER UPDATE OF threat_level ON attacks
+WHEN new.threat_level IS NOT old.threat_level
+BEGIN
+    INSERT INTO stream_events (type, ip, threat_level, total_attempts)
+    VALUES ('escalation', new.ip, new.threat_level, new.total_attempts);
+END;
 
 -- ============================================
 -- Vue pour dashboard (performance)
 -- ============================================
+-- Lit les compteurs matérialisés (recréée : l'ancienne version scannait attacks)
 
+DROP VIEW IF EXISTS v_dashboard_stats;
 CREATE VIEW v_dashboard_stats AS
-SELECT 
-    COUNT(DISTINCT ip) as unique_ips,
-    SUM(total_attempts) as total_attempts,
-    MAX(last_seen) as last_update,
-    COUNT(CASE WHEN threat_level = 'Critique' THEN 1 END) as critical_count,
-    COUNT(CASE WHEN threat_level = 'Élevé' THEN 1 END) as high_count,
-    COUNT(CASE WHEN threat_level = 'Modéré' THEN 1 END) as moderate_count,
-    COUNT(CASE WHEN is_banned = 1 THEN 1 END) as banned_count
-FROM attacks;
+SELECT
+    unique_ips,
+    total_attempts,
+    last_update,
+    critical_count,
+    high_count,
+    moderate_count,
+    banned_count
+FROM dashboard_counters
+WHERE id = 1;
+
+-- ============================================
+-- Table état ingestion : ingest_state
+-- ============================================
+-- Clé/valeur persistée par le parser (ex : curseur journalctl) pour
+-- ne relire que les nouvelles entrées à chaque ingestion
+
+CREATE TABLE IF NOT EXISTS ingest_state (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================
+-- Table événements : attack_events (append-only)
+-- ============================================
+-- Une ligne par tentative échouée, compactée dans attack_rollup_day_detail
+-- puis purgée après rétention (prune_attack_events) pour garder la BDD bornée
+
+CREATE TABLE IF NOT EXISTS attack_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ip TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL,         -- UTC 'YYYY-MM-DD HH:MM:SS'
+    username TEXT,
+    port INTEGER,
+    auth_method TEXT,                     -- password, publickey...
+    event_type TEXT                       -- failed, invalid_user, preauth, max_auth
+);
+
+-- Index pour purge par date + historique d'une IP
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON attack_events(timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_ip ON attack_events(ip, timestamp);
+
+-- ============================================
+-- Rollups pré-agrégés (maintenus à l'ingestion)
+-- ============================================
+-- Timeline / pic / tendance lisent ces tables (24 lignes pour 24h)
+-- au lieu de scanner attack_events
+
+-- Tentatives par minute (fenêtre courte, purgée après 48h)
+CREATE TABLE IF NOT EXISTS attack_rollup_minute (
+    bucket TEXT PRIMARY KEY,              -- UTC 'YYYY-MM-DD HH:MM'
+    attempts INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Tentatives par heure et par IP (sert à compter les IPs distinctes)
+CREATE TABLE IF NOT EXISTS attack_rollup_hour_ip (
+    bucket TEXT NOT NULL,                 -- UTC 'YYYY-MM-DD HH:00'
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, ip)
+) WITHOUT ROWID;
+
+-- Totaux par heure (tenus à jour par triggers sur attack_rollup_hour_ip)
+CREATE TABLE IF NOT EXISTS attack_rollup_hour (
+    bucket TEXT PRIMARY KEY,              -- UTC 'YYYY-MM-DD HH:00'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_hour_ip_insert
+AFTER INSERT ON attack_rollup_hour_ip
+BEGIN
+    INSERT INTO attack_rollup_hour (bucket, attempts, ip_count)
+    VALUES (new.bucket, new.attempts, 1)
+    ON CONFLICT(bucket) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        ip_count = ip_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_hour_ip_update
+AFTER UPDATE OF attempts ON attack_rollup_hour_ip
+BEGIN
+    UPDATE attack_rollup_hour
+    SET attempts = attempts + new.attempts - old.attempts
+    WHERE bucket = new.bucket;
+END;
+
+-- ============================================
+-- Agrégats journaliers (rétention longue)
+-- ============================================
+-- Les rollups heure×IP de plus de 30 jours et les events bruts expirés
+-- y sont compactés (app/retention.py) ; les mois anciens partent
+-- ensuite dans des archives mensuelles (app/archives/ssh_attacks-YYYY-MM.db)
+
+-- Tentatives par jour et par IP (rollups horaires compactés)
+CREATE TABLE IF NOT EXISTS attack_rollup_day_ip (
+    day TEXT NOT NULL,                    -- UTC 'YYYY-MM-DD'
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, ip)
+) WITHOUT ROWID;
+
+-- Totaux par jour (triggers sur attack_rollup_day_ip, conservés à l'archivage)
+CREATE TABLE IF NOT EXISTS attack_rollup_day (
+    day TEXT PRIMARY KEY,                 -- UTC 'YYYY-MM-DD'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_day_ip_insert
+AFTER INSERT ON attack_rollup_day_ip
+BEGIN
+    INSERT INTO attack_rollup_day (day, attempts, ip_count)
+    VALUES (new.day, new.attempts, 1)
+    ON CONFLICT(day) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        ip_count = ip_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_day_ip_update
+AFTER UPDATE OF attempts ON attack_rollup_day_ip
+BEGIN
+    UPDATE attack_rollup_day
+    SET attempts = attempts + new.attempts - old.attempts
+    WHERE day = new.day;
+END;
+
+-- Détail des events bruts expirés : utilisateurs, méthodes, types par jour
+CREATE TABLE IF NOT EXISTS attack_rollup_day_detail (
+    day TEXT NOT NULL,                    -- UTC 'YYYY-MM-DD'
+    kind TEXT NOT NULL,                   -- username / auth_method / event_type
+    value TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, kind, value)
+) WITHOUT ROWID;
+
+-- ============================================
+-- Cache géolocalisation : geo_cache
+-- ============================================
+-- Rempli hors ingestion par app/geo.py (lookups batch rate-limités),
+-- TTL via fetched_at. status = 'fail' évite de re-demander une IP
+-- privée/inconnue à chaque cycle
+
+CREATE TABLE IF NOT EXISTS geo_cache (
+    ip TEXT PRIMARY KEY,
+    status TEXT NOT NULL,                 -- success / fail
+    country TEXT,                         -- Code ISO
+    country_name TEXT,
+    city TEXT,
+    isp TEXT,
+    asn TEXT,                             -- "AS15169 Google LLC"
+    lat REAL,
+    lon REAL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- IPs à géolocaliser en priorité (les plus actives d'abord)
+CREATE INDEX IF NOT EXISTS idx_attacks_missing_geo ON attacks(total_attempts DESC)
+    WHERE country IS NULL;
+
+-- ============================================
+-- Multi-serveurs : attack_hosts / ingest_hosts
+-- ============================================
+-- attacks reste la vue flotte (une ligne par IP, tous serveurs
+-- confondus) ; attack_hosts ajoute la dimension serveur (tentatives de
+-- chaque IP sur chaque hôte). Écrites dans la même transaction.
+-- ingest_hosts : totaux par hôte (tenus par triggers) + dernier numéro
+-- de batch accepté de l'agent (idempotence des renvois)
+
+CREATE TABLE IF NOT EXISTS attack_hosts (
+    host TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen TIMESTAMP,
+    last_seen TIMESTAMP,
+    PRIMARY KEY (host, ip)
+) WITHOUT ROWID;
+
+-- Top IPs d'un hôte / hôtes ayant vu une IP
+CREATE INDEX IF NOT EXISTS idx_attack_hosts_attempts ON attack_hosts(host, attempts);
+CREATE INDEX IF NOT EXISTS idx_attack_hosts_ip ON attack_hosts(ip);
+
+CREATE TABLE IF NOT EXISTS ingest_hosts (
+    host TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP,                  -- dernière tentative vue sur l'hôte
+    last_seq INTEGER NOT NULL DEFAULT 0,  -- dernier batch agent appliqué
+    last_push TIMESTAMP                   -- dernier POST /api/ingest
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_attack_hosts_insert
+AFTER INSERT ON attack_hosts
+BEGIN
+    INSERT INTO ingest_hosts (host, attempts, ip_count, last_seen)
+    VALUES (new.host, new.attempts, 1, new.last_seen)
+    ON CONFLICT(host) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        ip_count = ip_count + 1,
+        last_seen = COALESCE(MAX(last_seen, excluded.last_seen), last_seen, excluded.last_seen);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attack_hosts_update
+AFTER UPDATE OF attempts ON attack_hosts
+BEGIN
+    UPDATE ingest_hosts SET
+        attempts = attempts + new.attempts - old.attempts,
+        last_seen = COALESCE(MAX(last_seen, new.last_seen), last_seen, new.last_seen)
+    WHERE host = new.host;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attack_hosts_delete
+AFTER DELETE ON attack_hosts
+BEGIN
+    UPDATE ingest_hosts SET
+        attempts = attempts - old.attempts,
+        ip_count = ip_count - 1
+    WHERE host = old.host;
+END;
+
+-- Une IP supprimée de attacks disparaît aussi de la vue par hôte
+CREATE TRIGGER IF NOT EXISTS trg_attacks_delete_hosts
+AFTER DELETE ON attacks
+BEGIN
+    DELETE FROM attack_hosts WHERE ip = old.ip;
+END;
+
+-- ============================================
+-- Rafales de brute-force : burst_flags
+-- ============================================
+-- Écrite par le détecteur à fenêtres glissantes (app/detector.py) dans
+-- la transaction du batch d'ingestion : une ligne par IP signalée,
+-- score max conservé. Les rafales récentes rejoignent les candidats au
+-- ban même sous le seuil Critique cumulé
+
+CREATE TABLE IF NOT EXISTS burst_flags (
+    ip TEXT PRIMARY KEY,
+    burst_window TEXT NOT NULL,           -- minute / hour / day (fenêtre du score max)
+    score REAL NOT NULL,                  -- tentatives / seuil de la fenêtre (>= 1)
+    minute_rate INTEGER,                  -- tentatives sur 1 min / 1 h / 24 h au signalement
+    hour_rate INTEGER,
+    day_rate INTEGER,
+    first_flagged TIMESTAMP,              -- heure des logs (UTC)
+    last_flagged TIMESTAMP,
+    flag_count INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS idx_burst_flags_last ON burst_flags(last_flagged);
+
+-- Buckets des batchs agent (POST /api/ingest) en attente du détecteur,
+-- écrits dans la transaction du batch : les workers gunicorn reçoivent
+-- chacun une part des batchs, seul le process qui détient le verrou
+-- d'ingestion les score (fenêtres complètes) puis les supprime
+CREATE TABLE IF NOT EXISTS burst_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    minute TEXT NOT NULL,                 -- UTC 'YYYY-MM-DD HH:MM'
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL
+);
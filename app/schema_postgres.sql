@@ -0,0 +1,530 @@
+-- ============================================
+-- SSH Attack Dashboard - PostgreSQL Schema
+-- ============================================
+
+-- Équivalent de schema.sql pour le backend PostgreSQL (app/storage_postgres.py),
+-- idempotent, rejoué à chaque init_db(). PostgreSQL 14+ (CREATE OR REPLACE TRIGGER).
+-- Timestamps UTC sans fuseau, à la seconde : relus en texte 'YYYY-MM-DD HH:MM:SS'
+-- comme avec SQLite. Agrégats tenus par triggers FOR EACH STATEMENT (tables de
+-- transition) : un batch COPY de 10k IPs = quelques requêtes ensemblistes
+
+-- ============================================
+-- Table principale : attacks
+-- ============================================
+CREATE TABLE IF NOT EXISTS attacks (
+    id BIGSERIAL PRIMARY KEY,
+    ip TEXT COLLATE "C" NOT NULL UNIQUE,  -- ordre binaire (préfixes, curseurs) comme SQLite
+    total_attempts INTEGER NOT NULL DEFAULT 1,
+    first_seen TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+    last_seen TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+    country TEXT,
+    country_name TEXT,
+    city TEXT,
+    isp TEXT,
+    asn TEXT,
+    ip_int BIGINT,
+    threat_level TEXT NOT NULL DEFAULT 'Modéré',
+    is_banned INTEGER NOT NULL DEFAULT 0,  -- 0/1 comme SQLite (mêmes réponses JSON)
+    ban_date TIMESTAMP(0),
+    CHECK (threat_level IN ('Critique', 'Élevé', 'Modéré')),
+    CHECK (total_attempts >= 1)
+);
+
+-- Mêmes index que schema.sql (l'id final sert la pagination keyset)
+CREATE INDEX IF NOT EXISTS idx_attacks_recent ON attacks(last_seen, id);
+CREATE INDEX IF NOT EXISTS idx_attacks_attempts ON attacks(total_attempts, id);
+CREATE INDEX IF NOT EXISTS idx_attacks_threat_attempts ON attacks(threat_level, total_attempts, id);
+CREATE INDEX IF NOT EXISTS idx_attacks_country_attempts ON attacks(country, total_attempts, id);
+CREATE INDEX IF NOT EXISTS idx_attacks_ip_int ON attacks(ip_int);
+
+-- Index partiels : top IPs critiques et candidats au ban (quelques % de la table)
+CREATE INDEX IF NOT EXISTS idx_attacks_critical ON attacks(total_attempts DESC)
+    WHERE threat_level = 'Critique';
+CREATE INDEX IF NOT EXISTS idx_attacks_ban_candidates ON attacks(total_attempts DESC)
+    WHERE threat_level = 'Critique' AND is_banned = 0;
+
+-- IPs à géolocaliser en priorité (les plus actives d'abord)
+CREATE INDEX IF NOT EXISTS idx_attacks_missing_geo ON attacks(total_attempts DESC)
+    WHERE country IS NULL;
+
+-- ============================================
+-- Historique : attack_history
+-- ============================================
+CREATE TABLE IF NOT EXISTS attack_history (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+    total_attacks BIGINT,
+    unique_ips BIGINT,
+    critical_count BIGINT,
+    top_country TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON attack_history(timestamp DESC);
+
+-- ============================================
+-- Compteurs dashboard : dashboard_counters
+-- ============================================
+-- Une ligne par slot (pg_backend_pid() % 16) : deux écrivains concurrents
+-- ne se bloquent pas sur la même ligne ; la vue somme les slots
+
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    slot INTEGER PRIMARY KEY,
+    unique_ips BIGINT NOT NULL DEFAULT 0,
+    total_attempts BIGINT NOT NULL DEFAULT 0,
+    last_update TIMESTAMP(0),
+    critical_count BIGINT NOT NULL DEFAULT 0,
+    high_count BIGINT NOT NULL DEFAULT 0,
+    moderate_count BIGINT NOT NULL DEFAULT 0,
+    banned_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE VIEW v_dashboard_stats AS
+SELECT
+    COALESCE(SUM(unique_ips), 0)::BIGINT AS unique_ips,
+    COALESCE(SUM(total_attempts), 0)::BIGINT AS total_attempts,
+    MAX(last_update) AS last_update,
+    COALESCE(SUM(critical_count), 0)::BIGINT AS critical_count,
+    COALESCE(SUM(high_count), 0)::BIGINT AS high_count,
+    COALESCE(SUM(moderate_count), 0)::BIGINT AS moderate_count,
+    COALESCE(SUM(banned_count), 0)::BIGINT AS banned_count
+FROM dashboard_counters;
+
+-- ============================================
+-- Clusters d'attaquants : attack_clusters
+-- ============================================
+CREATE TABLE IF NOT EXISTS attack_clusters (
+    kind TEXT NOT NULL,                   -- net24 / net16 / asn
+    cluster TEXT NOT NULL,
+    ip_count INTEGER NOT NULL DEFAULT 0,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    critical_count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP(0),
+    PRIMARY KEY (kind, cluster)
+);
+
+CREATE INDEX IF NOT EXISTS idx_clusters_attempts ON attack_clusters(kind, attempts);
+CREATE INDEX IF NOT EXISTS idx_clusters_ip_count ON attack_clusters(kind, ip_count);
+
+-- Clés de cluster depuis ip_int (mêmes chaînes que les printf SQLite)
+CREATE OR REPLACE FUNCTION ssh_net24(ip_int BIGINT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT format('%s.%s.%s.0/24', ip_int >> 24, (ip_int >> 16) & 255, (ip_int >> 8) & 255)
+$$;
+
+CREATE OR REPLACE FUNCTION ssh_net16(ip_int BIGINT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT format('%s.%s.0.0/16', ip_int >> 24, (ip_int >> 16) & 255)
+$$;
+
+-- ============================================
+-- Flux d'alertes temps réel : stream_events
+-- ============================================
+CREATE TABLE IF NOT EXISTS stream_events (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc'),
+    type TEXT NOT NULL,                   -- new_ip / escalation
+    ip TEXT NOT NULL,
+    threat_level TEXT,
+    total_attempts INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_stream_events_created ON stream_events(created_at);
+
+-- ============================================
+-- Triggers attacks → compteurs, clusters, alertes
+-- ============================================
+-- Chaque ligne touchée contribue aux agrégats : nouvelle version +1,
+-- ancienne version -1 (une mise à jour = ancienne retirée, nouvelle ajoutée)
+
+DO $$ BEGIN
+    CREATE TYPE attack_delta AS (
+        sign INTEGER,
+        ip_int BIGINT,
+        asn TEXT,
+        total_attempts INTEGER,
+        threat_level TEXT,
+        is_banned INTEGER,
+        last_seen TIMESTAMP(0)
+    );
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION apply_attack_deltas(deltas attack_delta[]) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO dashboard_counters AS c (
+        slot, unique_ips, total_attempts, last_update,
+        critical_count, high_count, moderate_count, banned_count
+    )
+    SELECT
+        pg_backend_pid() % 16,
+        SUM(sign),
+        SUM(sign * total_attempts),
+        MAX(last_seen) FILTER (WHERE sign > 0),
+        COALESCE(SUM(sign) FILTER (WHERE threat_level = 'Critique'), 0),
+        COALESCE(SUM(sign) FILTER (WHERE threat_level = 'Élevé'), 0),
+        COALESCE(SUM(sign) FILTER (WHERE threat_level = 'Modéré'), 0),
+        SUM(sign * is_banned)
+    FROM unnest(deltas)
+    HAVING COUNT(*) > 0
+    ON CONFLICT (slot) DO UPDATE SET
+        unique_ips = c.unique_ips + excluded.unique_ips,
+        total_attempts = c.total_attempts + excluded.total_attempts,
+        last_update = GREATEST(c.last_update, excluded.last_update),
+        critical_count = c.critical_count + excluded.critical_count,
+        high_count = c.high_count + excluded.high_count,
+        moderate_count = c.moderate_count + excluded.moderate_count,
+        banned_count = c.banned_count + excluded.banned_count;
+
+    -- Clés triées : deux batchs concurrents verrouillent les lignes dans le même ordre
+    INSERT INTO attack_clusters AS c (kind, cluster, ip_count, attempts, critical_count, last_seen)
+    SELECT
+        kind, cluster,
+        SUM(sign),
+        SUM(sign * total_attempts),
+        COALESCE(SUM(sign) FILTER (WHERE threat_level = 'Critique'), 0),
+        MAX(last_seen) FILTER (WHERE sign > 0)
+    FROM (
+        SELECT 'net24' AS kind, ssh_net24(ip_int) AS cluster, sign, total_attempts, threat_level, last_seen
+        FROM unnest(deltas) WHERE ip_int IS NOT NULL
+        UNION ALL
+        SELECT 'net16', ssh_net16(ip_int), sign, total_attempts, threat_level, last_seen
+        FROM unnest(deltas) WHERE ip_int IS NOT NULL
+        UNION ALL
+        SELECT 'asn', asn, sign, total_attempts, threat_level, last_seen
+        FROM unnest(deltas) WHERE asn IS NOT NULL
+    ) d
+    GROUP BY kind, cluster
+    HAVING SUM(sign) <> 0
+        OR SUM(sign * total_attempts) <> 0
+        OR SUM(sign) FILTER (WHERE threat_level = 'Critique') <> 0
+        OR MAX(last_seen) FILTER (WHERE sign > 0) IS DISTINCT FROM MAX(last_seen) FILTER (WHERE sign < 0)
+    ORDER BY kind, cluster
+    ON CONFLICT (kind, cluster) DO UPDATE SET
+        ip_count = c.ip_count + excluded.ip_count,
+        attempts = c.attempts + excluded.attempts,
+        critical_count = c.critical_count + excluded.critical_count,
+        last_seen = GREATEST(c.last_seen, excluded.last_seen);
+
+    -- Clusters vidés (ASN modifié par la géolocalisation, IP supprimée)
+    DELETE FROM attack_clusters
+    WHERE ip_count <= 0
+      AND (kind, cluster) IN (
+          SELECT 'net24', ssh_net24(ip_int) FROM unnest(deltas) WHERE sign < 0 AND ip_int IS NOT NULL
+          UNION
+          SELECT 'net16', ssh_net16(ip_int) FROM unnest(deltas) WHERE sign < 0 AND ip_int IS NOT NULL
+          UNION
+          SELECT 'asn', asn FROM unnest(deltas) WHERE sign < 0 AND asn IS NOT NULL
+      );
+$$;
+
+CREATE OR REPLACE FUNCTION attacks_after_statement() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM apply_attack_deltas(ARRAY(
+            SELECT ROW(1, ip_int, asn, total_attempts, threat_level, is_banned, last_seen)::attack_delta
+            FROM new_rows
+        ));
+        -- Import d'historique (SET LOCAL ssh_dashboard.backfill) : pas d'alertes
+        IF current_setting('ssh_dashboard.backfill', true) IS DISTINCT FROM 'on' THEN
+            INSERT INTO stream_events (type, ip, threat_level, total_attempts)
+            SELECT 'new_ip', ip, threat_level, total_attempts
+            FROM new_rows
+            WHERE threat_level IN ('Critique', 'Élevé')
+            ORDER BY id;
+        END IF;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM apply_attack_deltas(ARRAY(
+            SELECT ROW(1, ip_int, asn, total_attempts, threat_level, is_banned, last_seen)::attack_delta
+            FROM new_rows
+            UNION ALL
+            SELECT ROW(-1, ip_int, asn, total_attempts, threat_level, is_banned, last_seen)::attack_delta
+            FROM old_rows
+        ));
+        IF current_setting('ssh_dashboard.backfill', true) IS DISTINCT FROM 'on' THEN
+            INSERT INTO stream_events (type, ip, threat_level, total_attempts)
+            SELECT 'escalation', n.ip, n.threat_level, n.total_attempts
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.threat_level IS DISTINCT FROM o.threat_level
+            ORDER BY n.id;
+        END IF;
+
+    ELSE
+        PERFORM apply_attack_deltas(ARRAY(
+            SELECT ROW(-1, ip_int, asn, total_attempts, threat_level, is_banned, last_seen)::attack_delta
+            FROM old_rows
+        ));
+        DELETE FROM attack_hosts WHERE ip IN (SELECT ip FROM old_rows);
+    END IF;
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER trg_attacks_insert
+AFTER INSERT ON attacks
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attacks_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_attacks_update
+AFTER UPDATE ON attacks
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attacks_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_attacks_delete
+AFTER DELETE ON attacks
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attacks_after_statement();
+
+-- ============================================
+-- Table état ingestion : ingest_state
+-- ============================================
+CREATE TABLE IF NOT EXISTS ingest_state (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+);
+
+-- Génération des données (cache /api/stats, ETag) : une séquence plutôt
+-- qu'une ligne ingest_state, incrémentée sans verrou après chaque COMMIT
+CREATE SEQUENCE IF NOT EXISTS data_generation;
+
+-- ============================================
+-- Événements bruts : attack_events (append-only, COPY)
+-- ============================================
+CREATE TABLE IF NOT EXISTS attack_events (
+    id BIGSERIAL PRIMARY KEY,
+    ip TEXT NOT NULL,
+    timestamp TIMESTAMP(0) NOT NULL,
+    username TEXT,
+    port INTEGER,
+    auth_method TEXT,
+    event_type TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON attack_events(timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_ip ON attack_events(ip, timestamp);
+
+-- ============================================
+-- Rollups pré-agrégés (buckets texte, comme SQLite)
+-- ============================================
+CREATE TABLE IF NOT EXISTS attack_rollup_minute (
+    bucket TEXT PRIMARY KEY,              -- UTC 'YYYY-MM-DD HH:MM'
+    attempts BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS attack_rollup_hour_ip (
+    bucket TEXT NOT NULL,                 -- UTC 'YYYY-MM-DD HH:00'
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, ip)
+);
+
+CREATE TABLE IF NOT EXISTS attack_rollup_hour (
+    bucket TEXT PRIMARY KEY,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS attack_rollup_day_ip (
+    day TEXT NOT NULL,                    -- UTC 'YYYY-MM-DD'
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, ip)
+);
+
+CREATE TABLE IF NOT EXISTS attack_rollup_day (
+    day TEXT PRIMARY KEY,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS attack_rollup_day_detail (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,                   -- username / auth_method / event_type
+    value TEXT NOT NULL,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, kind, value)
+);
+
+-- Totaux par heure / par jour : insertion = nouvelles IPs du bucket,
+-- mise à jour = écart de tentatives. Pas de trigger DELETE : compaction
+-- et archivage gardent les totaux
+CREATE OR REPLACE FUNCTION rollup_hour_ip_after_statement() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO attack_rollup_hour AS h (bucket, attempts, ip_count)
+        SELECT bucket, SUM(attempts), COUNT(*) FROM new_rows GROUP BY bucket ORDER BY bucket
+        ON CONFLICT (bucket) DO UPDATE SET
+            attempts = h.attempts + excluded.attempts,
+            ip_count = h.ip_count + excluded.ip_count;
+    ELSE
+        UPDATE attack_rollup_hour h SET attempts = h.attempts + d.attempts
+        FROM (
+            SELECT n.bucket, SUM(n.attempts - o.attempts) AS attempts
+            FROM new_rows n JOIN old_rows o ON o.bucket = n.bucket AND o.ip = n.ip
+            GROUP BY n.bucket
+        ) d
+        WHERE h.bucket = d.bucket;
+    END IF;
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER trg_rollup_hour_ip_insert
+AFTER INSERT ON attack_rollup_hour_ip
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION rollup_hour_ip_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_rollup_hour_ip_update
+AFTER UPDATE ON attack_rollup_hour_ip
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION rollup_hour_ip_after_statement();
+
+CREATE OR REPLACE FUNCTION rollup_day_ip_after_statement() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO attack_rollup_day AS d (day, attempts, ip_count)
+        SELECT day, SUM(attempts), COUNT(*) FROM new_rows GROUP BY day ORDER BY day
+        ON CONFLICT (day) DO UPDATE SET
+            attempts = d.attempts + excluded.attempts,
+            ip_count = d.ip_count + excluded.ip_count;
+    ELSE
+        UPDATE attack_rollup_day r SET attempts = r.attempts + d.attempts
+        FROM (
+            SELECT n.day, SUM(n.attempts - o.attempts) AS attempts
+            FROM new_rows n JOIN old_rows o ON o.day = n.day AND o.ip = n.ip
+            GROUP BY n.day
+        ) d
+        WHERE r.day = d.day;
+    END IF;
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER trg_rollup_day_ip_insert
+AFTER INSERT ON attack_rollup_day_ip
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION rollup_day_ip_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_rollup_day_ip_update
+AFTER UPDATE ON attack_rollup_day_ip
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION rollup_day_ip_after_statement();
+
+-- ============================================
+-- Cache de géolocalisation : geo_cache
+-- ============================================
+CREATE TABLE IF NOT EXISTS geo_cache (
+    ip TEXT PRIMARY KEY,
+    status TEXT NOT NULL,                 -- success / fail
+    country TEXT,
+    country_name TEXT,
+    city TEXT,
+    isp TEXT,
+    asn TEXT,
+    lat DOUBLE PRECISION,
+    lon DOUBLE PRECISION,
+    fetched_at TIMESTAMP(0) DEFAULT date_trunc('second', now() AT TIME ZONE 'utc')
+);
+
+-- ============================================
+-- Vue multi-serveurs : attack_hosts / ingest_hosts
+-- ============================================
+CREATE TABLE IF NOT EXISTS attack_hosts (
+    host TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen TIMESTAMP(0),
+    last_seen TIMESTAMP(0),
+    PRIMARY KEY (host, ip)
+);
+
+CREATE INDEX IF NOT EXISTS idx_attack_hosts_attempts ON attack_hosts(host, attempts);
+CREATE INDEX IF NOT EXISTS idx_attack_hosts_ip ON attack_hosts(ip);
+
+CREATE TABLE IF NOT EXISTS ingest_hosts (
+    host TEXT PRIMARY KEY,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    ip_count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP(0),
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    last_push TIMESTAMP(0)
+);
+
+CREATE OR REPLACE FUNCTION attack_hosts_after_statement() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO ingest_hosts AS h (host, attempts, ip_count, last_seen)
+        SELECT host, SUM(attempts), COUNT(*), MAX(last_seen) FROM new_rows GROUP BY host ORDER BY host
+        ON CONFLICT (host) DO UPDATE SET
+            attempts = h.attempts + excluded.attempts,
+            ip_count = h.ip_count + excluded.ip_count,
+            last_seen = GREATEST(h.last_seen, excluded.last_seen);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE ingest_hosts h SET
+            attempts = h.attempts + d.attempts,
+            last_seen = GREATEST(h.last_seen, d.last_seen)
+        FROM (
+            SELECT n.host, SUM(n.attempts - o.attempts) AS attempts, MAX(n.last_seen) AS last_seen
+            FROM new_rows n JOIN old_rows o ON o.host = n.host AND o.ip = n.ip
+            GROUP BY n.host
+        ) d
+        WHERE h.host = d.host;
+    ELSE
+        UPDATE ingest_hosts h SET
+            attempts = h.attempts - d.attempts,
+            ip_count = h.ip_count - d.ip_count
+        FROM (
+            SELECT host, SUM(attempts) AS attempts, COUNT(*) AS ip_count
+            FROM old_rows GROUP BY host
+        ) d
+        WHERE h.host = d.host;
+    END IF;
+
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER trg_attack_hosts_insert
+AFTER INSERT ON attack_hosts
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attack_hosts_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_attack_hosts_update
+AFTER UPDATE ON attack_hosts
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attack_hosts_after_statement();
+
+CREATE OR REPLACE TRIGGER trg_attack_hosts_delete
+AFTER DELETE ON attack_hosts
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION attack_hosts_after_statement();
+
+-- ============================================
+-- Rafales de brute-force : burst_flags
+-- ============================================
+CREATE TABLE IF NOT EXISTS burst_flags (
+    ip TEXT PRIMARY KEY,
+    burst_window TEXT NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    minute_rate INTEGER,
+    hour_rate INTEGER,
+    day_rate INTEGER,
+    first_flagged TIMESTAMP(0),
+    last_flagged TIMESTAMP(0),
+    flag_count INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS idx_burst_flags_last ON burst_flags(last_flagged);
+
+-- Buckets des batchs agent en attente du détecteur (process ingesteur)
+CREATE TABLE IF NOT EXISTS burst_queue (
+    id BIGSERIAL PRIMARY KEY,
+    minute TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    attempts INTEGER NOT NULL
+);
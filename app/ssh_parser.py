@@ -3,12 +3,96 @@ SSH Attack Dashboard - Log Parser
 Parse journalctl (Linux) ou génère mock data (macOS)
 """
 
+import asyncio
 import subprocess
 import re
+import os
+import json
+import time
+import select
 import platform
-from collections import defaultdict
-from typing import List, Dict
-from .database import bulk_upsert_attacks
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, Iterator
+from .storage import storage
+from .detector import score_events, commit_bursts
+from .metrics import JOURNALCTL_SECONDS, PARSE_SECONDS, PARSED_LINES, PARSED_EVENTS, INGEST_CYCLE_SECONDS
+
+# Clé ingest_state du dernier curseur journalctl traité
+JOURNAL_CURSOR_KEY = 'journalctl_cursor'
+
+# Préfixe de la ligne ajoutée par journalctl --show-cursor
+CURSOR_PREFIX = '-- cursor: '
+
+# Durée max d'un appel journalctl en mode polling (secondes)
+JOURNALCTL_TIMEOUT = 10
+
+# Mode follow : fichier suivi + clé ingest_state de sa position ("inode:offset")
+AUTH_LOG_PATH = '/var/log/auth.log'
+AUTH_LOG_POSITION_KEY = 'auth_log_position'
+
+# Micro-transactions du mode follow : flush tous les N events ou toutes les X s
+FOLLOW_BATCH_SIZE = 500
+FOLLOW_FLUSH_INTERVAL = 0.5
+
+# Ligne JSON journalctl max lue par le follow asyncio (octets)
+JOURNAL_LINE_LIMIT = 1024 * 1024
+
+# IP source : IPv4 ou IPv6 (dont IPv4 mappée ::ffff:1.2.3.4)
+_IP = r'(?:\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+)'
+
+# Nom d'utilisateur : chemin rapide sans espace, sinon tout jusqu'à la
+# dernière occurrence possible. Le motif est ancré en fin de ligne : un
+# login forgé contenant " from 6.6.6.6" ne peut pas usurper l'IP (la
+# vraie est toujours la dernière, ajoutée par sshd)
+_USER = r'(?:\S*|.*)'
+
+# Messages sshd reconnus, un groupe nommé par type d'événement. Exemples :
+#   Failed password for root from 192.168.1.100 port 52134 ssh2
+#   Failed publickey for invalid user git from 2001:db8::1 port 4022 ssh2: RSA SHA256:...
+#   Invalid user admin from 203.0.113.45 port 40022
+#   Connection closed by authenticating user root 198.51.100.78 port 61022 [preauth]
+#   error: maximum authentication attempts exceeded for root from 45.142.214.89 port 22 ssh2 [preauth]
+# ("Disconnected from invalid user ..." n'est pas lu : toujours précédé de "Invalid user")
+SSHD_MESSAGE_PATTERN = (
+    r'(?:'
+    rf'(?P<failed>Failed (?P<failed_method>\S+) for (?:invalid user )?(?P<failed_user>{_USER})'
+    rf' from (?P<failed_ip>{_IP})(?: port (?P<failed_port>\d+))?(?: ssh2(?::.*)?)?)'
+    rf'|(?P<invalid_user>Invalid user (?P<invalid_user_user>{_USER})'
+    rf' from (?P<invalid_user_ip>{_IP})(?: port (?P<invalid_user_port>\d+))?)'
+    rf'|(?P<preauth>(?:Connection closed by|Disconnected from) authenticating user'
+    rf' (?P<preauth_user>{_USER}) (?P<preauth_ip>{_IP}) port (?P<preauth_port>\d+) \[preauth\])'
+    rf'|(?P<max_auth>error: maximum authentication attempts exceeded for (?:invalid user )?'
+    rf'(?P<max_auth_user>{_USER}) from (?P<max_auth_ip>{_IP}) port (?P<max_auth_port>\d+) ssh2 \[preauth\])'
+    r')[ \t\r]*$'
+)
+
+# Message seul (MESSAGE journald)
+SSHD_MESSAGE_RE = re.compile(SSHD_MESSAGE_PATTERN, re.MULTILINE)
+
+# Message après un préfixe syslog "... sshd[pid]: ". La recherche démarre
+# sur le littéral "]: " (saut rapide du moteur de regex) et s'applique en
+# une passe (finditer) à toute la sortie : les lignes non reconnues ne
+# remontent jamais en Python. Mêmes numéros de groupes que SSHD_MESSAGE_RE
+SSHD_SYSLOG_RE = re.compile(r'\]: ' + SSHD_MESSAGE_PATTERN, re.MULTILINE)
+
+# Types d'événements (groupe de l'alternative reconnue) → groupes (user, ip, port[, méthode])
+SSHD_EVENT_GROUPS = {
+    event_type: tuple(
+        SSHD_MESSAGE_RE.groupindex[f'{event_type}_{field}']
+        for field in ('user', 'ip', 'port', 'method')
+        if f'{event_type}_{field}' in SSHD_MESSAGE_RE.groupindex
+    )
+    for event_type in ('failed', 'invalid_user', 'preauth', 'max_auth')
+}
+
+# Connexions (pid sshd, ip, port) suivies pour la déduplication, au plus
+PARSER_MAX_CONNECTIONS = 65536
+
+# Format des timestamps stockés (UTC, comme CURRENT_TIMESTAMP SQLite)
+DB_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 # ============================================
 # PARSING LOGS SSH
@@ -18,6 +102,10 @@ def parse_and_store_ssh_logs() -> Dict:
     """
     Parse logs SSH + stocke en BDD en un seul appel.
     
+    Ingestion incrémentale : seules les entrées postérieures au curseur
+    journalctl persisté sont lues. Le nouveau curseur est commité avec les
+    compteurs (exactly-once), le coût dépend du volume de nouveaux events.
+    
     Returns:
         Stats de parsing : {parsed_ips, stored_ips, source}
     """
@@ -26,88 +114,772 @@ def parse_and_store_ssh_logs() -> Dict:
         return generate_and_store_mock_data()
     
     try:
-        # Parse journalctl (Linux uniquement)
-        ip_data = _parse_journalctl()
-        
-        # Enrichit avec géolocalisation (optionnel)
-        enriched_data = []
-        for ip, attempts in ip_data.items():
-            # Pour l'instant, on skip la géoloc (API rate limit)
-            # Tu peux décommenter après si besoin
-            # geo = get_ip_geolocation(ip)
-            enriched_data.append({
-                'ip': ip,
-                'attempts': attempts,
-                # 'country': geo.get('countryCode'),
-                # 'country_name': geo.get('country'),
-                # 'city': geo.get('city'),
-                # 'isp': geo.get('isp')
-            })
-        
-        # Bulk upsert en BDD
-        count = bulk_upsert_attacks(enriched_data)
-        
-        print(f"✅ Parsed {len(ip_data)} IPs, stored {count} in database")
+        started = time.perf_counter()
         
-        return {
-            'parsed_ips': len(ip_data),
-            'stored_ips': count,
-            'source': 'journalctl'
-        }
+        # Parse journalctl depuis le dernier curseur (Linux uniquement)
+        cursor = storage.get_ingest_state(JOURNAL_CURSOR_KEY)
+        parser = _journal_parser.copy()
+        events, new_cursor = _parse_journalctl(cursor, parser)
+        
+        return _store_journal_events(events, cursor, new_cursor, parser, started)
+        
+    except Exception as e:
+        print(f"❌ Error parsing logs: {e}")
+        return {'error': str(e), 'source': 'error'}
+
+async def parse_and_store_ssh_logs_async(executor=None) -> Dict:
+    """
+    Comme parse_and_store_ssh_logs, pour le mode ASGI (app/asgi.py) :
+    journalctl est lancé par asyncio.create_subprocess_exec, le parsing et
+    la BDD passent par le pool de threads `executor`. La boucle
+    d'événements continue de servir les clients pendant tout le cycle.
+    """
+    loop = asyncio.get_running_loop()
+    
+    if platform.system() == "Darwin":  # macOS
+        return await loop.run_in_executor(executor, generate_and_store_mock_data)
+    
+    try:
+        started = time.perf_counter()
+        
+        cursor = await loop.run_in_executor(executor, storage.get_ingest_state, JOURNAL_CURSOR_KEY)
+        parser = _journal_parser.copy()
+        
+        with JOURNALCTL_SECONDS.time():
+            process = await asyncio.create_subprocess_exec(
+                *_journalctl_command(cursor),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), JOURNALCTL_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise TimeoutError(f'journalctl timed out after {JOURNALCTL_TIMEOUT:g}s')
+        
+        output, new_cursor = _split_journal_cursor(stdout.decode('utf-8', 'replace'))
+        events = await loop.run_in_executor(executor, parser.parse_text, output)
+        
+        return await loop.run_in_executor(
+            executor, _store_journal_events, events, cursor, new_cursor, parser, started
+        )
         
     except Exception as e:
         print(f"❌ Error parsing logs: {e}")
         return {'error': str(e), 'source': 'error'}
 
-def _parse_journalctl() -> Dict[str, int]:
+def _store_journal_events(
+    events: List[Dict],
+    cursor: Optional[str],
+    new_cursor: Optional[str],
+    parser: 'SSHEventParser',
+    started: float
+) -> Dict:
+    """Écrit les events d'une passe journalctl et avance le curseur (même transaction)."""
+    global _journal_parser
+    
+    # Agrège par IP (géolocalisation faite hors ingestion, cf. app/geo.py)
+    enriched_data = _aggregate_events(events)
+    
+    # Bulk upsert en BDD + events/rollups + rafales + curseur, même transaction
+    state = {JOURNAL_CURSOR_KEY: new_cursor} if new_cursor and new_cursor != cursor else None
+    observation = score_events(events)
+    count = storage.bulk_upsert_attacks(
+        enriched_data,
+        events=events,
+        state=state,
+        expected_state={JOURNAL_CURSOR_KEY: cursor},
+        bursts=observation.bursts
+    )
+    
+    # État des connexions et fenêtres de rafales mis à jour seulement si
+    # le batch est commité (sinon les mêmes lignes seront relues au
+    # prochain passage)
+    if state is not None:
+        committed = storage.get_ingest_state(JOURNAL_CURSOR_KEY) == new_cursor
+    else:
+        committed = count > 0 or not enriched_data
+    if committed:
+        _journal_parser = parser
+        commit_bursts(observation)
+    
+    INGEST_CYCLE_SECONDS.observe(time.perf_counter() - started, source='journalctl')
+    print(f"✅ Parsed {len(enriched_data)} IPs, stored {count} in database")
+    
+    return {
+        'parsed_ips': len(enriched_data),
+        'parsed_events': len(events),
+        'stored_ips': count,
+        'source': 'journalctl',
+        'incremental': cursor is not None
+    }
+
+def _parse_journalctl(
+    cursor: Optional[str] = None,
+    parser: Optional['SSHEventParser'] = None
+) -> Tuple[List[Dict], Optional[str]]:
     """
     Parse journalctl pour extraire failed SSH attempts.
     
+    Args:
+        cursor: Curseur de la dernière entrée déjà comptée. Si None
+            (premier lancement), amorçage sur les 24 dernières heures.
+        parser: Parser (état des connexions) à utiliser, neuf par défaut
+    
     Returns:
-        {ip: attempts_count}
-    """
-    # Commande journalctl (24h de logs)
-    result = subprocess.run(
-        [
-            'journalctl',
-            '-u', 'ssh',
-            '-u', 'sshd',
-            '--since', '24 hours ago',
-            '--no-pager'
-        ],
-        capture_output=True,
-        text=True,
-        timeout=10
+        (events [{ip, timestamp, username, port, auth_method}], curseur de
+        la dernière entrée lue ou None si aucune nouvelle entrée)
+    """
+    with JOURNALCTL_SECONDS.time():
+        result = subprocess.run(
+            _journalctl_command(cursor),
+            capture_output=True,
+            text=True,
+            timeout=JOURNALCTL_TIMEOUT
+        )
+    
+    output, new_cursor = _split_journal_cursor(result.stdout)
+    return (parser or SSHEventParser()).parse_text(output), new_cursor
+
+def _journalctl_command(cursor: Optional[str], follow: bool = False) -> List[str]:
+    """
+    Commande journalctl des unités ssh/sshd : reprise juste après `cursor`,
+    24 dernières heures sinon. follow=True → flux JSON continu (-f).
+    """
+    command = [
+        'journalctl',
+        '-u', 'ssh',
+        '-u', 'sshd',
+        '--no-pager'
+    ]
+    
+    if follow:
+        command += ['--follow', '--output', 'json']
+    else:
+        command += ['--output', 'short-iso', '--show-cursor']
+    
+    if cursor:
+        # Reprend juste après la dernière entrée déjà comptée
+        command += ['--after-cursor', cursor]
+    else:
+        command += ['--since', '24 hours ago']
+    
+    return command
+
+def _split_journal_cursor(output: str) -> Tuple[str, Optional[str]]:
+    """Sépare la sortie --show-cursor en (lignes de logs, curseur ou None)."""
+    # Dernière ligne : "-- cursor: s=...;i=...;b=..."
+    new_cursor = None
+    cursor_start = output.rfind(CURSOR_PREFIX)
+    if cursor_start != -1 and (cursor_start == 0 or output[cursor_start - 1] == '\n'):
+        new_cursor = output[cursor_start + len(CURSOR_PREFIX):].strip() or None
+        output = output[:cursor_start]
+    
+    return output, new_cursor
+
+class SSHEventParser:
+    """
+    Extrait les tentatives d'intrusion des logs sshd (IPv4/IPv6) :
+    Failed <méthode>, Invalid user, fermeture [preauth] d'un utilisateur
+    en cours d'authentification, maximum authentication attempts exceeded.
+    
+    Une connexion (pid sshd, ip, port) compte autant de tentatives que de
+    lignes "Failed", ou une seule si elle n'en a aucune (login invalide
+    sans mot de passe, sonde publickey...) : ses autres lignes (Invalid
+    user, Disconnected...) ne sont pas recomptées. Le pid distingue deux
+    sessions d'un scanner à port source fixe. L'état des connexions suit
+    le flux d'un appel à l'autre : une instance par source de logs.
+    """
+    
+    def __init__(self, max_connections: int = PARSER_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        # (pid, ip, port) → True si la tentative a été comptée sans ligne Failed
+        self._connections: OrderedDict = OrderedDict()
+    
+    def copy(self) -> 'SSHEventParser':
+        """Copie indépendante (état des connexions inclus)."""
+        parser = SSHEventParser(self.max_connections)
+        parser._connections = self._connections.copy()
+        return parser
+    
+    def parse_text(self, text: str) -> List[Dict]:
+        """
+        Événements d'un bloc de lignes syslog / journalctl short-iso, en
+        une passe de regex sur tout le texte (pas de boucle par ligne).
+        """
+        started = time.perf_counter()
+        events = []
+        groups = SSHD_EVENT_GROUPS
+        timestamps: Dict[str, Optional[str]] = {}
+        
+        for match in SSHD_SYSLOG_RE.finditer(text):
+            start = match.start()
+            line_start = text.rfind('\n', 0, start) + 1
+            if text.find('sshd', line_start, start) == -1:
+                continue  # autre programme (auth.log : sudo, CRON...)
+            
+            # Début de ligne (ISO : timestamp, BSD : timestamp + hôte) → UTC,
+            # une conversion par valeur distincte
+            raw = text[line_start:text.find(' ', line_start + 16)]
+            timestamp = timestamps.get(raw)
+            if timestamp is None:
+                timestamp = timestamps[raw] = _syslog_timestamp(text, line_start)
+            
+            # "sshd[pid]: " : le match démarre sur "]: "
+            bracket = text.rfind('[', line_start, start)
+            pid = text[bracket + 1:start] if bracket != -1 else None
+            
+            event_type = match.lastgroup
+            event = self._event(event_type, match.group(*groups[event_type]), timestamp, pid)
+            if event:
+                events.append(event)
+        
+        PARSE_SECONDS.observe(time.perf_counter() - started)
+        PARSED_LINES.inc(text.count('\n'))
+        PARSED_EVENTS.inc(len(events))
+        return events
+    
+    def parse_line(self, line: str, timestamp: Optional[str] = None, pid: Optional[str] = None) -> Optional[Dict]:
+        """
+        Événement d'une ligne syslog (auth.log) ou d'un MESSAGE journald
+        seul (timestamp et pid sshd fournis à part). None si la ligne n'est
+        pas une tentative ou si sa connexion est déjà comptée.
+        """
+        match = SSHD_MESSAGE_RE.match(line)
+        if match is None:
+            match = SSHD_SYSLOG_RE.search(line)
+            if match is None or line.find('sshd', 0, match.start()) == -1:
+                return None
+            if timestamp is None:
+                timestamp = _syslog_timestamp(line, 0)
+            bracket = line.rfind('[', 0, match.start())
+            pid = line[bracket + 1:match.start()] if bracket != -1 else None
+        
+        event_type = match.lastgroup
+        return self._event(event_type, match.group(*SSHD_EVENT_GROUPS[event_type]), timestamp, pid)
+    
+    def _event(self, event_type: str, fields: Tuple, timestamp: Optional[str], pid: Optional[str]) -> Optional[Dict]:
+        """
+        Construit l'événement, ou None si la connexion est déjà comptée :
+        une connexion vaut max(1, nombre de lignes Failed).
+        """
+        if event_type == 'failed':
+            username, ip, port, auth_method = fields
+        else:
+            username, ip, port = fields
+            auth_method = None
+        
+        if ip.startswith('::ffff:') and '.' in ip:
+            ip = ip[7:]  # IPv4 mappée (socket dual-stack)
+        
+        if port is not None:
+            key = (pid, ip, port)
+            connections = self._connections
+            counted_without_failure = connections.get(key)
+            
+            if counted_without_failure is None:
+                connections[key] = event_type != 'failed'
+                if len(connections) > self.max_connections:
+                    connections.popitem(last=False)
+            elif event_type != 'failed':
+                return None
+            elif counted_without_failure:
+                # Premier Failed : déjà compté via Invalid user / [preauth]
+                connections[key] = False
+                return None
+            
+            port = int(port)
+        elif event_type != 'failed':
+            # Anciens formats sans port : connexion non identifiable
+            return None
+        
+        return {
+            'ip': ip,
+            'timestamp': timestamp or datetime.now(timezone.utc).strftime(DB_TIMESTAMP_FORMAT),
+            'username': username or None,
+            'port': port,
+            'auth_method': auth_method,
+            'event_type': event_type
+        }
+
+# Parser du mode polling (état des connexions gardé entre deux passes)
+_journal_parser = SSHEventParser()
+
+def _aggregate_events(events: List[Dict]) -> List[Dict]:
+    """Agrège les events par IP → [{ip, attempts, first_seen, last_seen}]."""
+    per_ip = {}
+    
+    for event in events:
+        timestamp = event['timestamp']
+        attack = per_ip.get(event['ip'])
+        
+        if attack is None:
+            per_ip[event['ip']] = {
+                'ip': event['ip'],
+                'attempts': 1,
+                'first_seen': timestamp,
+                'last_seen': timestamp
+            }
+        else:
+            attack['attempts'] += 1
+            attack['first_seen'] = min(attack['first_seen'], timestamp)
+            attack['last_seen'] = max(attack['last_seen'], timestamp)
+    
+    return list(per_ip.values())
+
+def _parse_syslog_timestamp(line: str) -> Optional[str]:
+    """
+    Timestamp UTC d'une ligne syslog/journalctl, formats supportés :
+    - ISO   : "2025-10-17T00:15:32+0200 host sshd[...]" (short-iso, rsyslog)
+    - BSD   : "Oct 17 00:15:32 host sshd[...]" (auth.log classique, heure locale)
+    """
+    return _syslog_timestamp(line, 0)
+
+def _syslog_timestamp(text: str, start: int) -> Optional[str]:
+    """
+    Comme _parse_syslog_timestamp pour la ligne commençant à `start`.
+    
+    Les fuseaux sont décalés de minutes entières : seule la minute est
+    convertie (cache), les secondes sont recopiées telles quelles.
+    """
+    if text[start:start + 4].isdigit():
+        # 2025-10-17T00:15:32[.123456]+0200
+        end = text.find(' ', start)
+        value = text[start:end] if end != -1 else text[start:]
+        if value[16:17] != ':':
+            return _iso_to_utc(value)
+        minute = _iso_minute_to_utc(value[:16], value[19:].lstrip('.0123456789'))
+    else:
+        # Oct 17 00:15:32
+        value = text[start:start + 15]
+        if value[12:13] != ':':
+            return None
+        minute = _bsd_minute_to_utc(value[:12])
+    
+    if minute is None:
+        return None
+    return f'{minute}:{value[17:19] if value[4:5] == "-" else value[13:15]}'
+
+@lru_cache(maxsize=4096)
+def _iso_minute_to_utc(minute: str, offset: str) -> Optional[str]:
+    """'2025-10-17T00:15', '+0200' → '2025-10-16 22:15'."""
+    value = _iso_to_utc(f'{minute}:00{offset}')
+    return value[:16] if value else None
+
+@lru_cache(maxsize=4096)
+def _bsd_minute_to_utc(minute: str) -> Optional[str]:
+    """'Oct 17 00:15' (heure locale) → '2025-10-16 22:15'."""
+    value = _bsd_to_utc(f'{minute}:00')
+    return value[:16] if value else None
+
+@lru_cache(maxsize=4096)
+def _iso_to_utc(value: str) -> Optional[str]:
+    """Cache : des milliers de lignes partagent la même seconde."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).strftime(DB_TIMESTAMP_FORMAT)
+
+@lru_cache(maxsize=4096)
+def _bsd_to_utc(value: str) -> Optional[str]:
+    """Format sans année : on prend l'année courante (ou N-1 si futur)."""
+    try:
+        parsed = datetime.strptime(value, '%b %d %H:%M:%S')
+    except ValueError:
+        return None
+    
+    now = datetime.now()
+    parsed = parsed.replace(year=now.year)
+    if parsed > now + timedelta(days=1):
+        parsed = parsed.replace(year=now.year - 1)
+    
+    # Naïf = heure locale du serveur → UTC
+    return parsed.astimezone(timezone.utc).strftime(DB_TIMESTAMP_FORMAT)
+
+# ============================================
+# MODE FOLLOW (STREAMING TEMPS RÉEL)
+# ============================================
+
+def follow_ssh_logs(
+    source: str = 'journal',
+    path: str = AUTH_LOG_PATH,
+    batch_size: int = FOLLOW_BATCH_SIZE,
+    flush_interval: float = FOLLOW_FLUSH_INTERVAL,
+    stop_event: Optional[threading.Event] = None
+):
+    """
+    Ingestion continue : suit `journalctl -f -o json` (source='journal')
+    ou un fichier type auth.log (source='file') et écrit par
+    micro-transactions via bulk_upsert_attacks.
+    
+    Pipeline de générateurs → mémoire constante (un batch au plus). La
+    position (curseur journal / inode:offset fichier) est commitée avec
+    chaque batch : un redémarrage reprend exactement où on s'était arrêté.
+    
+    Bloque jusqu'à stop_event.set().
+    """
+    stop_event = stop_event or threading.Event()
+    
+    if source == 'journal':
+        key = JOURNAL_CURSOR_KEY
+    else:
+        key = AUTH_LOG_POSITION_KEY
+    
+    while not stop_event.is_set():
+        position = storage.get_ingest_state(key)
+        
+        if source == 'journal':
+            lines = _follow_journalctl(position, flush_interval, stop_event)
+        else:
+            lines = _follow_auth_log(path, position, flush_interval, stop_event)
+        
+        try:
+            for events, new_position in _batch_events(lines, batch_size, flush_interval):
+                # Position non commitée (erreur BDD ou autre ingesteur) :
+                # on repart de la position persistée pour ne rien compter 2x
+                if not _commit_follow_batch(key, events, position, new_position):
+                    print(f"⚠️  Follow position not committed, restarting from database state")
+                    break
+                position = new_position
+                
+        except Exception as e:
+            print(f"❌ Follow error ({source}): {e}")
+        finally:
+            lines.close()
+        
+        # Source terminée (journalctl mort, erreur...) → relance après pause
+        stop_event.wait(1.0)
+
+async def follow_journal_async(
+    executor=None,
+    batch_size: int = FOLLOW_BATCH_SIZE,
+    flush_interval: float = FOLLOW_FLUSH_INTERVAL
+):
+    """
+    Mode follow journal de l'ASGI (app/asgi.py) : `journalctl -f -o json`
+    lancé par asyncio.create_subprocess_exec et lu sur la boucle
+    d'événements, sans thread dédié ; chaque micro-transaction passe par
+    le pool de threads `executor`. Même reprise exactement-une-fois que
+    follow_ssh_logs.
+    
+    Tourne jusqu'à l'annulation de la tâche.
+    """
+    loop = asyncio.get_running_loop()
+    key = JOURNAL_CURSOR_KEY
+    
+    while True:
+        position = await loop.run_in_executor(executor, storage.get_ingest_state, key)
+        process = await asyncio.create_subprocess_exec(
+            *_journalctl_command(position, follow=True),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=JOURNAL_LINE_LIMIT
+        )
+        batcher = _EventBatcher(batch_size, flush_interval)
+        read = None
+        
+        try:
+            while True:
+                # Lecture en cours gardée d'un tick à l'autre (jamais annulée
+                # à mi-ligne) : un tick sans ligne flushe sur délai
+                if read is None:
+                    read = asyncio.ensure_future(process.stdout.readline())
+                done, _ = await asyncio.wait({read}, timeout=flush_interval)
+                
+                if done:
+                    raw, read = read.result(), None
+                    if not raw:
+                        break  # EOF : journalctl s'est terminé
+                    item = _journal_entry(raw)
+                    if item is None:
+                        continue
+                else:
+                    item = None
+                
+                batch = batcher.feed(item)
+                if batch is None:
+                    continue
+                
+                events, new_position = batch
+                committed = await loop.run_in_executor(
+                    executor, _commit_follow_batch, key, events, position, new_position
+                )
+                if not committed:
+                    print(f"⚠️  Follow position not committed, restarting from database state")
+                    break
+                position = new_position
+                
+        except Exception as e:
+            print(f"❌ Follow error (journal): {e}")
+        finally:
+            if read is not None:
+                read.cancel()
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+        
+        # Source terminée (journalctl mort, erreur...) → relance après pause
+        await asyncio.sleep(1.0)
+
+def _commit_follow_batch(key: str, events: List[Dict], position: Optional[str], new_position: str) -> bool:
+    """
+    Micro-transaction du mode follow (events + position en compare-and-set).
+    Returns: True si la nouvelle position est bien commitée
+    """
+    observation = score_events(events)
+    storage.bulk_upsert_attacks(
+        _aggregate_events(events),
+        events=events,
+        state={key: new_position},
+        expected_state={key: position},
+        bursts=observation.bursts
     )
     
-    # Regex pour Failed password
-    # Exemple log : "Failed password for root from 192.168.1.100 port 52134 ssh2"
-    pattern = r'Failed password for .* from (\d+\.\d+\.\d+\.\d+)'
+    # Batch rejeté : relu depuis la position persistée, pas encore compté
+    if storage.get_ingest_state(key) != new_position:
+        return False
+    commit_bursts(observation)
+    return True
+
+def _batch_events(
+    lines: Iterator[Optional[Tuple[str, Optional[str], str, Optional[str]]]],
+    batch_size: int,
+    flush_interval: float
+) -> Iterator[Tuple[List[Dict], str]]:
+    """
+    Regroupe le flux (ligne, timestamp, position, pid sshd) en batchs (events, position).
+    
+    Un élément None du flux = tick d'inactivité, permet de flusher sur
+    délai même quand aucune nouvelle ligne n'arrive.
+    """
+    batcher = _EventBatcher(batch_size, flush_interval)
+    
+    for item in lines:
+        batch = batcher.feed(item)
+        if batch is not None:
+            yield batch
+
+class _EventBatcher:
+    """
+    État d'un regroupement en batchs (mode follow), alimenté élément par
+    élément : partagé entre le pipeline de générateurs et la boucle asyncio.
+    """
+    
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Parser neuf à chaque (re)prise : les lignes relues depuis la position
+        # persistée sont comptées exactement comme la première fois
+        self.parser = SSHEventParser()
+        self.events: List[Dict] = []
+        self.position = None
+        self.deadline = None
+        self.line_count = 0
+        self.parse_seconds = 0.0
     
-    # Compte attempts par IP
-    ip_counts = defaultdict(int)
-    for line in result.stdout.splitlines():
-        match = re.search(pattern, line)
-        if match:
-            ip = match.group(1)
-            ip_counts[ip] += 1
+    def feed(self, item: Optional[Tuple[str, Optional[str], str, Optional[str]]]) -> Optional[Tuple[List[Dict], str]]:
+        """Ajoute une ligne (ou un tick None). Returns: (events, position) si le batch est plein ou échu."""
+        if item is not None:
+            line, timestamp, self.position, pid = item
+            
+            started = time.perf_counter()
+            event = self.parser.parse_line(line, timestamp, pid)
+            self.parse_seconds += time.perf_counter() - started
+            self.line_count += 1
+            if event:
+                self.events.append(event)
+            
+            if self.deadline is None:
+                self.deadline = time.monotonic() + self.flush_interval
+        
+        if self.deadline is None or (len(self.events) < self.batch_size and time.monotonic() < self.deadline):
+            return None
+        
+        # Métriques par batch (pas de verrou par ligne)
+        PARSE_SECONDS.observe(self.parse_seconds)
+        PARSED_LINES.inc(self.line_count)
+        PARSED_EVENTS.inc(len(self.events))
+        self.line_count = 0
+        self.parse_seconds = 0.0
+        
+        batch = self.events, self.position
+        self.events = []
+        self.deadline = None
+        return batch
+
+def _follow_journalctl(
+    cursor: Optional[str],
+    tick: float,
+    stop_event: threading.Event
+) -> Iterator[Optional[Tuple[str, Optional[str], str, Optional[str]]]]:
+    """Suit journalctl -f -o json → (message, timestamp, __CURSOR, _PID) ou None si inactif."""
+    process = subprocess.Popen(
+        _journalctl_command(cursor, follow=True),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
     
-    return dict(ip_counts)
+    try:
+        for raw in _read_lines(process.stdout.fileno(), tick, stop_event):
+            if raw is None:
+                yield None
+                continue
+            
+            entry = _journal_entry(raw)
+            if entry is not None:
+                yield entry
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+def _journal_entry(raw: bytes) -> Optional[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """Ligne `journalctl -o json` → (message, timestamp UTC, __CURSOR, _PID), None si illisible."""
+    try:
+        entry = json.loads(raw)
+    except ValueError:
+        return None
+    
+    message = entry.get('MESSAGE')
+    if isinstance(message, list):
+        # Message non UTF-8 : journald l'exporte en liste d'octets
+        message = bytes(message).decode('utf-8', 'replace')
+    
+    # __REALTIME_TIMESTAMP : microsecondes depuis epoch (UTC)
+    timestamp = None
+    realtime = entry.get('__REALTIME_TIMESTAMP')
+    if realtime:
+        timestamp = datetime.fromtimestamp(int(realtime) / 1e6, timezone.utc).strftime(DB_TIMESTAMP_FORMAT)
+    
+    return message or '', timestamp, entry.get('__CURSOR'), entry.get('_PID') or entry.get('SYSLOG_PID')
+
+def _follow_auth_log(
+    path: str,
+    position: Optional[str],
+    tick: float,
+    stop_event: threading.Event
+) -> Iterator[Optional[Tuple[str, Optional[str], str, Optional[str]]]]:
+    """
+    Suit un fichier de logs (tail -F) → (ligne, timestamp, "inode:offset", None)
+    ou None (pid sshd lu dans la ligne syslog).
+    
+    Détecte la rotation (nouvel inode au même chemin) et la troncature
+    (taille < offset) : l'ancien fichier est lu jusqu'au bout avant de
+    basculer sur le nouveau.
+    """
+    inode, offset = None, 0
+    if position:
+        stored_inode, _, stored_offset = position.partition(':')
+        inode, offset = int(stored_inode), int(stored_offset)
+    
+    log_file = None
+    try:
+        while not stop_event.is_set():
+            if log_file is None:
+                try:
+                    log_file = open(path, 'rb')
+                except FileNotFoundError:
+                    # Entre le rename et la recréation lors d'une rotation
+                    yield None
+                    stop_event.wait(tick)
+                    continue
+                
+                stat = os.fstat(log_file.fileno())
+                if stat.st_ino != inode or stat.st_size < offset:
+                    inode, offset = stat.st_ino, 0
+                log_file.seek(offset)
+            
+            line = log_file.readline()
+            if line.endswith(b'\n'):
+                offset += len(line)
+                text = line.decode('utf-8', 'replace')
+                yield text, _parse_syslog_timestamp(text), f'{inode}:{offset}', None
+                continue
+            
+            # Fin de fichier (ou ligne partielle en cours d'écriture)
+            log_file.seek(offset)
+            
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            
+            if stat is None or stat.st_ino != inode:
+                # Rotation : l'ancien fichier est drainé → bascule
+                log_file.close()
+                log_file = None
+                continue
+            
+            if stat.st_size < offset:
+                # Troncature (copytruncate) : on relit depuis le début
+                offset = 0
+                log_file.seek(0)
+                continue
+            
+            yield None
+            stop_event.wait(tick)
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+def _read_lines(fd: int, tick: float, stop_event: threading.Event) -> Iterator[Optional[bytes]]:
+    """Lit un pipe ligne par ligne sans bloquer plus de `tick` secondes."""
+    buffer = b''
+    
+    while not stop_event.is_set():
+        ready, _, _ = select.select([fd], [], [], tick)
+        if not ready:
+            yield None
+            continue
+        
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return  # EOF : le process s'est terminé
+        
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            yield line
 
 # ============================================
 # GÉOLOCALISATION (OPTIONNEL)
 # ============================================
 
+_offline_geo_db = None
+
 def get_ip_geolocation(ip: str) -> Dict:
     """
     Géolocalise IP via API ip-api.com (45 req/min gratuit).
     
+    Si une base de plages IP locale est configurée (SSH_DASHBOARD_GEO_DB),
+    lookup hors-ligne en quelques µs, sans appel réseau.
+    
     ⚠️ Désactivé par défaut pour éviter rate limit en dev.
     Active uniquement en production avec cache Redis.
     
     Returns:
         {country, countryCode, city, isp, lat, lon}
     """
+    global _offline_geo_db
+    
+    db_path = os.environ.get('SSH_DASHBOARD_GEO_DB')
+    if db_path:
+        if _offline_geo_db is None:
+            from .geo_offline import open_geo_database
+            _offline_geo_db = open_geo_database(db_path)
+        
+        geo = _offline_geo_db.lookup(ip)
+        if not geo:
+            return {}
+        return {
+            'country': geo['country_name'],
+            'countryCode': geo['country'],
+            'city': geo['city'],
+            'isp': geo['isp'],
+            'lat': None,
+            'lon': None
+        }
+    
     try:
         import requests
         
@@ -142,8 +914,6 @@ def generate_and_store_mock_data() -> Dict:
     """
     Génère mock data réaliste MAIS ne les réinsère pas si déjà présents.
     """
-    from .database import get_attack_by_ip, upsert_attack
-    
     mock_attacks = [
         {
             'ip': '192.168.1.100',
@@ -190,10 +960,10 @@ def generate_and_store_mock_data() -> Dict:
     # Vérifie si déjà en BDD (évite incrémentation infinie)
     count = 0
     for attack in mock_attacks:
-        existing = get_attack_by_ip(attack['ip'])
+        existing = storage.get_attack_by_ip(attack['ip'])
         if not existing:
             # Insère seulement si nouveau
-            upsert_attack(
+            storage.upsert_attack(
                 ip=attack['ip'],
                 attempts=attack['attempts'],
                 country=attack.get('country'),
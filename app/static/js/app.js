@@ -43,17 +43,36 @@ document.addEventListener('DOMContentLoaded', function() {
     initFilters();
     loadData();
     
-    // Rafraîchissement auto
-    setInterval(loadData, REFRESH_INTERVAL);
+    // Rafraîchissement auto : push SSE, polling en secours
+    initLiveUpdates();
 });
 
 // ============================================
 // CHARGEMENT DES DONNÉES
 // ============================================
+
+// ETag du dernier /api/stats reçu : le serveur répond 304 si rien n'a changé
+let statsEtag = null;
+
+// Retourne les stats, ou null si inchangées depuis le dernier appel (304)
+async function fetchStats() {
+    const headers = statsEtag ? { 'If-None-Match': statsEtag } : {};
+    const response = await fetch(`${API_BASE}/stats`, { headers, cache: 'no-store' });
+    
+    if (response.status === 304) return null;
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    
+    statsEtag = response.headers.get('ETag');
+    return response.json();
+}
+
 async function loadData() {
     try {
-        const response = await fetch(`${API_BASE}/stats`);
-        const data = await response.json();
+        const data = await fetchStats();
+        if (!data) {
+            updateLastUpdate();
+            return;
+        }
         
         // Si pas de données réelles, utilise mock
         const finalData = (data.total_attempts === 0) ? MOCK_DATA : data;
@@ -101,10 +120,54 @@ async function loadData() {
     }
 }
 
+// ============================================
+// TEMPS RÉEL (SSE) + POLLING DE SECOURS
+// ============================================
+let eventSource = null;
+let pollTimer = null;
+let reloadTimer = null;
+
+// /api/stream pousse alertes + compteurs à chaque ingestion ;
+// EventSource se reconnecte seul (Last-Event-ID) et on poll en attendant
+function initLiveUpdates() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    eventSource = new EventSource(`${API_BASE}/stream`);
+    
+    eventSource.addEventListener('open', stopPolling);
+    eventSource.addEventListener('error', startPolling);
+    
+    eventSource.addEventListener('threat', (event) => {
+        handleThreatEvent(JSON.parse(event.data));
+    });
+    
+    // Compteurs modifiés → un seul rechargement (ETag) pour une rafale de commits
+    eventSource.addEventListener('counters', () => {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(loadData, 1000);
+    });
+}
+
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(loadData, REFRESH_INTERVAL);
+    }
+}
+
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
 // ============================================
 // STATISTIQUES - Cartes animées
 // ============================================
 function updateStats(data) {
+    totalUniqueIps = data.unique_ips || 0;
+    
     // Animation compteur pour "Total Tentatives"
     const attemptsElement = document.getElementById('total-attempts');
     const currentAttempts = parseInt(attemptsElement.textContent) || 0;
@@ -491,13 +554,14 @@ function getGeoCache() {
     }
 }
 
-function setGeoCache(ip, data) {
+// Écrit un lot d'entrées en une seule sérialisation localStorage
+function setGeoCacheEntries(entries) {
     try {
         const cache = getGeoCache();
-        cache[ip] = {
-            data: data,
-            timestamp: Date.now()
-        };
+        const now = Date.now();
+        Object.entries(entries).forEach(([ip, data]) => {
+            cache[ip] = { data: data, timestamp: now };
+        });
         localStorage.setItem(GEO_CACHE_KEY, JSON.stringify(cache));
     } catch (e) {
         console.log('Cache géo plein, nettoyage...');
@@ -505,57 +569,115 @@ function setGeoCache(ip, data) {
     }
 }
 
-async function geolocateIP(ip) {
+const UNKNOWN_GEO = {
+    success: false,
+    country: 'Unknown',
+    country_code: 'XX',
+    flag: '🏴',
+    city: 'Unknown'
+};
+
+// Géolocalise une page d'IPs : cache local lu une fois, puis un seul
+// POST /api/geolocate pour les IPs manquantes. Retourne {ip: geo}
+async function geolocateIPs(ips) {
     const cache = getGeoCache();
-    if (cache[ip] && (Date.now() - cache[ip].timestamp) < CACHE_DURATION) {
-        return cache[ip].data;
-    }
+    const results = {};
+    const missing = [];
+    
+    ips.forEach(ip => {
+        if (cache[ip] && (Date.now() - cache[ip].timestamp) < CACHE_DURATION) {
+            results[ip] = cache[ip].data;
+        } else {
+            missing.push(ip);
+        }
+    });
+    
+    if (missing.length === 0) return results;
     
     try {
-        const response = await fetch(`/api/geolocate/${ip}`);
+        const response = await fetch(`${API_BASE}/geolocate`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ips: missing })
+        });
         const data = await response.json();
         
-        if (data.success) {
-            setGeoCache(ip, data);
-        }
-        
-        return data;
+        const located = {};
+        missing.forEach(ip => {
+            const geo = (data.results && data.results[ip]) || UNKNOWN_GEO;
+            results[ip] = geo;
+            if (geo.success) located[ip] = geo;
+        });
+        setGeoCacheEntries(located);
     } catch (error) {
-        console.error(`Erreur géoloc ${ip}:`, error);
-        return {
-            success: false,
-            country: 'Unknown',
-            country_code: 'XX',
-            flag: '🏴'
-        };
+        console.error('Erreur géoloc batch:', error);
+        missing.forEach(ip => { results[ip] = UNKNOWN_GEO; });
     }
+    
+    return results;
 }
 
+// Dernier top IPs reçu : réaffiché quand les filtres sont réinitialisés
+let lastTopIps = [];
+
 // Met à jour le tableau avec géolocalisation
 async function updateTableWithGeo(topIps) {
+    lastTopIps = topIps;
+    
+    // Géo incluse dans /api/stats (item.geo), sinon un seul appel batch
+    const withoutGeo = topIps.filter(item => !item.geo).map(item => item.ip);
+    const geoByIp = withoutGeo.length ? await geolocateIPs(withoutGeo) : {};
+    const items = topIps.map(item => ({ ...item, geo: item.geo || geoByIp[item.ip] || UNKNOWN_GEO }));
+    
+    const countriesCount = {};
+    const countryNames = {};
+    
+    items.forEach(item => {
+        const countryKey = item.geo.country || 'Unknown';
+        countriesCount[countryKey] = (countriesCount[countryKey] || 0) + 1;
+        if (item.geo.success) countryNames[item.geo.country_code] = item.geo.country;
+    });
+    
+    // Peuple le filtre pays
+    populateCountryFilter(countryNames);
+    
+    // Met à jour top pays
+    updateTopCountries(countriesCount);
+    
+    // Recherche / filtres actifs : le tableau affiche les résultats serveur
+    if (hasActiveFilters()) return;
+    
+    renderIpRows(items, false);
+    setLoadMore(null);
+    
+    setTimeout(() => {
+        updateResultsCount(topIps.length, topIps.length);
+    }, 100);
+}
+
+// Lignes du tableau (items avec .geo) ; append = page suivante
+function renderIpRows(items, append) {
     const tbody = document.getElementById('ip-tbody');
-    tbody.innerHTML = '';
     
-    if (topIps.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="6" class="text-center">Aucune IP suspecte détectée</td></tr>';
-        return;
+    if (!append) {
+        tbody.innerHTML = '';
+        if (items.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="6" class="text-center">Aucune IP suspecte détectée</td></tr>';
+            return;
+        }
     }
     
-    const countriesCount = {};
-    const countriesSet = new Set();
+    const offset = tbody.querySelectorAll('tr[data-ip]').length;
     
-    for (let index = 0; index < topIps.length; index++) {
-        const item = topIps[index];
+    items.forEach((item, i) => {
+        const index = offset + i;
         const level = getAlertLevel(item.attempts);
-        const geo = await geolocateIP(item.ip);
-        
-        const countryKey = geo.country || 'Unknown';
-        countriesCount[countryKey] = (countriesCount[countryKey] || 0) + 1;
-        countriesSet.add(countryKey);
+        const geo = item.geo;
         
         const row = document.createElement('tr');
         row.className = 'fade-in';
-        row.style.animationDelay = `${index * 0.05}s`;
+        row.dataset.ip = item.ip;
+        row.style.animationDelay = `${Math.min(i, 20) * 0.05}s`;
         row.innerHTML = `
             <td>${index + 1}</td>
             <td><strong>${item.ip}</strong></td>
@@ -573,34 +695,31 @@ async function updateTableWithGeo(topIps) {
             </td>
         `;
         tbody.appendChild(row);
-    }
-    
-    // Peuple le filtre pays
-    populateCountryFilter(Array.from(countriesSet).sort());
-    
-    // Met à jour top pays
-    updateTopCountries(countriesCount);
-    
-    setTimeout(() => {
-        updateResultsCount(topIps.length, topIps.length);
-    }, 100);
+    });
 }
 
-// Peuple le dropdown pays
+// Peuple le dropdown pays ({code: nom}) en gardant la sélection courante
 function populateCountryFilter(countries) {
     const select = document.getElementById('filter-country');
     if (!select) return;
     
+    const selected = select.value;
     select.innerHTML = '<option value="all">Tous pays</option>';
     
-    countries.forEach(country => {
-        const option = document.createElement('option');
-        option.value = country.toLowerCase();
-        option.textContent = country;
-        select.appendChild(option);
-    });
+    Object.entries(countries)
+        .sort((a, b) => a[1].localeCompare(b[1]))
+        .forEach(([code, name]) => {
+            const option = document.createElement('option');
+            option.value = code;
+            option.textContent = name;
+            select.appendChild(option);
+        });
     
-    console.log('Pays ajoutés au filtre:', countries);
+    if ([...select.options].some(option => option.value === selected)) {
+        select.value = selected;
+    }
+    
+    console.log('Pays ajoutés au filtre:', Object.values(countries));
 }
 
 function updateTopCountries(countriesCount) {
@@ -636,6 +755,64 @@ function updateTopCountries(countriesCount) {
     html += '</div>';
     container.innerHTML = html;
 }
+// Serveurs surveillés (agents + local) : un clic affiche le top IPs de l'hôte
+function updateHosts(hosts) {
+    const container = document.getElementById('hosts-list');
+    document.getElementById('hosts-count').textContent = hosts.length;
+    
+    if (hosts.length === 0) {
+        container.innerHTML = '<p class="text-center text-muted">Aucune donnée disponible</p>';
+        return;
+    }
+    
+    const total = hosts.reduce((sum, host) => sum + host.attempts, 0) || 1;
+    let html = '<div class="countries-list">';
+    
+    hosts.forEach((host, index) => {
+        const percentage = Math.round((host.attempts / total) * 100);
+        const lastPush = host.last_push ? ` · push ${host.last_push}` : '';
+        
+        html += `
+            <div class="country-item" style="animation-delay: ${index * 0.1}s; cursor: pointer;" onclick="toggleHostDetails('${host.host}')">
+                <div class="country-header">
+                    <span class="country-name"><i class="fas fa-server"></i> ${host.host}</span>
+                    <span class="country-count">${host.attempts} tentative${host.attempts > 1 ? 's' : ''} · ${host.ip_count} IPs${lastPush}</span>
+                </div>
+                <div class="country-bar-wrapper">
+                    <div class="country-bar" style="width: ${percentage}%"></div>
+                </div>
+                <div class="host-details" id="host-details-${host.host}" style="display: none;"></div>
+            </div>
+        `;
+    });
+    
+    html += '</div>';
+    container.innerHTML = html;
+}
+
+async function toggleHostDetails(host) {
+    const details = document.getElementById(`host-details-${host}`);
+    if (details.style.display !== 'none') {
+        details.style.display = 'none';
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${API_BASE}/hosts/${encodeURIComponent(host)}?limit=5`);
+        const data = await response.json();
+        
+        details.innerHTML = data.top_ips.map(ip => `
+            <div class="d-flex justify-content-between small text-muted mt-1">
+                <span>${ip.geo.flag || ''} ${ip.ip} (${ip.threat_level})</span>
+                <span>${ip.attempts} ici / ${ip.fleet_attempts} flotte</span>
+            </div>
+        `).join('') || '<p class="small text-muted mt-1">Aucune IP</p>';
+        details.style.display = 'block';
+    } catch (error) {
+        console.error('Erreur chargement hôte:', error);
+    }
+}
+
 // ============================================
 // TIMELINE DES ATTAQUES
 // ============================================
@@ -725,8 +902,11 @@ function initFilters() {
     
     if (!searchInput) return;
     
+    // Recherche serveur : on attend la fin de la frappe
+    let searchTimer = null;
     searchInput.addEventListener('input', function() {
-        applyFilters();
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(applyFilters, 250);
         toggleClearButton();
     });
     
@@ -736,6 +916,11 @@ function initFilters() {
     
     resetBtn.addEventListener('click', resetFilters);
     
+    const loadMoreBtn = document.getElementById('load-more');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', () => applyFilters(true));
+    }
+    
     clearSearchBtn.addEventListener('click', function() {
         searchInput.value = '';
         applyFilters();
@@ -754,45 +939,73 @@ function toggleClearButton() {
     }
 }
 
-function applyFilters() {
-    const searchValue = document.getElementById('search-ip').value.toLowerCase();
-    const countryValue = document.getElementById('filter-country').value.toLowerCase();
+// Filtres → query string /api/attacks (vide = pas de filtre actif)
+function getFilterParams() {
+    const params = new URLSearchParams();
+    const searchValue = document.getElementById('search-ip').value.trim();
+    const countryValue = document.getElementById('filter-country').value;
     const levelValue = document.getElementById('filter-level').value;
-    const attemptsValue = parseInt(document.getElementById('filter-attempts').value);
+    const attemptsValue = document.getElementById('filter-attempts').value;
     
-    const tbody = document.getElementById('ip-tbody');
-    const rows = tbody.getElementsByTagName('tr');
+    if (searchValue) params.set('q', searchValue);
+    if (countryValue !== 'all') params.set('country', countryValue);
+    if (levelValue !== 'all') params.set('threat', levelValue);
+    if (attemptsValue !== 'all') params.set('min_attempts', attemptsValue);
     
-    let visibleCount = 0;
+    return params;
+}
+
+function hasActiveFilters() {
+    return document.getElementById('search-ip') !== null && getFilterParams().toString() !== '';
+}
+
+// Filtrage côté serveur sur toutes les IPs (pagination par curseur)
+const FILTER_PAGE_SIZE = 50;
+let attacksCursor = null;
+let filterRequestId = 0;
+let totalUniqueIps = 0;
+
+async function applyFilters(append = false) {
+    const params = getFilterParams();
+    const nextPage = append === true && attacksCursor;
+    
+    // Aucun filtre : retour au top IPs de /api/stats
+    if (params.toString() === '') {
+        attacksCursor = null;
+        filterRequestId++;
+        await updateTableWithGeo(lastTopIps);
+        return;
+    }
     
-    for (let i = 0; i < rows.length; i++) {
-        const row = rows[i];
-        const cells = row.getElementsByTagName('td');
-        
-        if (cells.length === 0) continue;
+    params.set('limit', FILTER_PAGE_SIZE);
+    if (nextPage) params.set('cursor', attacksCursor);
+    
+    const requestId = ++filterRequestId;
+    
+    try {
+        const response = await fetch(`${API_BASE}/attacks?${params}`);
+        const data = await response.json();
         
-        const ip = cells[1].textContent.toLowerCase();
-        const country = cells[2].textContent.toLowerCase();
-        const attempts = parseInt(cells[3].textContent);
-        const levelBadge = cells[4].querySelector('.badge');
-        const level = levelBadge ? levelBadge.textContent.toLowerCase() : '';
+        // Réponse obsolète (filtre modifié entre-temps)
+        if (requestId !== filterRequestId) return;
+        if (!response.ok) throw new Error(data.error || `HTTP ${response.status}`);
         
-        const matchesSearch = ip.includes(searchValue);
-        const matchesCountry = countryValue === 'all' || country.includes(countryValue);
-        const matchesLevel = levelValue === 'all' || level.includes(levelValue);
-        const matchesAttempts = attemptsValue === 'all' || isNaN(attemptsValue) || attempts >= attemptsValue;
+        renderIpRows(data.attacks, Boolean(nextPage));
+        attacksCursor = data.next_cursor;
+        setLoadMore(attacksCursor);
         
-        if (matchesSearch && matchesCountry && matchesLevel && matchesAttempts) {
-            row.classList.remove('filtered-out');
-            row.classList.add('fade-in-filter');
-            visibleCount++;
-        } else {
-            row.classList.add('filtered-out');
-            row.classList.remove('fade-in-filter');
-        }
+        const shown = document.querySelectorAll('#ip-tbody tr[data-ip]').length;
+        updateResultsCount(shown, Math.max(totalUniqueIps, shown));
+    } catch (error) {
+        console.error('Erreur filtres:', error);
+    }
+}
+
+function setLoadMore(cursor) {
+    const btn = document.getElementById('load-more');
+    if (btn) {
+        btn.style.display = cursor ? 'inline-block' : 'none';
     }
-    
-    updateResultsCount(visibleCount, rows.length);
 }
 
 function updateResultsCount(filtered, total) {
@@ -876,21 +1089,6 @@ function updateChartTheme() {
 // ============================================
 // EXPORTS JSON/CSV
 // ============================================
-function downloadFile(blob, filename) {
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = filename;
-    a.style.display = 'none';
-    document.body.appendChild(a);
-    a.click();
-    
-    setTimeout(() => {
-        document.body.removeChild(a);
-        window.URL.revokeObjectURL(url);
-    }, 100);
-}
-
 function getTimestamp() {
     const now = new Date();
     const year = now.getFullYear();
@@ -901,71 +1099,35 @@ function getTimestamp() {
     return `${year}${month}${day}_${hours}${minutes}`;
 }
 
-async function exportJSON() {
-    try {
-        const response = await fetch(`${API_BASE}/stats`);
-        const data = await response.json();
-        
-        const finalData = (data.total_attempts === 0) ? MOCK_DATA : data;
-        
-        const exportData = {
-            timestamp: new Date().toISOString(),
-            server_ip: window.location.hostname,
-            total_attempts: finalData.total_attempts,
-            unique_ips: finalData.unique_ips,
-            top_ips: finalData.top_ips
-        };
-        
-        const dataStr = JSON.stringify(exportData, null, 2);
-        const blob = new Blob([dataStr], { type: 'application/json' });
-        
-        const timestamp = getTimestamp();
-        const hostname = window.location.hostname.replace('localhost', 'local');
-        const filename = `ssh-attacks_${timestamp}_${hostname}.json`;
-        
-        downloadFile(blob, filename);
-        console.log('Export JSON réussi:', filename);
-    } catch (error) {
-        console.error('Erreur export JSON:', error);
-        alert('Erreur lors de l\'export JSON: ' + error.message);
-    }
+// Export complet côté serveur (/api/export, généré en flux) : toutes les
+// IPs correspondant aux filtres actifs, pas seulement le top 10
+function exportDataset(format) {
+    const params = hasActiveFilters() ? getFilterParams() : new URLSearchParams();
+    params.set('format', format);
+    params.set('gzip', '1');
+    
+    const timestamp = getTimestamp();
+    const hostname = window.location.hostname.replace('localhost', 'local');
+    const filename = `ssh-attacks_${timestamp}_${hostname}.${format}`;
+    
+    // Lien direct : le navigateur écrit le flux sur disque sans le garder en mémoire
+    const a = document.createElement('a');
+    a.href = `${API_BASE}/export?${params.toString()}`;
+    a.download = filename;
+    a.style.display = 'none';
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    
+    console.log(`Export ${format.toUpperCase()} lancé:`, filename);
 }
 
-async function exportCSV() {
-    try {
-        const response = await fetch(`${API_BASE}/stats`);
-        const data = await response.json();
-        
-        const finalData = (data.total_attempts === 0) ? MOCK_DATA : data;
-        
-        const BOM = '\uFEFF';
-        let csv = BOM + 'Adresse IP,Tentatives,Niveau\n';
-        
-        if (finalData.top_ips && Array.isArray(finalData.top_ips)) {
-            finalData.top_ips.forEach(item => {
-                const level = getAlertLevel(item.attempts).text;
-                csv += `${item.ip},${item.attempts},${level}\n`;
-            });
-        }
-        
-        csv += `\n`;
-        csv += `Date export,${new Date().toLocaleString('fr-FR')}\n`;
-        csv += `Serveur,${window.location.hostname}\n`;
-        csv += `Total tentatives,${finalData.total_attempts}\n`;
-        csv += `IPs uniques,${finalData.unique_ips}\n`;
-        
-        const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-        
-        const timestamp = getTimestamp();
-        const hostname = window.location.hostname.replace('localhost', 'local');
-        const filename = `ssh-attacks_${timestamp}_${hostname}.csv`;
-        
-        downloadFile(blob, filename);
-        console.log('Export CSV réussi:', filename);
-    } catch (error) {
-        console.error('Erreur export CSV:', error);
-        alert('Erreur lors de l\'export CSV: ' + error.message);
-    }
+function exportJSON() {
+    exportDataset('json');
+}
+
+function exportCSV() {
+    exportDataset('csv');
 }
 
 // ============================================
@@ -1034,6 +1196,29 @@ function checkForNewThreats(topIps) {
     localStorage.setItem('known_ips', JSON.stringify([...lastKnownIPs]));
 }
 
+// Alerte poussée par /api/stream (nouvelle IP ou escalade de niveau)
+function handleThreatEvent(event) {
+    // Déjà signalée par checkForNewThreats (polling)
+    if (event.type === 'new_ip' && lastKnownIPs.has(event.ip)) return;
+    
+    const critical = event.threat_level === 'Critique';
+    const type = critical ? 'danger' : 'warning';
+    const title = event.type === 'escalation'
+        ? `IP passée ${event.threat_level}`
+        : (critical ? 'IP Critique Détectée' : 'IP Élevée Détectée');
+    const message = `${event.ip} - ${event.total_attempts} tentatives`;
+    
+    showToast(type, title, message);
+    addToHistory(type, title, message);
+    
+    if (soundEnabled && critical) {
+        playNotificationSound();
+    }
+    
+    lastKnownIPs.add(event.ip);
+    localStorage.setItem('known_ips', JSON.stringify([...lastKnownIPs]));
+}
+
 // Affiche un toast (notification temporaire)
 function showToast(type, title, message) {
     let container = document.getElementById('toast-container');
@@ -1269,8 +1454,12 @@ function clearAllNotifications() {
 const originalLoadData = loadData;
 loadData = async function() {
     try {
-        const response = await fetch(`${API_BASE}/stats`);
-        const data = await response.json();
+        // 304 : rien de neuf depuis le dernier refresh, pas de re-rendu
+        const data = await fetchStats();
+        if (!data) {
+            updateLastUpdate();
+            return;
+        }
         
         const finalData = (data.total_attempts === 0) ? MOCK_DATA : data;
         
@@ -1278,6 +1467,7 @@ loadData = async function() {
         checkForNewThreats(finalData.top_ips);
         
         updateStats(finalData);
+        updateHosts(finalData.hosts || []);
         updateChart(finalData.top_ips);
         await updateTableWithGeo(finalData.top_ips);
         updateTimeline(finalData.top_ips);
@@ -1590,6 +1780,28 @@ async function openBanModal() {
 
 // Télécharge le script bash
 function downloadBanScript() {
+    const formatSelect = document.getElementById('ban-script-format');
+    const format = formatSelect ? formatSelect.value : 'iptables';
+    
+    // ipset / nftables : script généré en flux par le serveur, téléchargé tel quel
+    if (format !== 'iptables') {
+        const a = document.createElement('a');
+        a.href = `${API_BASE}/generate-ban-script?format=${encodeURIComponent(format)}`;
+        a.download = `ban-ips-${new Date().toISOString().split('T')[0]}-${format}.sh`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        showToast('success', 'Script téléchargé', `Fichier : ${a.download}`);
+        
+        const modal = bootstrap.Modal.getInstance(document.getElementById('banModal'));
+        if (modal) modal.hide();
+        
+        const runner = format === 'nftables' ? 'sudo nft -f ' : 'sudo bash ';
+        showToast('info', 'Prochaine étape', 'Exécutez le script sur votre serveur avec : ' + runner + a.download);
+        return;
+    }
+    
     if (!banScriptData || !banScriptData.script) {
         showToast('danger', 'Erreur', 'Aucun script disponible');
         return;
@@ -1635,7 +1847,8 @@ document.addEventListener('DOMContentLoaded', function() {
 function updateBanCount(data) {
     if (!data || !data.top_ips) return;
     
-    const criticalCount = data.top_ips.filter(item => item.attempts >= 50).length;
+    // Candidats serveur (Critique + rafales récentes), sinon estimation sur le top 10
+    const criticalCount = data.ban_candidates ?? data.top_ips.filter(item => item.attempts >= 50).length;
     const badgeElement = document.getElementById('ban-count');
     
     if (badgeElement) {
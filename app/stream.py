@@ -0,0 +1,240 @@
+"""
+SSH Attack Dashboard - Live Stream (SSE)
+Pousse les alertes et compteurs aux clients /api/stream dès qu'une
+ingestion est commitée, au lieu du polling 10s du frontend
+"""
+
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from .metrics import STREAM_CLIENTS
+from .storage import storage
+
+# Détection des commits : une lecture O(1) de la génération par process
+POLL_INTERVAL = 0.5
+
+# Commentaire SSE envoyé sans activité (proxies / timeouts navigateur)
+HEARTBEAT_INTERVAL = 15.0
+
+# Alertes récentes gardées en mémoire pour les clients connectés
+BUFFER_SIZE = 1000
+
+# Clé environ WSGI : générateur du corps /api/stream fourni par le serveur
+# (app/asgi.py le remplace par un flux asyncio), stream_events sinon
+STREAM_FACTORY_ENVIRON = 'ssh_dashboard.stream_events'
+
+# ============================================
+# HUB (UN PAR PROCESS)
+# ============================================
+
+class StreamHub:
+    """
+    Un seul thread par process surveille la BDD, quel que soit le nombre
+    de clients : à chaque nouvelle génération de données, il lit les
+    nouvelles alertes (stream_events) et les compteurs, puis réveille
+    les clients SSE en attente sur la Condition.
+
+    Les clients asyncio (mode ASGI) attendent un Future partagé par boucle
+    d'événements : un seul réveil inter-thread par boucle et par commit,
+    quel que soit le nombre de connexions.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.counters: Dict = {}
+        self.last_event_id = 0
+        self._events: deque = deque(maxlen=BUFFER_SIZE)
+        self._generation: Optional[int] = None
+        self.clients = 0
+        self._condition = threading.Condition()
+        self._async_wakeups: Dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self):
+        """Démarre le thread de surveillance (paresseux, idempotent, fork-safe)."""
+        with self._condition:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self.last_event_id = storage.get_last_stream_event_id()
+            self._refresh()
+            self._thread = threading.Thread(target=self._run, name='ssh-stream', daemon=True)
+            self._thread.start()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Attend une version > `version` (ou le timeout). Returns: version courante."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    async def wait_async(self, version: int, timeout: float) -> int:
+        """Comme wait() depuis une coroutine : suspend le client sans bloquer la boucle."""
+        loop = asyncio.get_running_loop()
+
+        with self._condition:
+            if self.version > version:
+                return self.version
+            wakeup = self._async_wakeups.get(loop)
+            if wakeup is None:
+                wakeup = self._async_wakeups[loop] = loop.create_future()
+
+        try:
+            # shield : le timeout d'un client n'annule pas le réveil des autres
+            await asyncio.wait_for(asyncio.shield(wakeup), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.version
+
+    def add_client(self, delta: int):
+        """Clients SSE connectés au process (jauge ssh_dashboard_stream_clients)."""
+        with self._condition:
+            self.clients += delta
+
+    def events_after(self, event_id: int) -> Optional[List[Dict]]:
+        """
+        Alertes d'id > event_id depuis le buffer mémoire.
+        None si le buffer ne remonte pas assez loin (relire la BDD).
+        """
+        with self._condition:
+            if event_id < self.last_event_id and (not self._events or self._events[0]['id'] > event_id + 1):
+                return None
+            return [event for event in self._events if event['id'] > event_id]
+
+    def _run(self):
+        while True:
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"❌ Stream refresh failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def _refresh(self):
+        generation = storage.get_data_generation()
+        if generation == self._generation:
+            return
+
+        events = storage.get_stream_events(after_id=self.last_event_id)
+        counters = storage.get_dashboard_stats()
+
+        with self._condition:
+            self._generation = generation
+            self._events.extend(events)
+            if events:
+                self.last_event_id = events[-1]['id']
+            self.counters = counters
+            self.version += 1
+            self._condition.notify_all()
+            wakeups, self._async_wakeups = self._async_wakeups, {}
+
+        for loop, wakeup in wakeups.items():
+            try:
+                loop.call_soon_threadsafe(_wake, wakeup)
+            except RuntimeError:
+                pass  # boucle fermée (arrêt du serveur ASGI)
+
+def _wake(wakeup: asyncio.Future):
+    if not wakeup.done():
+        wakeup.set_result(None)
+
+hub = StreamHub()
+
+STREAM_CLIENTS.set_function(lambda: hub.clients)
+
+# ============================================
+# FORMAT SSE
+# ============================================
+
+def stream_events(last_event_id: Optional[int] = None) -> Iterator[str]:
+    """
+    Générateur SSE pour un client.
+
+    Args:
+        last_event_id: en-tête Last-Event-ID (reconnexion) : les alertes
+            manquées sont rejouées. None = nouveau client, pas de rejeu.
+
+    Événements :
+        threat   (avec id) : {type: new_ip|escalation, ip, threat_level, total_attempts}
+        counters (sans id) : totaux du dashboard, à chaque commit
+    """
+    hub.start()
+
+    cursor = hub.last_event_id if last_event_id is None else last_event_id
+    version = hub.version
+
+    hub.add_client(1)
+    try:
+        yield 'retry: 3000\n\n'
+
+        while True:
+            # Nouvelles alertes (ou rejeu après reconnexion), buffer sinon BDD
+            missed = hub.events_after(cursor)
+            if missed is None:
+                missed = storage.get_stream_events(after_id=cursor, limit=BUFFER_SIZE)
+            for event in missed:
+                yield _format_event('threat', event, event['id'])
+                cursor = event['id']
+
+            yield _format_event('counters', hub.counters)
+
+            while True:
+                new_version = hub.wait(version, HEARTBEAT_INTERVAL)
+                if new_version != version:
+                    version = new_version
+                    break
+                yield ': heartbeat\n\n'
+    finally:
+        hub.add_client(-1)
+
+async def stream_events_async(last_event_id: Optional[int] = None, executor=None) -> AsyncIterator[str]:
+    """
+    Comme stream_events pour le mode ASGI (app/asgi.py) : un client en
+    attente n'est qu'une coroutine suspendue, pas un thread. Les lectures
+    BDD (démarrage du hub, rejeu hors buffer) passent par le pool de
+    threads `executor`.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, hub.start)
+
+    cursor = hub.last_event_id if last_event_id is None else last_event_id
+    version = hub.version
+
+    hub.add_client(1)
+    try:
+        yield 'retry: 3000\n\n'
+
+        while True:
+            missed = hub.events_after(cursor)
+            if missed is None:
+                missed = await loop.run_in_executor(
+                    executor, functools.partial(storage.get_stream_events, after_id=cursor, limit=BUFFER_SIZE)
+                )
+            for event in missed:
+                yield _format_event('threat', event, event['id'])
+                cursor = event['id']
+
+            yield _format_event('counters', hub.counters)
+
+            while True:
+                new_version = await hub.wait_async(version, HEARTBEAT_INTERVAL)
+                if new_version != version:
+                    version = new_version
+                    break
+                yield ': heartbeat\n\n'
+    finally:
+        hub.add_client(-1)
+
+def _format_event(event_type: str, data: Dict, event_id: Optional[int] = None) -> str:
+    lines = [f'event: {event_type}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
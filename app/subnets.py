@@ -0,0 +1,81 @@
+"""
+SSH Attack Dashboard - Subnet Aggregation
+Regroupe les IPs à bannir en blocs CIDR : /24 saturés, /16 quand
+plusieurs /24 du même réseau attaquent, puis couverture minimale
+"""
+
+import ipaddress
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from .database import THREAT_CRITICAL_THRESHOLD
+from .storage import storage
+
+# Un /24 est banni en bloc à partir de N IPs attaquantes...
+BAN_MIN_IPS_PER_24 = 3
+
+# ... et un /16 quand N de ses /24 sont bannis en bloc
+BAN_MIN_NETS_PER_16 = 8
+
+# ============================================
+# COUVERTURE CIDR
+# ============================================
+
+def minimal_cidr_cover(networks: Iterable[str]) -> List[str]:
+    """
+    Plus petit ensemble de blocs CIDR couvrant exactement les réseaux /
+    IPs donnés : doublons et blocs inclus supprimés, blocs adjacents
+    fusionnés (2 x /25 → /24). IPv4 et IPv6 traités séparément.
+    """
+    by_version: Dict[int, list] = defaultdict(list)
+
+    for network in networks:
+        try:
+            parsed = ipaddress.ip_network(network, strict=False)
+        except ValueError:
+            continue
+        by_version[parsed.version].append(parsed)
+
+    return [
+        str(network)
+        for version in sorted(by_version)
+        for network in ipaddress.collapse_addresses(by_version[version])
+    ]
+
+def build_ban_cidrs(
+    ips: Iterable[str],
+    min_ips_per_24: int = BAN_MIN_IPS_PER_24,
+    min_nets_per_16: int = BAN_MIN_NETS_PER_16
+) -> List[str]:
+    """
+    Blocs CIDR à bannir : IPs critiques + /24 où l'attaque est distribuée.
+
+    Un /24 est retenu s'il compte au moins `min_ips_per_24` IPs attaquantes
+    et un total de tentatives au seuil Critique (clusters tenus par
+    triggers, aucun scan de attacks). Un /16 remplace ses /24 dès que
+    `min_nets_per_16` d'entre eux sont retenus. Le tout est réduit à la
+    couverture minimale.
+
+    Args:
+        ips: IPs bannies individuellement (/32 ou /128)
+    """
+    subnets = [
+        subnet['cluster']
+        for subnet in storage.get_hot_subnets(
+            min_ips=min_ips_per_24,
+            min_attempts=THREAT_CRITICAL_THRESHOLD
+        )
+    ]
+
+    nets_per_16: Dict[str, int] = defaultdict(int)
+    for subnet in subnets:
+        nets_per_16[_parent_16(subnet)] += 1
+
+    wide = [net16 for net16, count in nets_per_16.items() if count >= min_nets_per_16]
+
+    return minimal_cidr_cover([*ips, *subnets, *wide])
+
+def _parent_16(net24: str) -> str:
+    """'185.220.101.0/24' → '185.220.0.0/16'."""
+    first, second = net24.split('.')[:2]
+    return f'{first}.{second}.0.0/16'
@@ -0,0 +1,11 @@
+"""
+SSH Attack Dashboard - Benchmarks
+Générateur de logs sshd synthétiques (benchmarks/loggen.py) et mesures
+des chemins critiques (benchmarks/harness.py), résultats en JSON
+comparables d'un commit à l'autre ; parité des backends SQLite et
+PostgreSQL (benchmarks/parity.py)
+
+    python -m benchmarks --lines 1000000 -o avant.json
+    python -m benchmarks --compare avant.json apres.json
+    python -m benchmarks.parity
+"""
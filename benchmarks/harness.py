@@ -0,0 +1,444 @@
+"""
+SSH Attack Dashboard - Benchmark Harness
+Mesure les chemins critiques sur un journal synthétique reproductible :
+- parse  : _parse_journalctl (sortie journalctl simulée), lignes/s
+- upsert : bulk_upsert_attacks par batchs d'ingestion, lignes IP/s
+- stats  : latence p50/p99 de /api/stats sous N pollers concurrents
+  (client de test Flask), avec une ingestion qui invalide le cache
+
+Résultats en JSON (commit, versions, paramètres) : deux fichiers de
+commits différents se comparent avec --compare. --database-url mesure le
+backend PostgreSQL (base dédiée : vidée au démarrage) au lieu d'un
+fichier SQLite temporaire.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from app import database
+from app import ssh_parser
+from app.storage import configure_storage, get_storage, storage
+from app.ssh_parser import SSHEventParser, JOURNAL_CURSOR_KEY, _aggregate_events, _parse_journalctl
+
+from .loggen import (
+    SSHLogGenerator, LINE_INTERVAL,
+    DEFAULT_IPS, DEFAULT_ZIPF, DEFAULT_IPV6_SHARE, DEFAULT_NOISE, DEFAULT_SEED
+)
+
+BENCHMARKS = ('parse', 'upsert', 'stats')
+
+# Lignes par appel journalctl simulé (sortie d'un cycle de polling chargé)
+DEFAULT_CHUNK_LINES = 100000
+
+# Events par appel à bulk_upsert_attacks
+DEFAULT_BATCH_EVENTS = 5000
+
+DEFAULT_POLLERS = 8
+DEFAULT_STATS_SECONDS = 10.0
+
+# Ingestion concurrente pendant le bench stats (0 = cache jamais invalidé)
+DEFAULT_WRITER_INTERVAL = 1.0
+WRITER_BATCH_LINES = 500
+
+# Écart toléré par --compare avant de signaler une régression
+DEFAULT_TOLERANCE = 0.10
+
+# ============================================
+# BENCHMARKS
+# ============================================
+
+def run_benchmarks(
+    lines: int,
+    selected: List[str],
+    generator_options: Dict,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+    batch_events: int = DEFAULT_BATCH_EVENTS,
+    pollers: int = DEFAULT_POLLERS,
+    stats_seconds: float = DEFAULT_STATS_SECONDS,
+    writer_interval: float = DEFAULT_WRITER_INTERVAL,
+    database_url: Optional[str] = None
+) -> Dict:
+    """
+    Exécute les benchmarks demandés dans une base temporaire.
+
+    Le journal synthétique se termine maintenant (fenêtres 24h de
+    /api/stats remplies), parse et upsert consomment le même flux par
+    morceaux : mémoire bornée jusqu'à 50M lignes.
+
+    Args:
+        database_url: Base PostgreSQL dédiée au bench (vidée), SQLite temporaire sinon
+
+    Returns:
+        {parse: {...}, upsert: {...}, stats: {...}} (benchmarks demandés)
+    """
+    workdir = tempfile.mkdtemp(prefix='ssh-bench-')
+    database.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    results = {}
+
+    if database_url:
+        # create_app (bench stats) reconfigure le stockage depuis l'environnement
+        os.environ['SSH_DASHBOARD_DATABASE_URL'] = database_url
+    configure_storage(database_url)
+
+    try:
+        storage.init_db(force_reset=bool(database_url))
+        start = datetime.now(timezone.utc) - timedelta(seconds=lines * LINE_INTERVAL)
+        generator = SSHLogGenerator(start=start, **generator_options)
+
+        # La base n'est remplie que si upsert ou stats en a besoin
+        store = 'upsert' in selected or 'stats' in selected
+        if 'parse' in selected or store:
+            parse, upsert = _bench_ingestion(generator, lines, chunk_lines, batch_events, store)
+            if 'parse' in selected:
+                results['parse'] = parse
+            if 'upsert' in selected:
+                results['upsert'] = upsert
+
+        if 'stats' in selected:
+            writer = SSHLogGenerator(start=datetime.now(timezone.utc), **dict(
+                generator_options, seed=generator_options.get('seed', DEFAULT_SEED) + 1
+            ))
+            results['stats'] = _bench_stats(writer, pollers, stats_seconds, writer_interval)
+    finally:
+        get_storage().close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+def _bench_ingestion(
+    generator: SSHLogGenerator,
+    lines: int,
+    chunk_lines: int,
+    batch_events: int,
+    store: bool
+) -> tuple:
+    """
+    Parse (et stocke si `store`) le journal morceau par morceau. Seuls
+    _parse_journalctl et bulk_upsert_attacks sont chronométrés, pas la
+    génération des lignes.
+    """
+    parser = SSHEventParser()
+    parse_seconds = upsert_seconds = 0.0
+    parsed_lines = event_count = row_count = batch_count = 0
+    cursor = None
+
+    for index, chunk in enumerate(generator.chunks(lines, chunk_lines)):
+        new_cursor = f's=bench;i={index}'
+        output = f'{chunk}-- cursor: {new_cursor}\n'
+
+        with _fake_journalctl(output):
+            started = time.perf_counter()
+            events, new_cursor = _parse_journalctl(cursor, parser)
+            parse_seconds += time.perf_counter() - started
+
+        parsed_lines += chunk.count('\n')
+        event_count += len(events)
+
+        if store:
+            for offset in range(0, len(events), batch_events):
+                batch = events[offset:offset + batch_events]
+                attacks = _aggregate_events(batch)
+                last = offset + batch_events >= len(events)
+
+                # Même appel que l'ingestion : curseur en compare-and-set au dernier batch
+                started = time.perf_counter()
+                storage.bulk_upsert_attacks(
+                    attacks,
+                    events=batch,
+                    state={JOURNAL_CURSOR_KEY: new_cursor} if last else None,
+                    expected_state={JOURNAL_CURSOR_KEY: cursor}
+                )
+                upsert_seconds += time.perf_counter() - started
+
+                row_count += len(attacks)
+                batch_count += 1
+
+        cursor = new_cursor
+        _progress(f"{parsed_lines}/{lines} lignes")
+
+    parse = {
+        'lines': parsed_lines,
+        'events': event_count,
+        'seconds': round(parse_seconds, 3),
+        'lines_per_sec': _rate(parsed_lines, parse_seconds),
+        'events_per_sec': _rate(event_count, parse_seconds)
+    }
+    upsert = {
+        'batches': batch_count,
+        'events': event_count,
+        'rows': row_count,
+        'seconds': round(upsert_seconds, 3),
+        'rows_per_sec': _rate(row_count, upsert_seconds),
+        'events_per_sec': _rate(event_count, upsert_seconds),
+        'db_bytes': _db_size()
+    }
+    return parse, upsert
+
+def _bench_stats(
+    writer: SSHLogGenerator,
+    pollers: int,
+    duration: float,
+    writer_interval: float
+) -> Dict:
+    """
+    N threads interrogent /api/stats en boucle pendant `duration` s
+    (If-None-Match comme le navigateur) pendant qu'un thread d'ingestion écrit un petit batch
+    toutes les `writer_interval` s (cache invalidé → recalcul).
+    """
+    from app import create_app
+    app = create_app(start_ingest=False)
+
+    latencies: List[List[float]] = [[] for _ in range(pollers)]
+    not_modified = [0] * pollers
+    errors = [0] * pollers
+    done = threading.Event()
+    barrier = threading.Barrier(pollers + 1)
+
+    def poll(slot: int):
+        client = app.test_client()
+        etag = None
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+
+        while time.perf_counter() < deadline:
+            headers = {'If-None-Match': etag} if etag else {}
+            started = time.perf_counter()
+            response = client.get('/api/stats', headers=headers)
+            latencies[slot].append(time.perf_counter() - started)
+
+            if response.status_code == 304:
+                not_modified[slot] += 1
+            elif response.status_code == 200:
+                etag = response.headers.get('ETag')
+            else:
+                errors[slot] += 1
+
+    def write():
+        parser = SSHEventParser()
+        lines = writer.lines(sys.maxsize)
+        while not done.wait(writer_interval):
+            text = '\n'.join(next(lines) for _ in range(WRITER_BATCH_LINES))
+            events = parser.parse_text(text)
+            storage.bulk_upsert_attacks(_aggregate_events(events), events=events)
+
+    # Premier calcul (cache froid) mesuré à part
+    client = app.test_client()
+    started = time.perf_counter()
+    client.get('/api/stats')
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    threads = [threading.Thread(target=poll, args=(slot,)) for slot in range(pollers)]
+    writer_thread = threading.Thread(target=write, daemon=True) if writer_interval > 0 else None
+
+    for thread in threads:
+        thread.start()
+    if writer_thread:
+        writer_thread.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    done.set()
+    if writer_thread:
+        writer_thread.join()
+
+    samples = sorted(latency for poller in latencies for latency in poller)
+    return {
+        'pollers': pollers,
+        'requests': len(samples),
+        'errors': sum(errors),
+        'not_modified_ratio': round(sum(not_modified) / len(samples), 3) if samples else 0,
+        'writer_interval': writer_interval,
+        'seconds': round(seconds, 3),
+        'requests_per_sec': _rate(len(samples), seconds),
+        'cold_ms': round(cold_ms, 2),
+        'p50_ms': _percentile_ms(samples, 50),
+        'p90_ms': _percentile_ms(samples, 90),
+        'p99_ms': _percentile_ms(samples, 99),
+        'max_ms': round(samples[-1] * 1000, 2) if samples else 0
+    }
+
+# ============================================
+# COMPARAISON ENTRE COMMITS
+# ============================================
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[Dict]:
+    """
+    Compare deux fichiers de résultats métrique par métrique :
+    *_per_sec (plus haut = mieux) et *_ms (plus bas = mieux).
+
+    Returns:
+        [{metric, baseline, current, change, regression}]
+    """
+    rows = []
+
+    for bench, metrics in baseline.get('results', {}).items():
+        other = current.get('results', {}).get(bench, {})
+        for name, before in metrics.items():
+            after = other.get(name)
+            higher_is_better = name.endswith('_per_sec')
+            if after is None or not (higher_is_better or name.endswith('_ms')) or not before:
+                continue
+
+            change = (after - before) / before
+            regression = -change > tolerance if higher_is_better else change > tolerance
+            rows.append({
+                'metric': f'{bench}.{name}',
+                'baseline': before,
+                'current': after,
+                'change': round(change, 4),
+                'regression': regression
+            })
+
+    return rows
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+@contextlib.contextmanager
+def _fake_journalctl(output: str):
+    """journalctl remplacé par une sortie fixe (le parsing seul est mesuré)."""
+    def run(command, **kwargs):
+        return subprocess.CompletedProcess(command, 0, stdout=output, stderr='')
+
+    original = ssh_parser.subprocess.run
+    ssh_parser.subprocess.run = run
+    try:
+        yield
+    finally:
+        ssh_parser.subprocess.run = original
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds else 0.0
+
+def _percentile_ms(samples: List[float], percentile: int) -> float:
+    """Percentile (rang le plus proche) d'échantillons triés, en ms."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, -(-len(samples) * percentile // 100) - 1))
+    return round(samples[index] * 1000, 2)
+
+def _db_size() -> Optional[int]:
+    if get_storage().name != 'sqlite':
+        return None
+    return sum(
+        os.path.getsize(database.DATABASE_PATH + suffix)
+        for suffix in ('', '-wal')
+        if os.path.exists(database.DATABASE_PATH + suffix)
+    )
+
+def _metadata() -> Dict:
+    """Contexte de la mesure : commit, versions, machine."""
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ['git', *args], capture_output=True, text=True, timeout=10,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'storage': get_storage().name,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def _progress(message: str):
+    print(f"\r🔧 {message}", end='', file=sys.stderr, flush=True)
+
+def _print_comparison(rows: List[Dict]):
+    for row in rows:
+        flag = '❌' if row['regression'] else '✅'
+        print(f"{flag} {row['metric']:<28} {row['baseline']:>12} → {row['current']:<12} ({row['change']:+.1%})")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=100000, help='lignes de journal synthétique (1k à 50M)')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help='benchmarks à lancer : parse,upsert,stats')
+    parser.add_argument('--ips', type=int, default=DEFAULT_IPS)
+    parser.add_argument('--zipf', type=float, default=DEFAULT_ZIPF)
+    parser.add_argument('--ipv6', type=float, default=DEFAULT_IPV6_SHARE)
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--chunk-lines', type=int, default=DEFAULT_CHUNK_LINES)
+    parser.add_argument('--batch-events', type=int, default=DEFAULT_BATCH_EVENTS)
+    parser.add_argument('--pollers', type=int, default=DEFAULT_POLLERS)
+    parser.add_argument('--stats-seconds', type=float, default=DEFAULT_STATS_SECONDS, help='durée du bench stats')
+    parser.add_argument('--writer-interval', type=float, default=DEFAULT_WRITER_INTERVAL)
+    parser.add_argument('--database-url', help='postgresql://... : base dédiée, VIDÉE au démarrage')
+    parser.add_argument('-o', '--output', help='fichier JSON (stdout sinon)')
+    parser.add_argument('--compare', nargs=2, metavar=('AVANT', 'APRES'), help='compare deux fichiers de résultats')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+
+        rows = compare_results(baseline, current, args.tolerance)
+        _print_comparison(rows)
+        sys.exit(1 if any(row['regression'] for row in rows) else 0)
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"benchmarks inconnus : {', '.join(sorted(unknown))}")
+
+    generator_options = {
+        'ips': args.ips, 'zipf': args.zipf, 'ipv6_share': args.ipv6,
+        'noise': args.noise, 'seed': args.seed
+    }
+
+    # Les prints de l'application (un par batch) ne polluent pas le JSON
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = run_benchmarks(
+            args.lines, selected, generator_options,
+            chunk_lines=args.chunk_lines,
+            batch_events=args.batch_events,
+            pollers=args.pollers,
+            stats_seconds=args.stats_seconds,
+            writer_interval=args.writer_interval,
+            database_url=args.database_url
+        )
+    print(file=sys.stderr)
+
+    report = {
+        'meta': _metadata(),
+        'params': dict(vars(args), only=selected),
+        'results': results
+    }
+    report['params'].pop('compare')
+    report['params'].pop('output')
+    report['params'].pop('database_url')  # mot de passe
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"✅ Résultats écrits dans {args.output}", file=sys.stderr)
+    else:
+        print(text)
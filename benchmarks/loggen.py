@@ -0,0 +1,193 @@
+"""
+SSH Attack Dashboard - Synthetic sshd Log Generator
+Journal sshd reproductible (graine fixe) : N IPs attaquantes aux
+tentatives distribuées selon une loi de Zipf, part d'IPv6 et lignes
+de bruit réglables, de 1k à 50M lignes en flux (mémoire constante)
+
+    python -m benchmarks.loggen --lines 1000000 --ips 50000 -o auth.log
+    python -m benchmarks.loggen --lines 10000000 --format bsd -o auth.log.2.gz
+"""
+
+import argparse
+import gzip
+import random
+import sys
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Iterator, List, Optional
+
+DEFAULT_LINES = 100000
+DEFAULT_IPS = 10000
+DEFAULT_ZIPF = 1.1
+DEFAULT_IPV6_SHARE = 0.05
+DEFAULT_NOISE = 0.3
+DEFAULT_SEED = 42
+
+# Début du journal synthétique, une ligne toutes les N secondes
+LOG_START = datetime(2025, 10, 1, tzinfo=timezone.utc)
+LINE_INTERVAL = 0.05
+
+USERNAMES = ('root', 'admin', 'ubuntu', 'test', 'oracle', 'postgres', 'git', 'user', 'pi', 'deploy')
+
+# Lignes sshd comptées comme tentatives (poids relatifs)
+ATTACK_TEMPLATES = (
+    (50, 'Failed password for {user} from {ip} port {port} ssh2'),
+    (15, 'Failed password for invalid user {user} from {ip} port {port} ssh2'),
+    (10, 'Invalid user {user} from {ip} port {port}'),
+    (10, 'Connection closed by authenticating user {user} {ip} port {port} [preauth]'),
+    (5, 'Failed publickey for {user} from {ip} port {port} ssh2: RSA SHA256:abc'),
+    (5, 'Disconnected from authenticating user {user} {ip} port {port} [preauth]'),
+    (5, 'error: maximum authentication attempts exceeded for {user} from {ip} port {port} ssh2 [preauth]')
+)
+
+# Bruit : lignes sshd ignorées par le parser et autres programmes (auth.log)
+NOISE_TEMPLATES = (
+    'sshd[{pid}]: Accepted publickey for deploy from 10.0.0.5 port {port} ssh2: ED25519 SHA256:xyz',
+    'sshd[{pid}]: pam_unix(sshd:session): session opened for user deploy(uid=1000) by (uid=0)',
+    'sshd[{pid}]: Received disconnect from {ip} port {port}:11: Bye Bye [preauth]',
+    'sshd[{pid}]: Connection reset by {ip} port {port}',
+    'CRON[{pid}]: pam_unix(cron:session): session closed for user root',
+    'sudo[{pid}]: pam_unix(sudo:session): session opened for user root(uid=0) by admin(uid=1000)',
+    'systemd-logind[{pid}]: New session 42 of user deploy.'
+)
+
+# ============================================
+# GÉNÉRATEUR
+# ============================================
+
+class SSHLogGenerator:
+    """
+    Lignes syslog sshd déterministes pour une graine donnée.
+
+    L'IP de chaque tentative est tirée selon Zipf(s) sur `ips` IPs :
+    quelques IPs concentrent l'essentiel des tentatives, longue traîne
+    d'IPs à 1-2 tentatives (profil d'un vrai serveur exposé).
+    """
+
+    def __init__(
+        self,
+        ips: int = DEFAULT_IPS,
+        zipf: float = DEFAULT_ZIPF,
+        ipv6_share: float = DEFAULT_IPV6_SHARE,
+        noise: float = DEFAULT_NOISE,
+        seed: int = DEFAULT_SEED,
+        log_format: str = 'iso',
+        hostname: str = 'bench',
+        start: Optional[datetime] = None
+    ):
+        self.noise = noise
+        self.log_format = log_format
+        self.hostname = hostname
+        self.start = start or LOG_START
+        self.random = random.Random(seed)
+
+        self.ip_pool = _ip_pool(ips, ipv6_share, self.random)
+        self.ip_weights = list(accumulate(1 / rank ** zipf for rank in range(1, ips + 1)))
+        self.attack_weights = list(accumulate(weight for weight, _ in ATTACK_TEMPLATES))
+
+    def lines(self, count: int) -> Iterator[str]:
+        """`count` lignes (sans '\\n'), horodatées en ordre croissant."""
+        rand = self.random.random
+        ip_pool, ip_weights = self.ip_pool, self.ip_weights
+        ip_total = ip_weights[-1]
+        attack_weights = self.attack_weights
+        attack_total = attack_weights[-1]
+        timestamps = _timestamps(self.log_format, self.hostname, self.start)
+
+        for i in range(count):
+            prefix = next(timestamps)
+            port = 1024 + i % 64000
+            ip = ip_pool[bisect(ip_weights, rand() * ip_total)]
+
+            if rand() < self.noise:
+                template = NOISE_TEMPLATES[int(rand() * len(NOISE_TEMPLATES))]
+                yield prefix + template.format(pid=1000 + i % 30000, ip=ip, port=port)
+                continue
+
+            template = ATTACK_TEMPLATES[bisect(attack_weights, rand() * attack_total)][1]
+            user = USERNAMES[int(rand() * len(USERNAMES))]
+            yield f'{prefix}sshd[{1000 + i % 30000}]: ' + template.format(user=user, ip=ip, port=port)
+
+    def chunks(self, count: int, chunk_lines: int) -> Iterator[str]:
+        """Les mêmes lignes par blocs de texte de `chunk_lines` lignes."""
+        lines = self.lines(count)
+        for start in range(0, count, chunk_lines):
+            size = min(chunk_lines, count - start)
+            yield '\n'.join(next(lines) for _ in range(size)) + '\n'
+
+# ============================================
+# UTILS INTERNES
+# ============================================
+
+def _ip_pool(count: int, ipv6_share: float, rand: random.Random) -> List[str]:
+    """IPs publiques distinctes, ordre aléatoire (le rang Zipf ne suit pas l'adresse)."""
+    pool = set()
+    while len(pool) < count:
+        if rand.random() < ipv6_share:
+            pool.add('2001:db8:%x:%x::%x' % (rand.getrandbits(16), rand.getrandbits(16), rand.getrandbits(16)))
+        else:
+            pool.add('%d.%d.%d.%d' % (rand.randint(1, 223), rand.randint(0, 255), rand.randint(0, 255), rand.randint(1, 254)))
+
+    pool = sorted(pool)
+    rand.shuffle(pool)
+    return pool
+
+def _timestamps(log_format: str, hostname: str, start: datetime) -> Iterator[str]:
+    """Préfixes "timestamp hôte " successifs (short-iso journalctl ou BSD auth.log)."""
+    step = timedelta(seconds=LINE_INTERVAL)
+    current = start
+    previous_second, prefix = None, ''
+
+    while True:
+        second = current.replace(microsecond=0)
+        if second != previous_second:
+            if log_format == 'bsd':
+                prefix = f'{second.strftime("%b %d %H:%M:%S")} {hostname} '
+            else:
+                prefix = f'{second.strftime("%Y-%m-%dT%H:%M:%S%z")} {hostname} '
+            previous_second = second
+
+        yield prefix
+        current += step
+
+def _parse_start(value: str) -> datetime:
+    """Date ISO (naïve = UTC) → datetime UTC."""
+    start = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loggen', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=DEFAULT_LINES)
+    parser.add_argument('--ips', type=int, default=DEFAULT_IPS, help='IPs attaquantes distinctes')
+    parser.add_argument('--zipf', type=float, default=DEFAULT_ZIPF, help='exposant de Zipf des tentatives par IP')
+    parser.add_argument('--ipv6', type=float, default=DEFAULT_IPV6_SHARE, help="part d'IPv6 (0-1)")
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE, help='part de lignes de bruit (0-1)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--start', help='date ISO de la première ligne (UTC)', default=LOG_START.isoformat())
+    parser.add_argument('--format', choices=('iso', 'bsd'), default='iso', help='journalctl short-iso ou auth.log')
+    parser.add_argument('-o', '--output', help='fichier (.gz = compressé), stdout sinon')
+    args = parser.parse_args(argv)
+
+    generator = SSHLogGenerator(
+        ips=args.ips, zipf=args.zipf, ipv6_share=args.ipv6,
+        noise=args.noise, seed=args.seed, log_format=args.format,
+        start=_parse_start(args.start)
+    )
+
+    if args.output and args.output.endswith('.gz'):
+        output = gzip.open(args.output, 'wt', encoding='utf-8')
+    elif args.output:
+        output = open(args.output, 'w', encoding='utf-8')
+    else:
+        output = sys.stdout
+
+    try:
+        for chunk in generator.chunks(args.lines, 100000):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,97 @@
+import sys
 from app import create_app
 
-app = create_app()
-
-if __name__ == '__main__':
+def main(argv):
+    """
+    python run.py                   → dashboard + thread d'ingestion
+    python run.py ingest [s]        → ingestion seule, toutes les s secondes
+    python run.py follow [src]      → ingestion streaming temps réel
+                                      (src = journal ou /var/log/auth.log)
+    python run.py geo-compile in.csv out.bin
+                                    → compile une base de plages IP hors-ligne
+    python run.py backfill [--workers N] [--until ISO] /var/log/auth.log*
+                                    → importe l'historique (rotations .gz
+                                      comprises) en parallèle
+    python run.py agent URL [--host nom] [--source journal|/var/log/auth.log]
+                                    → collecte locale poussée vers le
+                                      dashboard central (POST /api/ingest)
+    python run.py retention [--vacuum]
+                                    → passe de rétention (compaction, archives
+                                      mensuelles, incremental_vacuum)
+    python run.py asgi [--host h] [--port p]
+                                    → dashboard servi en ASGI (uvicorn) :
+                                      milliers de clients SSE par process
+    """
+    if argv and argv[0] == 'ingest':
+        from app.ingest import run_ingest_forever, DEFAULT_INGEST_INTERVAL
+        interval = float(argv[1]) if len(argv) > 1 else DEFAULT_INGEST_INTERVAL
+        run_ingest_forever(interval)
+        return
+    
+    if argv and argv[0] == 'geo-compile':
+        from app.geo_offline import compile_ip_ranges
+        count = compile_ip_ranges(argv[1], argv[2])
+        print(f"✅ Compiled {count} IP ranges into {argv[2]}")
+        return
+    
+    if argv and argv[0] == 'backfill':
+        import argparse
+        from app.backfill import run_backfill, parse_until
+        parser = argparse.ArgumentParser(prog='run.py backfill')
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--until', help='date limite UTC (défaut : première attaque en base)')
+        args = parser.parse_args(argv[1:])
+        
+        summary = run_backfill(args.paths, workers=args.workers, until=parse_until(args.until))
+        print(f"✅ Backfill : {summary['attempts']} tentatives, {summary['stored_ips']} IPs")
+        return
+    
+    if argv and argv[0] == 'agent':
+        import argparse
+        from app.agent import run_agent_forever, AGENT_INTERVAL
+        parser = argparse.ArgumentParser(prog='run.py agent')
+        parser.add_argument('server_url')
+        parser.add_argument('--host', help='nom du serveur (défaut : hostname)')
+        parser.add_argument('--source', default='journal', help='journal ou chemin type /var/log/auth.log')
+        parser.add_argument('--interval', type=float, default=AGENT_INTERVAL)
+        args = parser.parse_args(argv[1:])
+        
+        run_agent_forever(args.server_url, host=args.host, source=args.source, interval=args.interval)
+        return
+    
+    if argv and argv[0] == 'retention':
+        import argparse
+        from app.retention import run_retention_once, RETENTION_TIME_BUDGET
+        parser = argparse.ArgumentParser(prog='run.py retention')
+        parser.add_argument('--budget', type=float, default=RETENTION_TIME_BUDGET, help='durée max en secondes')
+        parser.add_argument('--vacuum', action='store_true', help='conversion unique en auto_vacuum=INCREMENTAL')
+        args = parser.parse_args(argv[1:])
+        
+        run_retention_once(args.budget, convert=args.vacuum)
+        return
+    
+    if argv and argv[0] == 'asgi':
+        import argparse
+        from app.asgi import run_asgi
+        parser = argparse.ArgumentParser(prog='run.py asgi')
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=5001)
+        args = parser.parse_args(argv[1:])
+        
+        run_asgi(args.host, args.port)
+        return
+    
+    if argv and argv[0] == 'follow':
+        from app.ingest import run_follow_forever
+        run_follow_forever(argv[1] if len(argv) > 1 else 'journal')
+        return
+    
+    app = create_app()
     app.run(host='0.0.0.0', port=5001, debug=False)
 
+if __name__ == '__main__':
+    main(sys.argv[1:])
+else:
+    # gunicorn run:app
+    app = create_app()